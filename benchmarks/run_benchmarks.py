@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmarks for the pipeline's mappers, reducers and format_results.py.
+
+Every script is run as Hadoop Streaming runs it: a fresh Python process reading
+its input from stdin. For each script and dataset size the harness reports
+records/s, MB/s, peak RSS (from os.wait4) and startup time (the same script
+run on empty input), keeping the best of --repeat runs.
+
+The datasets come from test_data/generate_synthetic_pcap.py (Zipf hosts,
+heavy-tailed flows) and are fully determined by --seed, so numbers from
+different runs (and different commits) are comparable on the same machine:
+  - a PCAP for preprocessing/mapper.py,
+  - line-delimited JSON packet records (the preprocessing output format) for
+    preprocessing/reducer.py and both analysis mappers,
+  - the sorted mapper output (what the shuffle hands a reducer) for both
+    analysis reducers, and the reducer output for format_results.py and
+    host_graph.py.
+Preparation steps run the real scripts and are not timed.
+
+Usage:
+    python3 benchmarks/run_benchmarks.py --sizes small,medium
+    python3 benchmarks/run_benchmarks.py --update-baseline
+    python3 benchmarks/run_benchmarks.py --only traffic_volume --output /tmp/bench.json
+
+Results are compared against benchmarks/baseline.json when it exists; the
+exit status is 1 when a benchmark regresses past the configured thresholds.
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "test_data"))
+
+from generate_synthetic_pcap import (  # noqa: E402
+    PROTO_ICMP,
+    PROTO_TCP,
+    PROTO_UDP,
+    SyntheticTraffic,
+    tcp_flags_string,
+)
+
+PROTO_NAMES = {PROTO_TCP: "TCP", PROTO_UDP: "UDP", PROTO_ICMP: "ICMP"}
+DEFAULT_BASELINE = PROJECT_ROOT / "benchmarks" / "baseline.json"
+
+# name: (PCAP packets for preprocessing, JSON records for everything else)
+SIZES = {
+    "small": (1_000, 20_000),
+    "medium": (5_000, 200_000),
+    "large": (25_000, 1_000_000),
+}
+
+# name: (script, dataset)
+BENCHMARKS = {
+    "preprocessing.mapper": ("preprocessing/mapper.py", "pcap"),
+    "preprocessing.reducer": ("preprocessing/reducer.py", "records"),
+    "traffic_volume.mapper": ("traffic_volume/mapper.py", "records"),
+    "traffic_volume.reducer": ("traffic_volume/reducer.py", "traffic_sorted"),
+    "conversation_analysis.mapper": ("conversation_analysis/mapper.py", "records"),
+    "conversation_analysis.reducer": ("conversation_analysis/reducer.py", "conversation_sorted"),
+    "format_results.traffic": ("scripts/format_results.py", "traffic_result"),
+    "format_results.conversation": ("scripts/format_results.py", "conversation_result"),
+    "host_graph": ("scripts/host_graph.py", "conversation_result"),
+}
+
+
+# ---------------------------------------------------------------------------
+# Synthetic datasets
+# ---------------------------------------------------------------------------
+
+def traffic(packets, seed):
+    # Enough flows that the packet limit, not the flow count, ends the capture.
+    return SyntheticTraffic(seed=seed, flows=packets, max_packets=packets)
+
+
+def write_pcap(path, packets, seed):
+    with open(path, "wb") as handle:
+        traffic(packets, seed).write(handle)
+
+
+def write_records(path, packets, seed):
+    """Write the same traffic in the preprocessing output format (JSON lines)."""
+    with open(path, "w", encoding="utf-8") as handle:
+        for timestamp, proto, src, dst, sport, dport, flags, length, _ in traffic(packets, seed).events():
+            has_ports = proto in (PROTO_TCP, PROTO_UDP)
+            record = {
+                "timestamp": round(timestamp, 6),
+                "src_ip": socket.inet_ntoa(src),
+                "dst_ip": socket.inet_ntoa(dst),
+                "src_port": sport if has_ports else None,
+                "dst_port": dport if has_ports else None,
+                "proto": PROTO_NAMES[proto],
+                "size": length,
+                "tcp_flags": tcp_flags_string(flags) if proto == PROTO_TCP else None,
+            }
+            handle.write(json.dumps(record) + "\n")
+
+
+def run_stage(script, input_path, output_path, sort_output=False):
+    """Run a pipeline script untimed to derive the next dataset."""
+    with open(input_path, "rb") as stdin:
+        result = subprocess.run(
+            [sys.executable, str(PROJECT_ROOT / script)],
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=str(PROJECT_ROOT),
+            check=True,
+        )
+    data = result.stdout
+    if sort_output:
+        # Hadoop sorts map output by key before the reduce phase.
+        lines = data.splitlines(keepends=True)
+        lines.sort(key=lambda line: line.split(b"\t", 1)[0])
+        data = b"".join(lines)
+    with open(output_path, "wb") as handle:
+        handle.write(data)
+
+
+def prepare_datasets(size, data_dir, seed, needed):
+    """Create the datasets a size needs; returns {dataset: path}."""
+    pcap_packets, record_count = SIZES[size]
+    paths = {
+        "pcap": data_dir / f"{size}.pcap",
+        "records": data_dir / f"{size}.json",
+        "traffic_sorted": data_dir / f"{size}.traffic.sorted",
+        "conversation_sorted": data_dir / f"{size}.conversation.sorted",
+        "traffic_result": data_dir / f"{size}.traffic.out",
+        "conversation_result": data_dir / f"{size}.conversation.out",
+    }
+    if "pcap" in needed:
+        write_pcap(paths["pcap"], pcap_packets, seed)
+    if needed - {"pcap"}:
+        write_records(paths["records"], record_count, seed)
+    for kind, mapper, reducer in (
+        ("traffic", "traffic_volume/mapper.py", "traffic_volume/reducer.py"),
+        ("conversation", "conversation_analysis/mapper.py", "conversation_analysis/reducer.py"),
+    ):
+        if f"{kind}_sorted" in needed or f"{kind}_result" in needed:
+            run_stage(mapper, paths["records"], paths[f"{kind}_sorted"], sort_output=True)
+        if f"{kind}_result" in needed:
+            run_stage(reducer, paths[f"{kind}_sorted"], paths[f"{kind}_result"])
+    return paths
+
+
+def count_records(path, dataset):
+    if dataset == "pcap":
+        with open(path, "rb") as handle:
+            handle.seek(24)
+            count = 0
+            while True:
+                header = handle.read(16)
+                if len(header) < 16:
+                    return count
+                handle.seek(struct.unpack("<IIII", header)[2], os.SEEK_CUR)
+                count += 1
+    with open(path, "rb") as handle:
+        return sum(1 for _ in handle)
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def run_once(script, input_path):
+    """Run a script on input_path; returns (wall seconds, peak RSS in KB)."""
+    with open(input_path, "rb") as stdin:
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, str(PROJECT_ROOT / script)],
+            stdin=stdin,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=str(PROJECT_ROOT),
+        )
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} exited with status {proc.returncode} on {input_path}")
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS).
+    peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return elapsed, peak_rss_kb
+
+
+def measure(script, input_path, records, repeat):
+    startup = min(run_once(script, os.devnull)[0] for _ in range(repeat))
+    runs = [run_once(script, input_path) for _ in range(repeat)]
+    seconds = min(elapsed for elapsed, _ in runs)
+    input_bytes = os.path.getsize(input_path)
+    return {
+        "records": records,
+        "input_bytes": input_bytes,
+        "seconds": round(seconds, 4),
+        "records_per_s": round(records / seconds, 1),
+        "mb_per_s": round(input_bytes / seconds / 1e6, 3),
+        "peak_rss_kb": max(rss for _, rss in runs),
+        "startup_s": round(startup, 4),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+def compare(results, baseline, threshold, rss_threshold, startup_threshold):
+    """Return (lines, regressions) comparing results with a baseline."""
+    lines = []
+    regressions = 0
+    for key, current in sorted(results.items()):
+        previous = baseline.get(key)
+        if previous is None:
+            lines.append(f"  {key}: no baseline entry")
+            continue
+        notes = []
+        rate_change = current["records_per_s"] / previous["records_per_s"] - 1.0
+        if rate_change < -threshold:
+            notes.append(f"throughput {rate_change:+.1%} REGRESSION")
+        elif rate_change > threshold:
+            notes.append(f"throughput {rate_change:+.1%} improved")
+        rss_change = current["peak_rss_kb"] / previous["peak_rss_kb"] - 1.0
+        if rss_change > rss_threshold:
+            notes.append(f"peak RSS {rss_change:+.1%} REGRESSION")
+        # Startup times are a few tens of ms; ignore changes below 10 ms.
+        startup_delta = current["startup_s"] - previous["startup_s"]
+        if startup_delta > 0.01 and startup_delta / previous["startup_s"] > startup_threshold:
+            notes.append(f"startup {startup_delta * 1000:+.0f} ms REGRESSION")
+        regressions += sum(1 for note in notes if note.endswith("REGRESSION"))
+        lines.append(f"  {key}: {', '.join(notes) if notes else 'ok'} "
+                     f"({current['records_per_s']:.0f} vs {previous['records_per_s']:.0f} records/s)")
+    return lines, regressions
+
+
+def print_table(results):
+    header = f"{'benchmark':40} {'records':>9} {'records/s':>11} {'MB/s':>8} {'peak RSS':>10} {'startup':>9}"
+    print(header)
+    print("-" * len(header))
+    for key, result in sorted(results.items()):
+        print(
+            f"{key:40} {result['records']:>9} {result['records_per_s']:>11.0f} "
+            f"{result['mb_per_s']:>8.2f} {result['peak_rss_kb'] / 1024:>8.1f}MB "
+            f"{result['startup_s'] * 1000:>7.0f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline's streaming scripts.")
+    parser.add_argument("--sizes", default="small,medium",
+                        help=f"Comma-separated dataset sizes ({', '.join(SIZES)}).")
+    parser.add_argument("--only", help="Only run benchmarks whose name contains this string.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best is kept.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic datasets.")
+    parser.add_argument("--data-dir", type=Path,
+                        help="Keep generated datasets here (default: a temporary directory).")
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE,
+                        help="Baseline results to compare against.")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store these results as the new baseline instead of comparing.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative records/s drop reported as a regression (default 0.10).")
+    parser.add_argument("--rss-threshold", type=float, default=0.25,
+                        help="Relative peak RSS growth reported as a regression (default 0.25).")
+    parser.add_argument("--startup-threshold", type=float, default=0.25,
+                        help="Relative startup time growth reported as a regression (default 0.25).")
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+    selected = {name: spec for name, spec in BENCHMARKS.items() if not args.only or args.only in name}
+    if not selected:
+        parser.error(f"no benchmark matches {args.only!r}")
+
+    with tempfile.TemporaryDirectory(prefix="netanalysis-bench-") as tmp:
+        data_dir = args.data_dir or Path(tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        results = {}
+        for size in sizes:
+            needed = {dataset for _, dataset in selected.values()}
+            print(f"Preparing {size} datasets in {data_dir} ...", file=sys.stderr)
+            paths = prepare_datasets(size, data_dir, args.seed, needed)
+            for name, (script, dataset) in selected.items():
+                print(f"Running {name} [{size}] ...", file=sys.stderr)
+                records = count_records(paths[dataset], dataset)
+                results[f"{name}[{size}]"] = measure(script, paths[dataset], records, args.repeat)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    print_table(results)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    print(f"\nComparison with {args.baseline} ({baseline.get('created', 'unknown date')}):")
+    if baseline.get("platform") != report["platform"] or baseline.get("python") != report["python"]:
+        print("  note: baseline was recorded on a different platform or Python version")
+    lines, regressions = compare(
+        results, baseline.get("results", {}), args.threshold, args.rss_threshold, args.startup_threshold
+    )
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{regressions} regression(s) beyond the configured thresholds.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
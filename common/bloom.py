@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Time-partitioned Bloom filter for dropping duplicate packets.
+
+The same packet captured on several taps shows up in several captures with
+timestamps that differ by at most a few milliseconds. RotatingBloomFilter
+remembers a digest of every packet in one small Bloom filter per `window`
+seconds of packet time; a packet is a duplicate if its digest is in the
+partition of its own timestamp or one of the two neighbouring partitions.
+Partitions older than `retention` seconds behind the newest packet are
+dropped, so memory is bounded by (retention / window + 2) partitions of
+`capacity` entries each, whatever the capture size.
+
+Bloom filters have no false negatives: every duplicate within the window is
+dropped. A packet is wrongly dropped with probability `error_rate` per
+partition checked, as long as a partition holds at most `capacity` packets.
+
+The filter can be saved to a file and merged back (bitwise OR) under a file
+lock, so captures preprocessed one after another (e.g. by the watcher) are
+deduplicated against each other as long as they lie within the retention.
+
+BloomFilter is a plain, fixed-size filter over strings that serialises to a
+small JSON-friendly dict; the run indexes (common/run_index.py) use it to
+record which addresses and ports a run contains.
+"""
+
+import base64
+import fcntl
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+
+STATE_MAGIC = b"BLOOMPART1\n"
+DIGEST = struct.Struct("<QQ")
+
+
+def optimal_parameters(capacity, error_rate):
+    """Bits and hash count for `capacity` entries at the given false positive rate."""
+    bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    bits = max(64, (bits + 7) // 8 * 8)
+    hashes = max(1, int(round(bits / capacity * math.log(2))))
+    return bits, hashes
+
+
+def _digest_positions(key, bits, hashes):
+    h1, h2 = DIGEST.unpack(hashlib.blake2b(key, digest_size=16).digest())
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings."""
+
+    def __init__(self, capacity, error_rate=0.01, bits=None, hashes=None, data=None):
+        if bits is None:
+            bits, hashes = optimal_parameters(max(1, int(capacity)), error_rate)
+        self.bits = int(bits)
+        self.hashes = int(hashes)
+        self.data = bytearray(data) if data is not None else bytearray(self.bits // 8)
+        if len(self.data) != self.bits // 8:
+            raise ValueError("Bloom filter data does not match its size")
+
+    def add(self, key):
+        for pos in _digest_positions(str(key).encode("utf-8"), self.bits, self.hashes):
+            self.data[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        for pos in _digest_positions(str(key).encode("utf-8"), self.bits, self.hashes):
+            if not self.data[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def to_dict(self):
+        return {
+            "bits": self.bits,
+            "hashes": self.hashes,
+            "data": base64.b64encode(bytes(self.data)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, value):
+        return cls(0, bits=value["bits"], hashes=value["hashes"], data=base64.b64decode(value["data"]))
+
+
+class RotatingBloomFilter:
+    """Bloom filters partitioned by packet time, rotated as time advances."""
+
+    def __init__(self, window, capacity, error_rate=0.001, retention=None):
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.window = float(window)
+        self.capacity = int(capacity)
+        self.error_rate = float(error_rate)
+        self.retention = float(retention) if retention is not None else self.window
+        self.bits, self.hashes = optimal_parameters(self.capacity, self.error_rate)
+        self.keep = int(math.ceil(self.retention / self.window)) + 1
+        self.partitions = {}
+        self.counts = {}
+        self.newest = None
+        self.overfilled = set()
+
+    def _positions(self, key):
+        return _digest_positions(key, self.bits, self.hashes)
+
+    def _contains(self, partition, positions):
+        for pos in positions:
+            if not partition[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def seen(self, key, timestamp):
+        """Return True if `key` was seen within the window; otherwise remember it."""
+        pid = int(timestamp // self.window)
+        if self.newest is not None and pid < self.newest - self.keep:
+            # Older than the retention: neither checked nor remembered.
+            return False
+        positions = self._positions(key)
+        for neighbour in (pid, pid - 1, pid + 1):
+            partition = self.partitions.get(neighbour)
+            if partition is not None and self._contains(partition, positions):
+                return True
+
+        partition = self.partitions.get(pid)
+        if partition is None:
+            partition = self.partitions[pid] = bytearray(self.bits // 8)
+            self.counts[pid] = 0
+        for pos in positions:
+            partition[pos >> 3] |= 1 << (pos & 7)
+        self.counts[pid] += 1
+        if self.counts[pid] > self.capacity and pid not in self.overfilled:
+            self.overfilled.add(pid)
+            print(
+                f"Warning: dedup partition at {pid * self.window:.0f} holds more than "
+                f"{self.capacity} packets; raise DEDUP_CAPACITY to keep the false positive "
+                f"rate at {self.error_rate}",
+                file=sys.stderr,
+            )
+        if self.newest is None or pid > self.newest:
+            self.newest = pid
+            self._expire()
+        return False
+
+    def _expire(self):
+        oldest = self.newest - self.keep
+        for pid in [pid for pid in self.partitions if pid < oldest]:
+            del self.partitions[pid]
+            del self.counts[pid]
+
+    def memory_bytes(self):
+        return len(self.partitions) * self.bits // 8
+
+    def _header(self):
+        return {
+            "window": self.window,
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "retention": self.retention,
+            "bits": self.bits,
+            "hashes": self.hashes,
+            "partitions": [[pid, self.counts[pid]] for pid in sorted(self.partitions)],
+        }
+
+    def merge(self, other):
+        """OR another filter with the same geometry into this one."""
+        if (other.window, other.bits, other.hashes) != (self.window, self.bits, self.hashes):
+            raise ValueError("cannot merge dedup filters with different parameters")
+        for pid, partition in other.partitions.items():
+            mine = self.partitions.get(pid)
+            if mine is None:
+                self.partitions[pid] = bytearray(partition)
+                self.counts[pid] = other.counts[pid]
+            else:
+                merged = int.from_bytes(mine, "little") | int.from_bytes(partition, "little")
+                self.partitions[pid] = bytearray(merged.to_bytes(len(mine), "little"))
+                self.counts[pid] = max(self.counts[pid], other.counts[pid])
+            if self.newest is None or pid > self.newest:
+                self.newest = pid
+        if self.newest is not None:
+            self._expire()
+
+    def write(self, handle):
+        handle.write(STATE_MAGIC)
+        handle.write(json.dumps(self._header()).encode("utf-8") + b"\n")
+        for pid in sorted(self.partitions):
+            handle.write(self.partitions[pid])
+
+    def read(self, handle):
+        """Merge a filter written by write(); returns False if it does not match."""
+        header = read_header(handle)
+        if header is None:
+            return False
+        if (header["window"], header["bits"], header["hashes"]) != (self.window, self.bits, self.hashes):
+            return False
+        other = RotatingBloomFilter(self.window, self.capacity, self.error_rate, self.retention)
+        size = self.bits // 8
+        for pid, count in header["partitions"]:
+            data = handle.read(size)
+            if len(data) != size:
+                return False
+            other.partitions[pid] = bytearray(data)
+            other.counts[pid] = count
+            if other.newest is None or pid > other.newest:
+                other.newest = pid
+        self.merge(other)
+        return True
+
+
+def read_header(handle):
+    if handle.readline() != STATE_MAGIC:
+        return None
+    return json.loads(handle.readline())
+
+
+def _locked(path):
+    handle = open(f"{path}.lock", "a")
+    fcntl.flock(handle, fcntl.LOCK_EX)
+    return handle
+
+
+def load_state(bloom, path):
+    """Merge the filter saved at `path` (if any) into `bloom`."""
+    if not os.path.exists(path):
+        return False
+    with _locked(path):
+        try:
+            with open(path, "rb") as handle:
+                loaded = bloom.read(handle)
+        except (OSError, ValueError, KeyError):
+            loaded = False
+    if not loaded:
+        print(f"Warning: ignoring dedup state {path} (unreadable or different parameters)", file=sys.stderr)
+    return loaded
+
+
+def _write_atomic(bloom, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as handle:
+        bloom.write(handle)
+    os.replace(tmp_path, path)
+
+
+def save_state(bloom, path, merge=True):
+    """Write `bloom` to `path` atomically, by default merging what is already there.
+
+    Merging keeps packets remembered by other processes that saved in the
+    meantime; the file lock serialises concurrent writers. merge=False writes
+    a private file (e.g. one to be merged later) without locking.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if not merge:
+        _write_atomic(bloom, path)
+        return
+    with _locked(path):
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as handle:
+                    bloom.read(handle)
+            except (OSError, ValueError, KeyError):
+                pass
+        _write_atomic(bloom, path)
+
+
+def merge_state_file(source, dest, remove=True):
+    """Merge the filter saved at `source` into the one at `dest`, then remove `source`.
+
+    The result keeps the parameters of `source`; a `dest` saved with other
+    parameters is replaced.
+    """
+    with open(source, "rb") as handle:
+        header = read_header(handle)
+        if header is None:
+            raise ValueError(f"{source} is not a dedup state file")
+        bloom = RotatingBloomFilter(
+            header["window"], header["capacity"], header["error_rate"], header["retention"]
+        )
+        handle.seek(0)
+        bloom.read(handle)
+    save_state(bloom, dest)
+    if remove:
+        os.remove(source)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Compressed pipeline data: codecs, file suffixes and transparent readers.
+
+Preprocessing JSON and job results can be stored compressed on HDFS. Hadoop
+picks the codec of an input file from its suffix, and bzip2 files remain
+splittable, so a large bzip2-compressed preprocessing file is still read by
+several map tasks in parallel; gzip compresses faster but every .gz file is
+read by a single map task.
+
+open_input() wraps a binary stream whose content may be gzip or bzip2
+compressed (recognised by its magic bytes, e.g. "hadoop fs -cat" of a
+compressed part file piped into a mapper or format_results.py) so callers read
+plain text either way. decompress_chunks() does the same for chunks streamed
+from HDFS, with the codec taken from the file name.
+"""
+
+import bz2
+import gzip
+import io
+import sys
+import zlib
+
+SUFFIXES = {"none": "", "gzip": ".gz", "bzip2": ".bz2"}
+# Hadoop codec classes for the run scripts' -D options
+HADOOP_CODECS = {
+    "gzip": "org.apache.hadoop.io.compress.GzipCodec",
+    "bzip2": "org.apache.hadoop.io.compress.BZip2Codec",
+}
+GZIP_MAGIC = b"\x1f\x8b"
+BZIP2_MAGIC = b"BZh"
+
+
+def codec_for_name(name):
+    """Codec of a file from its suffix ("none" for uncompressed files)."""
+    for codec, suffix in SUFFIXES.items():
+        if suffix and name.endswith(suffix):
+            return codec
+    return "none"
+
+
+def _compressor(codec):
+    if codec == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if codec == "bzip2":
+        return bz2.BZ2Compressor(9)
+    raise ValueError(f"unknown codec {codec}")
+
+
+def compress_chunks(chunks, codec):
+    """Compress a byte stream on the fly ("none" passes it through)."""
+    if codec == "none":
+        yield from chunks
+        return
+    compressor = _compressor(codec)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _decompressor(codec):
+    if codec == "gzip":
+        return zlib.decompressobj(47)
+    return bz2.BZ2Decompressor()
+
+
+def decompress_chunks(chunks, codec):
+    """Decompress a byte stream on the fly, including concatenated members."""
+    if codec == "none":
+        yield from chunks
+        return
+    decompressor = _decompressor(codec)
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            # A new gzip member or bzip2 stream follows (e.g. appended files).
+            chunk = decompressor.unused_data
+            decompressor = _decompressor(codec)
+    if codec == "gzip":
+        data = decompressor.flush()
+        if data:
+            yield data
+
+
+def open_input(stream=None):
+    """Binary stream over `stream` (default stdin) that is decompressed if needed."""
+    stream = stream if stream is not None else sys.stdin.buffer
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    head = stream.peek(len(BZIP2_MAGIC))[:len(BZIP2_MAGIC)]
+    if head.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if head == BZIP2_MAGIC:
+        return bz2.BZ2File(stream, mode="rb")
+    return stream
+
+
+def text_input(stream=None):
+    """Text lines of `stream` (default stdin), decompressed if needed."""
+    return io.TextIOWrapper(open_input(stream), encoding="utf-8", errors="replace")
+
+
+def open_file(path):
+    """Open a local file for reading, decompressing it by suffix."""
+    codec = codec_for_name(str(path))
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "bzip2":
+        return bz2.open(path, "rb")
+    return open(path, "rb")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Instrumentation shared by the Hadoop Streaming mappers and reducers.
+
+Reporter emits Hadoop Streaming progress lines on stderr:
+
+    reporter:counter:<group>,<counter>,<amount>
+    reporter:status:<message>
+
+Counter increments are accumulated in memory and written at most once every
+STREAMING_REPORT_INTERVAL seconds (default 10) and when the task ends, so the
+cost per record is a dict update and the task logs are not flooded. Lines are
+only emitted inside Hadoop tasks (detected from the task id Hadoop exports) or
+when STREAMING_COUNTERS=1.
+
+run_main() optionally wraps a script's main() in a profiler, selected with
+STREAMING_PROFILE:
+
+    cprofile     cProfile statistics, written as <script>-<task>.prof
+                 (read with: python3 -m pstats <file>)
+    tracemalloc  allocation snapshots taken every STREAMING_PROFILE_INTERVAL
+                 seconds (default 30) and at exit, written as
+                 <script>-<task>.tracemalloc.txt
+
+Profiles go to STREAMING_PROFILE_DIR, else the YARN container log directory
+(so `yarn logs` collects them), else the system temp directory.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+TASK_ID_VARS = ("mapreduce_task_attempt_id", "mapred_task_id", "mapreduce_task_id")
+TOP_ALLOCATIONS = 25
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes", "y")
+
+
+def task_id():
+    for name in TASK_ID_VARS:
+        if os.environ.get(name):
+            return os.environ[name]
+    return None
+
+
+class Reporter:
+    """Rate-limited Hadoop Streaming counters and status updates."""
+
+    def __init__(self, group, interval=None, stream=None, enabled=None):
+        self.group = group
+        if interval is None:
+            interval = float(os.environ.get("STREAMING_REPORT_INTERVAL", "10"))
+        self.interval = interval
+        self.stream = stream if stream is not None else sys.stderr
+        if enabled is None:
+            enabled = task_id() is not None or _env_flag("STREAMING_COUNTERS")
+        self.enabled = enabled
+        self.counters = {}
+        self._pending = {}
+        self._status = None
+        self._calls = 0
+        self._next_flush = time.monotonic() + interval
+
+    def incr(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+        if self.enabled:
+            self._pending[name] = self._pending.get(name, 0) + amount
+            self._calls += 1
+            # Only look at the clock every 1024 increments.
+            if not self._calls & 1023 and time.monotonic() >= self._next_flush:
+                self.flush()
+
+    def status(self, message):
+        """Set the task status; it is written with the next flush."""
+        self._status = message
+
+    def flush(self):
+        self._next_flush = time.monotonic() + self.interval
+        if not self.enabled:
+            return
+        lines = [
+            f"reporter:counter:{self.group},{name},{amount}\n"
+            for name, amount in self._pending.items()
+            if amount
+        ]
+        if self._status is not None:
+            lines.append(f"reporter:status:{self._status}\n")
+            self._status = None
+        self._pending.clear()
+        if lines:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+def profile_path(script_name, suffix):
+    directory = os.environ.get("STREAMING_PROFILE_DIR")
+    if not directory and os.environ.get("LOG_DIRS"):
+        directory = os.environ["LOG_DIRS"].split(",")[0]
+    directory = directory or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{script_name}-{task_id() or os.getpid()}{suffix}")
+
+
+def _run_cprofile(main, script_name):
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(main)
+    finally:
+        path = profile_path(script_name, ".prof")
+        profiler.dump_stats(path)
+        print(f"cProfile statistics written to {path}", file=sys.stderr)
+
+
+def _write_snapshot(handle, label):
+    import tracemalloc
+
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    handle.write(f"=== {label} at {time.strftime('%Y-%m-%d %H:%M:%S')}: "
+                 f"current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        handle.write(f"{stat}\n")
+    handle.write("\n")
+    handle.flush()
+
+
+def _run_tracemalloc(main, script_name):
+    import tracemalloc
+
+    interval = float(os.environ.get("STREAMING_PROFILE_INTERVAL", "30"))
+    path = profile_path(script_name, ".tracemalloc.txt")
+    tracemalloc.start(int(os.environ.get("STREAMING_PROFILE_FRAMES", "1")))
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    with open(path, "w", encoding="utf-8") as handle:
+        def sample():
+            while not stop.wait(interval):
+                with lock:
+                    _write_snapshot(handle, "sample")
+
+        sampler = threading.Thread(target=sample, name="tracemalloc-sampler", daemon=True)
+        sampler.start()
+        try:
+            return main()
+        finally:
+            stop.set()
+            sampler.join()
+            with lock:
+                _write_snapshot(handle, "final")
+            tracemalloc.stop()
+            print(f"tracemalloc snapshots written to {path}", file=sys.stderr)
+
+
+def run_main(main, script_name):
+    """Run main(), profiled as requested by STREAMING_PROFILE."""
+    mode = os.environ.get("STREAMING_PROFILE", "").lower()
+    if mode in ("cprofile", "cpu"):
+        return _run_cprofile(main, script_name)
+    if mode in ("tracemalloc", "memory"):
+        return _run_tracemalloc(main, script_name)
+    if mode:
+        print(f"Unknown STREAMING_PROFILE={mode!r}; running without profiling", file=sys.stderr)
+    return main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Record framing for pcap and pcapng byte streams.
+
+These helpers split a capture into whole records without decoding packets,
+so callers can work on byte offsets: tail a growing capture, cut a live
+stream into windows, or resume from a checkpoint. The "preamble" is the part
+of the file a decoder needs before any record (the pcap global header, or
+the pcapng Section Header and Interface Description blocks); prepending it
+to any run of complete records yields a valid capture.
+"""
+
+import struct
+
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", False),
+    b"\xa1\xb2\xc3\xd4": (">", False),
+    b"\x4d\x3c\xb2\xa1": ("<", True),
+    b"\xa1\xb2\x3c\x4d": (">", True),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_EPB = 0x00000006
+PCAPNG_SPB = 0x00000003
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+PCAP_GLOBAL_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+MAX_RECORD_LEN = 256 * 1024 * 1024
+
+
+class PcapFormatError(ValueError):
+    """Raised when the stream is neither pcap nor pcapng, or is corrupt."""
+
+
+class PcapFraming:
+    """Describes a capture's format once its preamble has been parsed."""
+
+    def __init__(self, preamble, endian, pcapng, nanosecond=False, linktype=None):
+        self.preamble = bytes(preamble)
+        self.endian = endian
+        self.pcapng = pcapng
+        self.nanosecond = nanosecond
+        self.linktype = linktype
+        self._record_header = struct.Struct(endian + "IIII")
+        self._block_header = struct.Struct(endian + "II")
+
+    def record_length(self, buffer, offset):
+        """Total length of the record starting at offset, or None if incomplete."""
+        if self.pcapng:
+            if len(buffer) - offset < 8:
+                return None
+            _, length = self._block_header.unpack_from(buffer, offset)
+            if length < 12 or length % 4 or length > MAX_RECORD_LEN:
+                raise PcapFormatError(f"invalid pcapng block length {length} at {offset}")
+        else:
+            if len(buffer) - offset < PCAP_RECORD_HEADER_LEN:
+                return None
+            _, _, incl_len, _ = self._record_header.unpack_from(buffer, offset)
+            if incl_len > MAX_RECORD_LEN:
+                raise PcapFormatError(f"invalid pcap record length {incl_len} at {offset}")
+            length = PCAP_RECORD_HEADER_LEN + incl_len
+        return length if len(buffer) - offset >= length else None
+
+    def is_packet(self, buffer, offset):
+        if not self.pcapng:
+            return True
+        block_type, _ = self._block_header.unpack_from(buffer, offset)
+        return block_type in (PCAPNG_EPB, PCAPNG_SPB, 2)
+
+    def timestamp(self, buffer, offset):
+        """Capture timestamp (seconds) of a packet record, or None if unknown.
+
+        pcapng timestamps assume the default microsecond resolution.
+        """
+        if not self.pcapng:
+            ts_sec, ts_frac, _, _ = self._record_header.unpack_from(buffer, offset)
+            return ts_sec + ts_frac / (1e9 if self.nanosecond else 1e6)
+        block_type, _ = self._block_header.unpack_from(buffer, offset)
+        if block_type != PCAPNG_EPB:
+            return None
+        high, low = struct.unpack_from(self.endian + "II", buffer, offset + 12)
+        return ((high << 32) | low) / 1e6
+
+    def split(self, buffer, start=0):
+        """Return (record_offsets, consumed) for the complete records in buffer[start:]."""
+        offsets = []
+        offset = start
+        while True:
+            length = self.record_length(buffer, offset)
+            if length is None:
+                break
+            offsets.append(offset)
+            offset += length
+        return offsets, offset - start
+
+
+def parse_preamble(buffer):
+    """Parse the capture preamble from the start of buffer.
+
+    Returns a PcapFraming and the preamble length, or (None, 0) when more
+    data is needed. Raises PcapFormatError for unknown formats.
+    """
+    if len(buffer) < 4:
+        return None, 0
+    magic = bytes(buffer[:4])
+
+    if magic in PCAP_MAGICS:
+        if len(buffer) < PCAP_GLOBAL_HEADER_LEN:
+            return None, 0
+        endian, nanosecond = PCAP_MAGICS[magic]
+        linktype = struct.unpack_from(endian + "I", buffer, 20)[0]
+        framing = PcapFraming(buffer[:PCAP_GLOBAL_HEADER_LEN], endian, False, nanosecond, linktype)
+        return framing, PCAP_GLOBAL_HEADER_LEN
+
+    if struct.unpack_from("<I", buffer, 0)[0] == PCAPNG_SHB:
+        if len(buffer) < 12:
+            return None, 0
+        bom_le = struct.unpack_from("<I", buffer, 8)[0]
+        endian = "<" if bom_le == PCAPNG_BYTE_ORDER_MAGIC else ">"
+        framing = PcapFraming(b"", endian, True)
+        # The preamble is the SHB plus every IDB that precedes the first packet.
+        offset = 0
+        while True:
+            length = framing.record_length(buffer, offset)
+            if length is None:
+                return None, 0
+            block_type = struct.unpack_from(endian + "I", buffer, offset)[0]
+            if block_type not in (PCAPNG_SHB, PCAPNG_IDB):
+                break
+            if block_type == PCAPNG_IDB and framing.linktype is None:
+                framing.linktype = struct.unpack_from(endian + "H", buffer, offset + 8)[0]
+            offset += length
+            # Without a following block we cannot tell whether more IDBs come.
+            if len(buffer) - offset < 8:
+                return None, 0
+        framing.preamble = bytes(buffer[:offset])
+        return framing, offset
+
+    raise PcapFormatError(f"unrecognised capture magic {magic.hex()}")
+
+
+def read_preamble(handle, max_bytes=1024 * 1024):
+    """Read and parse the preamble of an open capture file (position is reset to 0)."""
+    handle.seek(0)
+    data = handle.read(max_bytes)
+    handle.seek(0)
+    return parse_preamble(data)
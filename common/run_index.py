@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Sidecar index of a run's preprocessing output.
+
+While a capture is preprocessed, RunIndex collects the range of packet
+timestamps, the record and byte counts and the distinct IP addresses and ports
+of the records written. The mapper saves it to INDEX_STATE_OUT and continues
+the one in INDEX_STATE, so a capture decoded in chunks gets one index. The
+watcher turns it into the run's sidecar, "_index.json" next to the run's
+preprocessing output (Hadoop skips files starting with "_" in job inputs), in
+which the addresses and ports are Bloom filters sized for their actual count:
+no false negatives, a false positive rate of `error_rate`, and a few bytes per
+address.
+
+RunSidecar reads a sidecar back and answers "may this run contain host X,
+port Y, packets between T1 and T2?"; scripts/plan_runs.py uses it to pick the
+runs an investigation has to read.
+"""
+
+import json
+import os
+import sys
+
+import bloom
+
+INDEX_NAME = "_index.json"
+INDEX_VERSION = 1
+DEFAULT_ERROR_RATE = 0.01
+
+
+class RunIndex:
+    """Time range, counts and distinct addresses and ports of a run's records."""
+
+    def __init__(self):
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.records = 0
+        self.bytes = 0
+        self.ips = set()
+        self.ports = set()
+
+    def add(self, record):
+        timestamp = record.get("timestamp")
+        if timestamp is not None:
+            if self.first_timestamp is None or timestamp < self.first_timestamp:
+                self.first_timestamp = timestamp
+            if self.last_timestamp is None or timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+        self.records += 1
+        self.bytes += record.get("size") or 0
+        for field in ("src_ip", "dst_ip"):
+            if record.get(field):
+                self.ips.add(record[field])
+        for field in ("src_port", "dst_port"):
+            if record.get(field) is not None:
+                self.ports.add(record[field])
+
+    def sidecar(self, error_rate=DEFAULT_ERROR_RATE, **fields):
+        """The sidecar of the run; `fields` (e.g. run_id, capture) are stored as they are."""
+        ips = bloom.BloomFilter(len(self.ips), error_rate)
+        for ip in self.ips:
+            ips.add(ip)
+        ports = bloom.BloomFilter(len(self.ports), error_rate)
+        for port in self.ports:
+            ports.add(port)
+        sidecar = {"version": INDEX_VERSION}
+        sidecar.update(fields)
+        sidecar.update({
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "records": self.records,
+            "bytes": self.bytes,
+            "ip_count": len(self.ips),
+            "port_count": len(self.ports),
+            "ips": ips.to_dict(),
+            "ports": ports.to_dict(),
+        })
+        return sidecar
+
+
+def save_state(index, path):
+    """Write the index (with its exact address and port sets) to `path` atomically."""
+    state = {
+        "first_timestamp": index.first_timestamp,
+        "last_timestamp": index.last_timestamp,
+        "records": index.records,
+        "bytes": index.bytes,
+        "ips": sorted(index.ips),
+        "ports": sorted(index.ports),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(state, handle)
+    os.replace(tmp_path, path)
+
+
+def load_state(index, path):
+    """Continue the index saved at `path` by save_state(), if any."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path) as handle:
+            state = json.load(handle)
+        index.first_timestamp = state["first_timestamp"]
+        index.last_timestamp = state["last_timestamp"]
+        index.records = state["records"]
+        index.bytes = state["bytes"]
+        index.ips = set(state["ips"])
+        index.ports = set(state["ports"])
+    except (OSError, ValueError, KeyError):
+        print(f"Warning: ignoring index state {path} (unreadable)", file=sys.stderr)
+        return False
+    return True
+
+
+class RunSidecar:
+    """A run's sidecar as read back from `_index.json`."""
+
+    def __init__(self, value):
+        if value.get("version") != INDEX_VERSION:
+            raise ValueError(f"unsupported run index version {value.get('version')}")
+        self.value = value
+        self.run_id = value.get("run_id")
+        self.first_timestamp = value["first_timestamp"]
+        self.last_timestamp = value["last_timestamp"]
+        self.records = value["records"]
+        self.bytes = value["bytes"]
+        self.ips = bloom.BloomFilter.from_dict(value["ips"])
+        self.ports = bloom.BloomFilter.from_dict(value["ports"])
+
+    @classmethod
+    def loads(cls, text):
+        return cls(json.loads(text))
+
+    def overlaps(self, since=None, until=None):
+        """Whether the run has packets in [since, until)."""
+        if self.first_timestamp is None:
+            return False
+        if since is not None and self.last_timestamp < since:
+            return False
+        if until is not None and self.first_timestamp >= until:
+            return False
+        return True
+
+    def may_contain_ip(self, ip):
+        return ip in self.ips
+
+    def may_contain_port(self, port):
+        return int(port) in self.ports
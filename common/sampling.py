@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Consistent flow sampling and the estimates that scale sampled results back up.
+
+FlowSampler keeps or drops whole flows: the canonical (direction-independent)
+5-tuple of a flow is hashed to a number in [0, 1) and the flow is kept if that
+number is below the sampling rate in force when the flow's first packet is
+seen. The decision is remembered until the flow has been idle for
+`idle_timeout` seconds, so a flow is never cut in half when the rate changes,
+and the same flow is kept or dropped consistently by every process that uses
+the same rate.
+
+With a target packet rate the sampling rate follows the input: once per
+`adjust_interval` seconds of packet time, or sooner when more packets than the
+target for a whole interval arrive (so a burst is caught within a few
+packets), it is set to target / input rate (smoothed, between `min_rate` and
+`max_rate`). That puts a ceiling of about target x capture duration on the
+records produced for a capture, plus the packets of flows kept before a burst
+was noticed.
+
+Every kept record carries the rate its flow was kept with. A flow kept with
+rate p stands for 1/p flows, so a total over sampled flows is estimated with
+the Horvitz-Thompson estimator sum(x / p), whose variance is estimated by
+sum((1 - p) x^2 / p^2). estimate_total() returns the estimate and the
+half-width of its 95% confidence interval.
+
+save_state() and load_state() carry a sampler over from one process to the
+next (e.g. the chunks of a capture preprocessed with checkpoints), so a
+capture decoded in pieces keeps exactly the flows one process would keep.
+"""
+
+import hashlib
+import json
+import math
+import os
+import sys
+
+Z_95 = 1.959963984540054
+HASH_SCALE = float(2 ** 64)
+
+
+def flow_key(src_ip, src_port, dst_ip, dst_port, proto):
+    """Key of a flow that is the same for both directions."""
+    a = (src_ip or '', src_port or 0)
+    b = (dst_ip or '', dst_port or 0)
+    if b < a:
+        a, b = b, a
+    return f"{proto}|{a[0]}:{a[1]}|{b[0]}:{b[1]}"
+
+
+def flow_hash(key):
+    """Map a flow key uniformly onto [0, 1)."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') / HASH_SCALE
+
+
+class FlowSampler:
+    """Sticky per-flow sampling decisions at a fixed or adaptive rate."""
+
+    def __init__(self, rate=1.0, target_pps=None, min_rate=0.001, idle_timeout=120.0,
+                 adjust_interval=1.0, smoothing=0.3):
+        # A rate of 0 would drop every flow and make the 1/rate weights divide
+        # by zero; a non-positive idle timeout would expire flows on every packet.
+        if float(rate) <= 0:
+            raise ValueError(f"sampling rate must be positive (got {rate})")
+        if float(min_rate) <= 0:
+            raise ValueError(f"minimum sampling rate must be positive (got {min_rate})")
+        if float(idle_timeout) <= 0:
+            raise ValueError(f"flow idle timeout must be positive (got {idle_timeout})")
+        self.max_rate = min(1.0, float(rate))
+        self.rate = self.max_rate
+        self.target_pps = target_pps
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.idle_timeout = float(idle_timeout)
+        self.adjust_interval = float(adjust_interval)
+        self.smoothing = smoothing
+        self.flows = {}
+        self.input_pps = None
+        self._interval_start = None
+        self._interval_packets = 0
+        self._next_expiry = None
+        self._interval_limit = max(64, int((target_pps or 0) * self.adjust_interval))
+
+    def keep(self, key, timestamp):
+        """Return the rate the packet's flow was kept with, or None if it is dropped."""
+        self._advance(timestamp)
+        entry = self.flows.get(key)
+        if entry is None:
+            rate = self.rate
+            entry = self.flows[key] = [rate if flow_hash(key) < rate else 0.0, timestamp]
+        else:
+            entry[1] = timestamp
+        return entry[0] or None
+
+    def _advance(self, timestamp):
+        if self._interval_start is None:
+            self._interval_start = timestamp
+            self._next_expiry = timestamp + self.idle_timeout
+        self._interval_packets += 1
+        elapsed = timestamp - self._interval_start
+        if elapsed >= self.adjust_interval or (
+            self._interval_packets >= self._interval_limit and elapsed > 0
+        ):
+            pps = self._interval_packets / elapsed
+            if self.input_pps is None:
+                self.input_pps = pps
+            else:
+                self.input_pps += self.smoothing * (pps - self.input_pps)
+            if self.target_pps:
+                self.rate = max(self.min_rate, min(self.max_rate, self.target_pps / self.input_pps))
+            self._interval_start = timestamp
+            self._interval_packets = 0
+        if timestamp >= self._next_expiry:
+            cutoff = timestamp - self.idle_timeout
+            for key in [key for key, entry in self.flows.items() if entry[1] < cutoff]:
+                del self.flows[key]
+            self._next_expiry = timestamp + self.idle_timeout
+
+
+STATE_FIELDS = ('rate', 'input_pps', '_interval_start', '_interval_packets', '_next_expiry')
+
+
+def save_state(sampler, path):
+    """Write the sampler's rate estimate and flow decisions to `path` atomically."""
+    state = {'max_rate': sampler.max_rate, 'target_pps': sampler.target_pps, 'flows': sampler.flows}
+    for name in STATE_FIELDS:
+        state[name] = getattr(sampler, name)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as handle:
+        json.dump(state, handle)
+    os.replace(tmp_path, path)
+
+
+def load_state(sampler, path):
+    """Restore a sampler saved with the same settings by save_state(), if any."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path) as handle:
+            state = json.load(handle)
+        loaded = (
+            (state['max_rate'], state['target_pps']) == (sampler.max_rate, sampler.target_pps)
+            and sampler.min_rate <= state['rate'] <= sampler.max_rate
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        loaded = False
+    if not loaded:
+        print(f"Warning: ignoring sampler state {path} (unreadable, invalid or different settings)",
+              file=sys.stderr)
+        return False
+    for name in STATE_FIELDS:
+        setattr(sampler, name, state[name])
+    sampler.flows = state['flows']
+    return True
+
+
+def estimate_total(samples):
+    """Horvitz-Thompson total and 95% CI half-width from (value, rate) per sampled flow."""
+    total = 0.0
+    variance = 0.0
+    for value, rate in samples:
+        total += value / rate
+        variance += (1.0 - rate) * value * value / (rate * rate)
+    return total, Z_95 * math.sqrt(variance)
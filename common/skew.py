@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Key salting for skew-resistant two-phase aggregation.
+
+Hadoop's default hash partitioning sends every record of a key to the same
+reducer, so a key carrying a large share of the records (a gateway or DNS
+server address, one huge conversation) leaves one reducer running long after
+the others have finished. Keys listed in SKEW_HOT_KEYS (comma-separated) are
+spread by the mappers over SKEW_SALTS salted keys, "<key>#<salt>", which hash
+to different reducers. The reducers write mergeable partial results for
+salted keys, and a second job over the (much smaller) output strips the salt
+again (mapper.py --merge) and merges the partial results under the original
+key (reducer.py --merge).
+"""
+
+import os
+import sys
+import zlib
+
+SALT_SEP = '#'
+DEFAULT_SALTS = 8
+
+
+def hot_keys_from_env():
+    """The keys listed in SKEW_HOT_KEYS."""
+    value = os.environ.get('SKEW_HOT_KEYS') or ''
+    return frozenset(key.strip() for key in value.split(',') if key.strip())
+
+
+class Salter:
+    """Spread the records of hot keys over several salted keys."""
+
+    def __init__(self, hot_keys=None, salts=None):
+        self.hot_keys = hot_keys_from_env() if hot_keys is None else frozenset(hot_keys)
+        self.salts = max(1, int(salts or os.environ.get('SKEW_SALTS') or DEFAULT_SALTS))
+        self.enabled = bool(self.hot_keys) and self.salts > 1
+        self._next = 0
+
+    def is_hot(self, key):
+        return self.enabled and key in self.hot_keys
+
+    def salt(self, key, affinity=None):
+        """Salted version of `key`.
+
+        Records with the same `affinity` (e.g. a flow) get the same salt, so
+        they stay together in one partial result; without one the salts are
+        assigned round robin.
+        """
+        if affinity is None:
+            self._next = (self._next + 1) % self.salts
+            salt = self._next
+        else:
+            salt = zlib.crc32(affinity.encode('utf-8')) % self.salts
+        return f"{key}{SALT_SEP}{salt}"
+
+
+def unsalt(key):
+    """Return (original key, whether `key` was salted)."""
+    base, sep, salt = key.rpartition(SALT_SEP)
+    if sep and salt.isdigit():
+        return base, True
+    return key, False
+
+
+def merge_mapper(stream=None, out=None):
+    """Second-phase mapper: re-key first-phase output lines by their unsalted key."""
+    stream = stream or sys.stdin
+    out = out or sys.stdout
+    for line in stream:
+        key, sep, rest = line.rstrip('\n').partition('\t')
+        if not sep:
+            continue
+        base, _ = unsalt(key)
+        out.write(f"{base}\t{rest}\n")
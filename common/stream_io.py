@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Threaded input and output stages for the streaming mappers.
+
+A mapper that reads, decodes and writes in one loop leaves the decoder idle
+while it waits for the disk or the pipe in either direction. ReadAhead runs a
+reader thread that fills a small pool of large buffers from the input (blocking
+reads release the GIL, so they overlap with decoding) and hands them to the
+decoder in order; the buffers are returned to the pool once consumed, so they
+are allocated once per task rather than per packet. open_input() wraps it in a
+regular buffered binary stream, so existing readers such as scapy's PcapReader
+use it unchanged.
+
+ChunkWriter runs a writer thread that writes whole output chunks (records
+joined by the decoder in batches) to the output stream through a bounded
+queue, so the decoder only blocks on output when the consumer falls behind
+by more than `depth` chunks. A write error in the writer thread (e.g. a broken
+pipe) is raised in the decoder on its next write() or on close().
+
+IO_BUFFER_MB (default 4) and IO_BUFFERS (default 4) size the input pool.
+"""
+
+import io
+import os
+import queue
+import threading
+
+DEFAULT_BUFFER_SIZE = int(float(os.environ.get('IO_BUFFER_MB') or 4) * 1024 * 1024)
+DEFAULT_BUFFERS = max(2, int(os.environ.get('IO_BUFFERS') or 4))
+
+
+class ReadAhead(io.RawIOBase):
+    """Raw stream served from buffers filled ahead by a reader thread."""
+
+    def __init__(self, source, buffer_size=DEFAULT_BUFFER_SIZE, buffers=DEFAULT_BUFFERS):
+        super().__init__()
+        self._source = source
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(bytearray(buffer_size))
+        self._filled = queue.Queue()
+        self._current = None
+        self._view = None
+        self._pos = 0
+        self._end = 0
+        self._eof = False
+        self._error = None
+        self.bytes_read = 0
+        self._thread = threading.Thread(target=self._run, name='read-ahead', daemon=True)
+        self._thread.start()
+
+    def _fill(self, buffer):
+        view = memoryview(buffer)
+        size = 0
+        while size < len(buffer):
+            n = self._source.readinto(view[size:])
+            if not n:
+                break
+            size += n
+        view.release()
+        return size
+
+    def _run(self):
+        try:
+            while True:
+                buffer = self._free.get()
+                size = self._fill(buffer)
+                self._filled.put((buffer, size))
+                if not size:
+                    return
+        except Exception as e:
+            self._error = e
+            self._filled.put((None, 0))
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= self._end:
+            if self._eof:
+                return 0
+            if self._current is not None:
+                self._view.release()
+                self._free.put(self._current)
+                self._current = self._view = None
+            buffer, size = self._filled.get()
+            if not size:
+                self._eof = True
+                if self._error is not None:
+                    raise self._error
+                return 0
+            self._current = buffer
+            self._view = memoryview(buffer)
+            self._pos, self._end = 0, size
+        n = min(len(b), self._end - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        self.bytes_read += n
+        return n
+
+
+def open_input(source, buffer_size=DEFAULT_BUFFER_SIZE, buffers=DEFAULT_BUFFERS):
+    """Buffered binary stream over `source` that is read ahead in a thread."""
+    return io.BufferedReader(ReadAhead(source, buffer_size, buffers), buffer_size=64 * 1024)
+
+
+def drain(stream, size=DEFAULT_BUFFER_SIZE):
+    """Read `stream` to the end, so the writer of a pipe does not see EPIPE."""
+    while stream.read(size):
+        pass
+
+
+class ChunkWriter:
+    """Write output chunks to a binary stream from a writer thread."""
+
+    def __init__(self, sink, depth=DEFAULT_BUFFERS):
+        self._sink = sink
+        self._queue = queue.Queue(depth)
+        self._error = None
+        self._closed = False
+        self.bytes_written = 0
+        self._thread = threading.Thread(target=self._run, name='chunk-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._sink.write(chunk)
+                self.bytes_written += len(chunk)
+            except Exception as e:
+                self._error = e
+        if self._error is None:
+            try:
+                self._sink.flush()
+            except Exception as e:
+                self._error = e
+
+    def write(self, chunk):
+        if self._error is not None:
+            raise self._error
+        if chunk:
+            self._queue.put(chunk)
+
+    def write_lines(self, lines):
+        """Write text lines as one chunk and clear the list for reuse."""
+        if lines:
+            lines.append('')
+            self.write('\n'.join(lines).encode('utf-8'))
+            lines.clear()
+
+    def close(self):
+        """Wait until every chunk is written; raises the writer's error, if any."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
@@ -5,11 +5,32 @@ Conversation & Latency Analysis Mapper for Hadoop Network Analysis Pipeline
 This mapper reads line-delimited JSON data and groups packets into TCP conversations.
 A conversation is defined by the 4-tuple: (Source IP, Source Port, Destination IP, Destination Port),
 treated symmetrically. Only TCP packets are processed.
+
+Records tagged with a run_id (batched watcher jobs) are keyed as
+"<run_id>|<conversation>" so the output can be split back per capture.
+
+Conversations listed in SKEW_HOT_KEYS are salted over SKEW_SALTS reducers (see
+common/skew.py); with --merge the mapper re-keys the first job's output by
+the unsalted conversation for the merge job.
 """
 
 import sys
+import os
 import json
 
+# Hadoop Streaming symlinks every -files entry into the task's working directory
+# from a cache directory of its own, so on a cluster the helpers are found there
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import compression
+import instrumentation
+import skew
+
+RUN_ID_SEP = '|'
+
+reporter = instrumentation.Reporter('ConversationAnalysis')
+salter = skew.Salter()
+
 def normalize_conversation_key(src_ip, src_port, dst_ip, dst_port):
     """
     Create a normalized conversation key by sorting the 4-tuple.
@@ -24,17 +45,23 @@ def normalize_conversation_key(src_ip, src_port, dst_ip, dst_port):
 
 def main():
     """Main mapper function."""
+    if '--merge' in sys.argv[1:]:
+        skew.merge_mapper(compression.text_input())
+        return
     try:
-        for line in sys.stdin:
+        # Input piped in by hand may still be compressed (see common/compression.py)
+        for line in compression.text_input():
             line = line.strip()
             if not line:
                 continue
+            reporter.incr('Records read')
                 
             try:
                 packet = json.loads(line)
                 
                 # Only process TCP packets
                 if packet.get('proto') != 'TCP':
+                    reporter.incr('Non-TCP records')
                     continue
                 
                 # Extract packet information
@@ -45,25 +72,38 @@ def main():
                 
                 # Skip packets without complete TCP information
                 if not all([src_ip, dst_ip, src_port, dst_port]):
+                    reporter.incr('Incomplete TCP records')
                     continue
                 
                 # Create normalized conversation key
                 conversation_key = normalize_conversation_key(src_ip, src_port, dst_ip, dst_port)
+                hot = salter.is_hot(conversation_key)
+                run_id = packet.get('run_id')
+                if run_id:
+                    conversation_key = f"{run_id}{RUN_ID_SEP}{conversation_key}"
+                if hot:
+                    conversation_key = salter.salt(conversation_key)
+                    reporter.incr('Hot key packets')
                 
                 # Emit conversation key and packet data
                 print(f"{conversation_key}\t{line}")
+                reporter.incr('Packets emitted')
                 
             except json.JSONDecodeError:
                 print(f"Invalid JSON line: {line}", file=sys.stderr)
+                reporter.incr('Invalid JSON')
                 continue
             except Exception as e:
                 print(f"Error processing packet: {e}", file=sys.stderr)
+                reporter.incr('Record errors')
                 continue
                 
     except Exception as e:
         print(f"Fatal error in mapper: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        reporter.close()
 
 if __name__ == "__main__":
-    main()
+    instrumentation.run_main(main, 'conversation-mapper')
 
@@ -9,71 +9,191 @@ This reducer calculates performance metrics for TCP conversations:
 - Total packet count
 
 Output format: Conversation_Key\tRTT_ms\tDuration_sec\tTotal_Volume_bytes\tPacket_Count
+
+Flow sampling keeps or drops whole conversations, so the metrics of a sampled
+conversation are exact; it stands for 1/sample_rate conversations, and that
+weight is appended as a sixth column (Weight) for totals to be scaled with.
+
+Salted hot conversations ("<key>#<salt>", see common/skew.py) come out as
+partial results, "<key>#<salt>\tPARTIAL\t<summary fields>"; with --merge the
+reducer combines them into the regular output line and passes complete
+conversations through.
 """
 
 import sys
+import os
 import json
 from collections import defaultdict
 
-def calculate_rtt(packets):
+# Hadoop Streaming symlinks every -files entry into the task's working directory
+# from a cache directory of its own, so on a cluster the helpers are found there
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import instrumentation
+
+import skew
+
+reporter = instrumentation.Reporter('ConversationAnalysis')
+
+# Marker and fields of the partial results written for salted conversations
+PARTIAL = 'PARTIAL'
+PARTIAL_FIELDS = ('first_timestamp', 'last_timestamp', 'total_volume_bytes', 'packet_count',
+                  'syn_time', 'syn_ack_time', 'sample_rate')
+
+def summarize_packets(packets):
     """
-    Calculate RTT as the time delta between the first SYN and the corresponding SYN-ACK packet.
-    Returns RTT in milliseconds, or None if no valid SYN/SYN-ACK pair found.
+    Summarize (part of) a conversation into values that can be merged with the
+    summaries of its other parts: first and last timestamp, volume, packet count,
+    first SYN and first SYN-ACK timestamps and the sample rate.
     """
-    syn_packets = []
-    syn_ack_packets = []
+    first_timestamp = None
+    last_timestamp = None
+    syn_time = None
+    syn_ack_time = None
+    sample_rate = None
+    total_volume = 0
     
-    # Find SYN and SYN-ACK packets
     for packet in packets:
-        tcp_flags = packet.get('tcp_flags', '')
         timestamp = packet.get('timestamp', 0)
+        if first_timestamp is None or timestamp < first_timestamp:
+            first_timestamp = timestamp
+        if last_timestamp is None or timestamp > last_timestamp:
+            last_timestamp = timestamp
+        total_volume += packet.get('size', 0)
         
+        tcp_flags = packet.get('tcp_flags') or ''
         if 'S' in tcp_flags and 'A' not in tcp_flags:  # SYN only
-            syn_packets.append(timestamp)
+            if syn_time is None or timestamp < syn_time:
+                syn_time = timestamp
         elif 'S' in tcp_flags and 'A' in tcp_flags:  # SYN-ACK
-            syn_ack_packets.append(timestamp)
+            if syn_ack_time is None or timestamp < syn_ack_time:
+                syn_ack_time = timestamp
+        
+        rate = packet.get('sample_rate')
+        if rate and (sample_rate is None or rate < sample_rate):
+            sample_rate = rate
     
-    # Calculate RTT from first SYN to first SYN-ACK
-    if syn_packets and syn_ack_packets:
-        syn_time = min(syn_packets)
-        syn_ack_time = min(syn_ack_packets)
-        if syn_ack_time > syn_time:
-            rtt_ms = (syn_ack_time - syn_time) * 1000  # Convert to milliseconds
-            return rtt_ms
+    return {
+        'first_timestamp': first_timestamp,
+        'last_timestamp': last_timestamp,
+        'total_volume_bytes': total_volume,
+        'packet_count': len(packets),
+        'syn_time': syn_time,
+        'syn_ack_time': syn_ack_time,
+        'sample_rate': sample_rate
+    }
+
+def merge_summaries(summaries):
+    """Combine the summaries of the parts of a conversation."""
+    def smallest(values):
+        values = [value for value in values if value is not None]
+        return min(values) if values else None
     
-    return None
+    return {
+        'first_timestamp': smallest(s['first_timestamp'] for s in summaries),
+        'last_timestamp': max(s['last_timestamp'] for s in summaries),
+        'total_volume_bytes': sum(s['total_volume_bytes'] for s in summaries),
+        'packet_count': sum(s['packet_count'] for s in summaries),
+        'syn_time': smallest(s['syn_time'] for s in summaries),
+        'syn_ack_time': smallest(s['syn_ack_time'] for s in summaries),
+        'sample_rate': smallest(s['sample_rate'] for s in summaries)
+    }
+
+def metrics_from_summary(summary):
+    """
+    Calculate the conversation metrics. RTT is the time delta between the first
+    SYN and the first SYN-ACK packet in milliseconds, or None if no valid
+    SYN/SYN-ACK pair was found.
+    """
+    rtt_ms = None
+    syn_time = summary['syn_time']
+    syn_ack_time = summary['syn_ack_time']
+    if syn_time is not None and syn_ack_time is not None and syn_ack_time > syn_time:
+        rtt_ms = (syn_ack_time - syn_time) * 1000  # Convert to milliseconds
+    
+    return {
+        'rtt_ms': rtt_ms,
+        'duration_sec': summary['last_timestamp'] - summary['first_timestamp'],
+        'total_volume_bytes': summary['total_volume_bytes'],
+        'packet_count': summary['packet_count'],
+        'sample_rate': summary['sample_rate']
+    }
 
 def calculate_conversation_metrics(packets):
     """Calculate all conversation metrics."""
     if not packets:
         return None
+    return metrics_from_summary(summarize_packets(packets))
+
+def format_partial(conversation_key, summary):
+    """Partial result line for one salt of a hot conversation."""
+    values = [summary[field] for field in PARTIAL_FIELDS]
+    return '\t'.join([conversation_key, PARTIAL] + ['-' if value is None else repr(value) for value in values])
+
+def parse_partial(fields):
+    """Summary from the fields of a partial result line after the marker."""
+    summary = {}
+    for field, value in zip(PARTIAL_FIELDS, fields):
+        if value == '-':
+            summary[field] = None
+        elif field == 'total_volume_bytes' or field == 'packet_count':
+            summary[field] = int(value)
+        else:
+            summary[field] = float(value)
+    return summary
+
+def format_metrics(conversation_key, metrics):
+    """Output line for a conversation."""
+    rtt_ms = metrics['rtt_ms']
     
-    # Sort packets by timestamp
-    sorted_packets = sorted(packets, key=lambda p: p.get('timestamp', 0))
-    
-    # Calculate duration
-    first_timestamp = sorted_packets[0].get('timestamp', 0)
-    last_timestamp = sorted_packets[-1].get('timestamp', 0)
-    duration_sec = last_timestamp - first_timestamp
-    
-    # Calculate total volume
-    total_volume = sum(packet.get('size', 0) for packet in packets)
+    # Handle None RTT (no valid SYN/SYN-ACK pair)
+    rtt_str = f"{rtt_ms:.3f}" if rtt_ms is not None else "N/A"
     
-    # Calculate packet count
-    packet_count = len(packets)
+    # Sampled conversations carry their weight as an extra column
+    sample_rate = metrics['sample_rate']
+    weight_str = f"\t{1.0 / sample_rate:.6g}" if sample_rate else ""
     
-    # Calculate RTT
-    rtt_ms = calculate_rtt(packets)
+    reporter.incr('Conversations output')
+    if rtt_ms is None:
+        reporter.incr('Conversations without RTT')
+    return (f"{conversation_key}\t{rtt_str}\t{metrics['duration_sec']:.6f}"
+            f"\t{metrics['total_volume_bytes']}\t{metrics['packet_count']}{weight_str}")
+
+def merge():
+    """Merge the partial results written by the first job for salted conversations."""
+    partials = defaultdict(list)
+    for line in sys.stdin:
+        line = line.rstrip('\n')
+        parts = line.split('\t')
+        if len(parts) < 2:
+            continue
+        if parts[1] != PARTIAL:
+            # Conversations that were not salted are already complete
+            print(line)
+            continue
+        if len(parts) != len(PARTIAL_FIELDS) + 2:
+            print(f"Invalid partial result: {line}", file=sys.stderr)
+            reporter.incr('Invalid records')
+            continue
+        try:
+            partials[parts[0]].append(parse_partial(parts[2:]))
+        except ValueError:
+            print(f"Invalid partial result: {line}", file=sys.stderr)
+            reporter.incr('Invalid records')
+            continue
+        reporter.incr('Partial results read')
     
-    return {
-        'rtt_ms': rtt_ms,
-        'duration_sec': duration_sec,
-        'total_volume_bytes': total_volume,
-        'packet_count': packet_count
-    }
+    for conversation_key, summaries in partials.items():
+        print(format_metrics(conversation_key, metrics_from_summary(merge_summaries(summaries))))
 
 def main():
     """Main reducer function."""
+    if '--merge' in sys.argv[1:]:
+        try:
+            merge()
+        finally:
+            reporter.close()
+        return
     try:
         # Dictionary to store packets per conversation
         conversations = defaultdict(list)
@@ -83,12 +203,14 @@ def main():
             line = line.strip()
             if not line:
                 continue
+            reporter.incr('Packets read')
                 
             try:
                 # Parse mapper output: Conversation_Key\tJSON_Packet_Data
                 parts = line.split('\t', 1)
                 if len(parts) != 2:
                     print(f"Invalid mapper output: {line}", file=sys.stderr)
+                    reporter.incr('Invalid records')
                     continue
                 
                 conversation_key = parts[0]
@@ -100,6 +222,7 @@ def main():
                 
             except json.JSONDecodeError:
                 print(f"Invalid JSON packet data: {line}", file=sys.stderr)
+                reporter.incr('Invalid records')
                 continue
             except Exception as e:
                 print(f"Error processing line: {e}", file=sys.stderr)
@@ -107,26 +230,22 @@ def main():
         
         # Calculate and output metrics for each conversation
         for conversation_key, packets in conversations.items():
-            metrics = calculate_conversation_metrics(packets)
-            
-            if metrics:
-                rtt_ms = metrics['rtt_ms']
-                duration_sec = metrics['duration_sec']
-                total_volume_bytes = metrics['total_volume_bytes']
-                packet_count = metrics['packet_count']
-                
-                # Handle None RTT (no valid SYN/SYN-ACK pair)
-                rtt_str = f"{rtt_ms:.3f}" if rtt_ms is not None else "N/A"
-                
-                # Output in TSV format
-                print(f"{conversation_key}\t{rtt_str}\t{duration_sec:.6f}\t{total_volume_bytes}\t{packet_count}")
-            else:
+            if not packets:
                 print(f"No valid metrics for conversation: {conversation_key}", file=sys.stderr)
+            elif skew.unsalt(conversation_key)[1]:
+                # Part of a hot conversation, completed by the merge job
+                print(format_partial(conversation_key, summarize_packets(packets)))
+                reporter.incr('Partial results output')
+            else:
+                # Output in TSV format
+                print(format_metrics(conversation_key, calculate_conversation_metrics(packets)))
             
     except Exception as e:
         print(f"Fatal error in reducer: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        reporter.close()
 
 if __name__ == "__main__":
-    main()
+    instrumentation.run_main(main, 'conversation-reducer')
 
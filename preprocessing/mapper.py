@@ -14,6 +14,16 @@ import os
 import tempfile
 import re
 
+# Hadoop Streaming symlinks every -files entry into the task's working directory
+# from a cache directory of its own, so on a cluster the helpers are found there
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import instrumentation
+import bloom
+import run_index
+import sampling
+import stream_io
+
 # Configure Scapy to use a writable temp directory for cache/config
 # This fixes permission issues in Hadoop YARN containers
 os.environ['HOME'] = tempfile.gettempdir()
@@ -24,27 +34,134 @@ from scapy.layers.l2 import Ether
 
 # Configuration flags (can be controlled via environment variables)
 INCLUDE_NON_IP = os.environ.get('INCLUDE_NON_IP', 'false').lower() in ('1', 'true', 'yes', 'y')
+# When set, every record is tagged with this run id so captures can be
+# analysed in one batched job and the results split back per capture.
+RUN_ID = os.environ.get('RUN_ID') or None
+# Duplicate packets (the same packet captured on several taps) are dropped when
+# DEDUP_WINDOW is set to the largest timestamp difference between copies, in
+# seconds. DEDUP_RETENTION (seconds of packet time, default DEDUP_WINDOW) and
+# DEDUP_STATE (a filter file loaded at start and merged back at the end) extend
+# deduplication across captures; see common/bloom.py.
+DEDUP_WINDOW = float(os.environ.get('DEDUP_WINDOW') or 0)
+DEDUP_RETENTION = float(os.environ.get('DEDUP_RETENTION') or 0) or None
+DEDUP_CAPACITY = int(os.environ.get('DEDUP_CAPACITY') or 50000)
+DEDUP_ERROR_RATE = float(os.environ.get('DEDUP_ERROR_RATE') or 0.001)
+DEDUP_PAYLOAD_BYTES = int(os.environ.get('DEDUP_PAYLOAD_BYTES') or 128)
+DEDUP_STATE = os.environ.get('DEDUP_STATE') or None
+# When set, the updated filter is written here instead of being merged into
+# DEDUP_STATE, so the caller can commit it only once the output is stored.
+DEDUP_STATE_OUT = os.environ.get('DEDUP_STATE_OUT') or None
+# Share of a capture's packets dropped as duplicates above which a warning is
+# printed: usually the capture was already decoded into the same filter.
+DEDUP_WARN_FRACTION = 0.9
+# Whole flows are sampled when SAMPLE_RATE is below 1 or SAMPLE_TARGET_PPS is
+# set: a flow is kept or dropped as a whole and every kept record carries the
+# `sample_rate` it was kept with, so the analysis jobs can scale results back
+# up. With SAMPLE_TARGET_PPS the rate follows the input packet rate (between
+# SAMPLE_MIN_RATE and SAMPLE_RATE) to keep about that many records per second
+# of capture time; see common/sampling.py.
+SAMPLE_RATE = float(os.environ.get('SAMPLE_RATE') or 1.0)
+SAMPLE_TARGET_PPS = float(os.environ.get('SAMPLE_TARGET_PPS') or 0) or None
+SAMPLE_MIN_RATE = float(os.environ.get('SAMPLE_MIN_RATE') or 0.001)
+SAMPLE_IDLE_TIMEOUT = float(os.environ.get('SAMPLE_IDLE_TIMEOUT') or 120)
+# The sampler is restored from SAMPLE_STATE and saved to SAMPLE_STATE_OUT when
+# set, so a capture decoded in several pieces (checkpointed chunks) is sampled
+# exactly as in one run. DEDUP_STATE/DEDUP_STATE_OUT do the same for the filter.
+SAMPLE_STATE = os.environ.get('SAMPLE_STATE') or None
+SAMPLE_STATE_OUT = os.environ.get('SAMPLE_STATE_OUT') or None
+# With INDEX_STATE_OUT, the time range, counts, addresses and ports of the
+# records written are collected for the run's sidecar index and saved there,
+# continuing the index in INDEX_STATE; see common/run_index.py.
+INDEX_STATE = os.environ.get('INDEX_STATE') or None
+INDEX_STATE_OUT = os.environ.get('INDEX_STATE_OUT') or None
+# Input is read ahead and output written by separate threads (see
+# common/stream_io.py); records are handed to the writer in batches of this size.
+OUTPUT_BATCH_RECORDS = int(os.environ.get('OUTPUT_BATCH_RECORDS') or 1024)
+
+IP_PATTERN = re.compile(r'^(\d{1,3}\.){3}\d{1,3}$')
+PROTO_MAP = {1: 'ICMP', 6: 'TCP', 17: 'UDP'}
+
+reporter = instrumentation.Reporter('Preprocessing')
 
 def extract_tcp_flags(packet):
     """Extract TCP flags as a string representation."""
     if packet.haslayer(TCP):
         flags = []
-        tcp_layer = packet[TCP]
-        if tcp_layer.flags & 0x02:  # SYN
+        tcp_flags = int(packet[TCP].flags)
+        if tcp_flags & 0x02:  # SYN
             flags.append('S')
-        if tcp_layer.flags & 0x10:  # ACK
+        if tcp_flags & 0x10:  # ACK
             flags.append('A')
-        if tcp_layer.flags & 0x01:  # FIN
+        if tcp_flags & 0x01:  # FIN
             flags.append('F')
-        if tcp_layer.flags & 0x04:  # RST
+        if tcp_flags & 0x04:  # RST
             flags.append('R')
-        if tcp_layer.flags & 0x08:  # PSH
+        if tcp_flags & 0x08:  # PSH
             flags.append('P')
-        if tcp_layer.flags & 0x20:  # URG
+        if tcp_flags & 0x20:  # URG
             flags.append('U')
         return ''.join(flags)
     return None
 
+def make_dedup_filter():
+    """Create the duplicate filter configured by the DEDUP_* variables, or None."""
+    if DEDUP_WINDOW <= 0:
+        return None
+    dedup = bloom.RotatingBloomFilter(DEDUP_WINDOW, DEDUP_CAPACITY, DEDUP_ERROR_RATE, DEDUP_RETENTION)
+    if DEDUP_STATE:
+        bloom.load_state(dedup, DEDUP_STATE)
+    return dedup
+
+def save_dedup_filter(dedup):
+    """Persist the duplicate filter for the next capture, if configured."""
+    if dedup is None:
+        return
+    if DEDUP_STATE_OUT:
+        bloom.save_state(dedup, DEDUP_STATE_OUT, merge=False)
+    elif DEDUP_STATE:
+        bloom.save_state(dedup, DEDUP_STATE)
+
+def make_flow_sampler():
+    """Create the flow sampler configured by the SAMPLE_* variables, or None."""
+    if SAMPLE_RATE >= 1.0 and not SAMPLE_TARGET_PPS:
+        return None
+    sampler = sampling.FlowSampler(SAMPLE_RATE, SAMPLE_TARGET_PPS, SAMPLE_MIN_RATE, SAMPLE_IDLE_TIMEOUT)
+    if SAMPLE_STATE:
+        sampling.load_state(sampler, SAMPLE_STATE)
+    return sampler
+
+def save_flow_sampler(sampler):
+    """Persist the flow sampler for the next piece of the capture, if configured."""
+    if sampler is not None and SAMPLE_STATE_OUT:
+        sampling.save_state(sampler, SAMPLE_STATE_OUT)
+
+def make_run_index():
+    """Create the run index configured by INDEX_STATE/INDEX_STATE_OUT, or None."""
+    if not INDEX_STATE_OUT:
+        return None
+    index = run_index.RunIndex()
+    if INDEX_STATE:
+        run_index.load_state(index, INDEX_STATE)
+    return index
+
+def save_run_index(index):
+    if index is not None:
+        run_index.save_state(index, INDEX_STATE_OUT)
+
+def dedup_key(packet):
+    """Bytes that are identical in every captured copy of an IP packet.
+
+    The link layer differs between taps and TOS, TTL and the header checksum
+    can change hop by hop, so the key is the IP length, id, fragment fields,
+    protocol and addresses plus the start of the IP payload.
+    """
+    if not packet.haslayer(IP):
+        return None
+    ip_layer = packet[IP]
+    data = getattr(ip_layer, 'original', None) or bytes(ip_layer)
+    header_len = (data[0] & 0x0F) * 4
+    return data[2:8] + data[9:10] + data[12:20] + data[header_len:header_len + DEDUP_PAYLOAD_BYTES]
+
 def process_packet(packet):
     """Process a single packet and return JSON representation."""
     try:
@@ -67,16 +184,15 @@ def process_packet(packet):
             dst_ip = str(ip_layer.dst)
             
             # Validate IP format
-            ip_pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
-            if not (re.match(ip_pattern, src_ip) and re.match(ip_pattern, dst_ip)):
+            if not (IP_PATTERN.match(src_ip) and IP_PATTERN.match(dst_ip)):
                 print(f"Warning: Invalid IP format: {src_ip} -> {dst_ip}", file=sys.stderr)
+                reporter.incr('Invalid IP packets')
                 return None
             
             proto = ip_layer.proto
             
             # Map protocol numbers to names
-            proto_map = {1: 'ICMP', 6: 'TCP', 17: 'UDP'}
-            proto = proto_map.get(proto, f'IP_{proto}')
+            proto = PROTO_MAP.get(proto, f'IP_{proto}')
             
             # Extract port information for TCP/UDP
             if packet.haslayer(TCP):
@@ -121,6 +237,7 @@ def process_packet(packet):
     except Exception as e:
         # Log error to stderr (captured by Hadoop logs)
         print(f"Error processing packet: {e}", file=sys.stderr)
+        reporter.incr('Packet errors')
         return None
 
 def main():
@@ -128,44 +245,107 @@ def main():
     packets_processed = 0
     packets_with_ip = 0
     packets_output = 0
+    packets_duplicate = 0
+    packets_sampled_out = 0
+    dedup = make_dedup_filter()
+    sampler = make_flow_sampler()
+    index = make_run_index()
+    writer = stream_io.ChunkWriter(sys.stdout.buffer)
+    lines = []
+    source = sys.stdin.buffer
     
     try:
-        # Read PCAP data from stdin using streaming PcapReader
-        # This enables packet-by-packet processing without loading entire file into memory
-        reader = PcapReader(sys.stdin.buffer)
+        # Read PCAP data from stdin using streaming PcapReader over the
+        # read-ahead buffers, so decoding never waits for the disk or pipe
+        # and the capture is never loaded into memory as a whole
+        source = stream_io.open_input(sys.stdin.buffer)
+        reader = PcapReader(source)
         
         for packet in reader:
             packets_processed += 1
+            reporter.incr('Packets read')
+            
+            if dedup is not None:
+                key = dedup_key(packet)
+                if key is not None and dedup.seen(key, float(packet.time)):
+                    packets_duplicate += 1
+                    reporter.incr('Duplicate packets')
+                    continue
             
             packet_record = process_packet(packet)
+            if packet_record and sampler is not None and packet_record['src_ip']:
+                rate = sampler.keep(
+                    sampling.flow_key(packet_record['src_ip'], packet_record['src_port'],
+                                      packet_record['dst_ip'], packet_record['dst_port'],
+                                      packet_record['proto']),
+                    packet_record['timestamp'],
+                )
+                if rate is None:
+                    packets_sampled_out += 1
+                    reporter.incr('Packets sampled out')
+                    packet_record = None
+                else:
+                    packet_record['sample_rate'] = round(rate, 6)
             if packet_record:
+                if RUN_ID:
+                    packet_record['run_id'] = RUN_ID
                 if packet_record.get('src_ip') and packet_record.get('dst_ip'):
                     packets_with_ip += 1
+                    reporter.incr('Packets with IP')
                 packets_output += 1
-                # Output JSON line to stdout
-                print(json.dumps(packet_record))
-                sys.stdout.flush()  # Ensure immediate output
+                reporter.incr('Records output')
+                if index is not None:
+                    index.add(packet_record)
+                # Output JSON lines to stdout in batches via the writer thread
+                lines.append(json.dumps(packet_record))
+                if len(lines) >= OUTPUT_BATCH_RECORDS:
+                    writer.write_lines(lines)
             
-            # Log progress every 100 packets
-            if packets_processed % 100 == 0:
-                print(f"Progress: {packets_processed} processed, {packets_with_ip} with IP, {packets_output} output", file=sys.stderr)
+            # Progress goes to the task status, written at the report interval
+            if packets_processed % 1000 == 0:
+                reporter.status(f"{packets_processed} processed, {packets_with_ip} with IP, {packets_output} output")
         
         reader.close()
+        save_dedup_filter(dedup)
+        save_flow_sampler(sampler)
+        save_run_index(index)
         
         # Final statistics
-        print(f"Mapper completed: {packets_processed} processed, {packets_output} output ({100.0*packets_output/packets_processed:.1f}%)", file=sys.stderr)
+        print(f"Mapper completed: {packets_processed} processed, {packets_output} output ({100.0*packets_output/max(packets_processed, 1):.1f}%)", file=sys.stderr)
+        if dedup is not None:
+            print(f"Dropped {packets_duplicate} duplicate packets (filter memory {dedup.memory_bytes() / 1e6:.1f} MB)", file=sys.stderr)
+            if packets_duplicate > DEDUP_WARN_FRACTION * packets_processed:
+                print(f"WARNING: {packets_duplicate} of {packets_processed} packets "
+                      f"({100.0*packets_duplicate/packets_processed:.1f}%) were dropped as duplicates. "
+                      f"Unless another tap captured the same traffic, this capture was already "
+                      f"recorded in the duplicate filter {DEDUP_STATE or '(none)'}; replaying it "
+                      f"needs a fresh filter state file.", file=sys.stderr)
+        if sampler is not None:
+            print(f"Sampled out {packets_sampled_out} packets (final rate {sampler.rate:.4f}, {len(sampler.flows)} flows tracked)", file=sys.stderr)
         
     except Exception as e:
         # Log but don't fail - partial reads expected with PCAP splits
         print(f"Warning: PCAP read ended with: {e}", file=sys.stderr)
         # Drain remaining stdin to avoid Hadoop "Broken pipe" when mapper exits early
         try:
-            while sys.stdin.buffer.read(65536):
-                pass
+            stream_io.drain(source)
         except Exception:
             pass
+        reporter.incr('Truncated reads')
+        save_dedup_filter(dedup)
+        save_flow_sampler(sampler)
+        save_run_index(index)
         print(f"Final stats: {packets_processed} processed, {packets_output} output", file=sys.stderr)
+    finally:
+        try:
+            writer.write_lines(lines)
+            writer.close()
+        except OSError as e:
+            # Same as a failed print: the reader of stdout went away
+            print(f"Warning: output ended with: {e}", file=sys.stderr)
+        finally:
+            reporter.close()
 
 if __name__ == "__main__":
-    main()
+    instrumentation.run_main(main, 'preprocessing-mapper')
 
@@ -7,8 +7,17 @@ It acts as an identity reducer (pass-through) with validation.
 """
 
 import sys
+import os
 import json
 
+# Hadoop Streaming symlinks every -files entry into the task's working directory
+# from a cache directory of its own, so on a cluster the helpers are found there
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import instrumentation
+
+reporter = instrumentation.Reporter('Preprocessing')
+
 def validate_json_line(line):
     """Validate that a line contains valid JSON."""
     try:
@@ -33,6 +42,7 @@ def main():
                 # Output valid JSON line (stripped to remove trailing tabs)
                 print(line.strip())
                 valid_count += 1
+                reporter.incr('Valid records')
             else:
                 # Log invalid JSON with diagnostic info
                 try:
@@ -41,6 +51,7 @@ def main():
                 except:
                     print(f"Invalid JSON syntax: {line[:100]}", file=sys.stderr)
                 invalid_count += 1
+                reporter.incr('Invalid records')
         
         # Final statistics
         print(f"Reducer completed: {valid_count} valid, {invalid_count} invalid", file=sys.stderr)
@@ -48,7 +59,9 @@ def main():
     except Exception as e:
         print(f"Fatal error in reducer: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        reporter.close()
 
 if __name__ == "__main__":
-    main()
+    instrumentation.run_main(main, 'preprocessing-reducer')
 
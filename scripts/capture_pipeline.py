@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Staged, bounded worker-pool pipeline used by the PCAP watcher.
+
+Each capture flows through an ordered list of stages (e.g. preprocess+upload,
+traffic job, conversation job). Every stage has its own pool of worker threads
+and is connected to the next one through a bounded queue, so a slow stage
+applies backpressure all the way back to submit(). Captures are completed
+strictly in submission order: a capture that finishes early waits in a small
+reorder buffer until every earlier capture has completed, which keeps the
+watcher state consistent with the order captures were detected in.
+"""
+
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+
+@dataclass
+class CaptureJob:
+    """A single capture moving through the pipeline."""
+
+    local_path: Path
+    run_id: str
+    size: int
+    mtime: float
+    paths: Dict[str, str] = field(default_factory=dict)
+    # Tail checkpoint ({"offset", "packets", "chunks"}) when part of the
+    # capture was already preprocessed while it was still being written.
+    checkpoint: Optional[Dict[str, int]] = None
+    # Stages that already completed for this run id before a restart.
+    completed_stages: Set[str] = field(default_factory=set)
+    # In-memory capture (a window of a live stream) decoded instead of local_path.
+    data: Optional[bytes] = None
+    seq: int = -1
+    error: Optional[BaseException] = None
+    failed_stage: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Key of the capture in the watcher's state store: the resolved path of a
+    # capture file; stream windows, which have no file, set their own.
+    state_key: str = ""
+
+    def __post_init__(self) -> None:
+        if not self.state_key:
+            self.state_key = str(self.local_path.resolve())
+
+
+@dataclass
+class Stage:
+    """A pipeline stage.
+
+    With ``batch_size`` > 1 the stage is batched: each worker collects up to
+    ``batch_size`` captures (waiting at most ``max_wait`` seconds after the
+    first one arrives) and ``func`` is called once with the list.
+    """
+
+    name: str
+    func: Callable
+    workers: int = 1
+    batch_size: int = 1
+    max_wait: float = 0.0
+
+
+_STOP = object()
+
+
+class CapturePipeline:
+    """Run CaptureJobs through stages with bounded queues between them."""
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        queue_depth: int,
+        on_complete: Callable[[CaptureJob], None],
+    ) -> None:
+        if not stages:
+            raise ValueError("CapturePipeline needs at least one stage")
+        self.stages = list(stages)
+        self.on_complete = on_complete
+        self._seq = itertools.count()
+        self._queues: List["queue.Queue[object]"] = [
+            queue.Queue(maxsize=max(1, queue_depth)) for _ in range(len(self.stages) + 1)
+        ]
+        self._lock = threading.Condition()
+        self._in_flight: Dict[Path, CaptureJob] = {}
+        self._threads: List[threading.Thread] = []
+
+        for index, stage in enumerate(self.stages):
+            for worker in range(max(1, stage.workers)):
+                target = self._batch_worker if stage.batch_size > 1 else self._stage_worker
+                thread = threading.Thread(
+                    target=target,
+                    args=(stage, self._queues[index], self._queues[index + 1]),
+                    name=f"{stage.name}-{worker}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        committer = threading.Thread(
+            target=self._commit_worker,
+            args=(self._queues[-1],),
+            name="commit",
+            daemon=True,
+        )
+        committer.start()
+        self._threads.append(committer)
+
+    def is_in_flight(self, path: Path) -> bool:
+        with self._lock:
+            return path in self._in_flight
+
+    def in_flight_count(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {stage.name: self._queues[i].qsize() for i, stage in enumerate(self.stages)}
+
+    def submit(self, job: CaptureJob) -> None:
+        """Queue a capture, blocking while the first stage's queue is full."""
+        with self._lock:
+            job.seq = next(self._seq)
+            self._in_flight[job.local_path] = job
+        job.timings["submitted"] = time.time()
+        self._queues[0].put(job)
+
+    def drain(self) -> None:
+        """Block until every submitted capture has completed."""
+        with self._lock:
+            while self._in_flight:
+                self._lock.wait()
+
+    def shutdown(self) -> None:
+        """Drain outstanding work and stop all worker threads."""
+        self.drain()
+        for index, stage in enumerate(self.stages):
+            for _ in range(max(1, stage.workers)):
+                self._queues[index].put(_STOP)
+        self._queues[-1].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _stage_worker(
+        self,
+        stage: Stage,
+        inbox: "queue.Queue[object]",
+        outbox: "queue.Queue[object]",
+    ) -> None:
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                return
+            assert isinstance(job, CaptureJob)
+            if job.error is None:
+                started = time.monotonic()
+                try:
+                    stage.func(job)
+                except Exception as exc:
+                    job.error = exc
+                    job.failed_stage = stage.name
+                job.timings[stage.name] = time.monotonic() - started
+            outbox.put(job)
+
+    def _batch_worker(
+        self,
+        stage: Stage,
+        inbox: "queue.Queue[object]",
+        outbox: "queue.Queue[object]",
+    ) -> None:
+        stopping = False
+        while not stopping:
+            first = inbox.get()
+            if first is _STOP:
+                return
+            batch: List[CaptureJob] = [first]  # type: ignore[list-item]
+            deadline = time.monotonic() + stage.max_wait
+            while len(batch) < stage.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = inbox.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stopping = True
+                    break
+                batch.append(job)  # type: ignore[arg-type]
+
+            runnable = [job for job in batch if job.error is None]
+            if runnable:
+                started = time.monotonic()
+                try:
+                    stage.func(runnable)
+                except Exception as exc:
+                    for job in runnable:
+                        job.error = exc
+                        job.failed_stage = stage.name
+                elapsed = time.monotonic() - started
+                for job in runnable:
+                    job.timings[stage.name] = elapsed
+            for job in batch:
+                outbox.put(job)
+
+    def _commit_worker(self, inbox: "queue.Queue[object]") -> None:
+        next_seq = 0
+        waiting: Dict[int, CaptureJob] = {}
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                return
+            assert isinstance(job, CaptureJob)
+            waiting[job.seq] = job
+            while next_seq in waiting:
+                ready = waiting.pop(next_seq)
+                next_seq += 1
+                try:
+                    self.on_complete(ready)
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    with self._lock:
+                        self._in_flight.pop(ready.local_path, None)
+                        self._lock.notify_all()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Incremental reader for captures that are still being written.
+
+read_appended_records() finds the complete pcap/pcapng records appended
+after a checkpointed byte offset by walking their headers in small blocks,
+without holding the records in memory. The returned TailChunk streams them
+from the file, prefixed with the capture's preamble, so they can be fed to
+preprocessing/mapper.py as a self-contained capture. A partially written
+trailing record is left for the next call.
+"""
+
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "common"))
+
+from pcap_stream import PcapFormatError, read_preamble  # noqa: E402,F401
+
+# Bytes read at a time, both to find record boundaries and to stream a chunk.
+BLOCK_SIZE = 1024 * 1024
+
+
+@dataclass
+class TailChunk:
+    """Whole records path[start_offset:end_offset], read lazily by blocks()."""
+
+    path: Path
+    preamble: bytes
+    packets: int
+    start_offset: int
+    end_offset: int
+
+    @property
+    def size(self) -> int:
+        return self.end_offset - self.start_offset
+
+    def blocks(self, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+        """The chunk as a self-contained capture: the preamble, then its records."""
+        yield self.preamble
+        with open(self.path, "rb") as handle:
+            handle.seek(self.start_offset)
+            remaining = self.size
+            while remaining > 0:
+                block = handle.read(min(block_size, remaining))
+                if not block:
+                    raise OSError(f"{self.path} shrank below byte {self.end_offset} while being read")
+                remaining -= len(block)
+                yield block
+
+
+def new_checkpoint() -> Dict[str, int]:
+    return {"offset": 0, "packets": 0, "chunks": 0}
+
+
+def read_appended_records(path: Path, offset: int, max_bytes: int) -> Optional[TailChunk]:
+    """Find the whole records from ``offset`` (at most ~max_bytes); None if nothing new.
+
+    Only BLOCK_SIZE bytes are held at a time; a record larger than a block is
+    read in growing blocks until it is whole. A first record larger than
+    max_bytes still makes up a chunk of its own.
+    """
+    with open(path, "rb") as handle:
+        framing, preamble_len = read_preamble(handle)
+        if framing is None:
+            return None
+        start = max(offset, preamble_len)
+        limit = start + max_bytes
+        position = start
+        packets = 0
+        block_size = BLOCK_SIZE
+        while position < limit:
+            want = min(block_size, limit - position)
+            handle.seek(position)
+            buffer = handle.read(want)
+            record_offsets, consumed = framing.split(buffer)
+            if record_offsets:
+                packets += sum(1 for record in record_offsets if framing.is_packet(buffer, record))
+                position += consumed
+            elif len(buffer) < want:
+                break  # end of the data written so far
+            elif want == block_size:
+                block_size *= 2  # a record larger than the block
+            elif position == start:
+                limit += max_bytes  # a single record larger than max_bytes
+            else:
+                break  # the next record does not fit in this chunk
+
+    if position == start:
+        return None
+    return TailChunk(
+        path=path,
+        preamble=framing.preamble,
+        packets=packets,
+        start_offset=start,
+        end_offset=position,
+    )
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Find the hot keys of a traffic volume or conversation analysis job.
+
+Reads preprocessing JSON records (a sample is enough, e.g. the first few
+hundred thousand records of the job input) and prints, comma-separated, the
+keys that carry at least --min-share of the job's map output: IP addresses
+for the traffic volume job, conversation keys for the conversation job. The
+result is meant for SKEW_HOT_KEYS (see common/skew.py); the run scripts call
+this automatically with SKEW_DETECT=1:
+
+    hadoop fs -text /output/preprocessing/* | head -n 200000 \\
+        | python3 scripts/find_hot_keys.py --job traffic --reducers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+
+def conversation_key(src_ip: str, src_port: int, dst_ip: str, dst_port: int) -> str:
+    """Same normalized key as conversation_analysis/mapper.py."""
+    key1 = f"{src_ip}:{src_port}-{dst_ip}:{dst_port}"
+    key2 = f"{dst_ip}:{dst_port}-{src_ip}:{src_port}"
+    return key1 if key1 < key2 else key2
+
+
+def count_keys(lines: Iterable[str], job: str) -> Tuple[Counter, int]:
+    """Count the map output records per key; returns (counts, total records)."""
+    counts: Counter = Counter()
+    total = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        src_ip, dst_ip = record.get("src_ip"), record.get("dst_ip")
+        if not src_ip or not dst_ip:
+            continue
+        if job == "traffic":
+            counts[src_ip] += 1
+            counts[dst_ip] += 1
+            total += 2
+        elif record.get("proto") == "TCP" and record.get("src_port") and record.get("dst_port"):
+            counts[conversation_key(src_ip, record["src_port"], dst_ip, record["dst_port"])] += 1
+            total += 1
+    return counts, total
+
+
+def hot_keys(counts: Counter, total: int, min_share: float, max_keys: int) -> List[Tuple[str, int]]:
+    threshold = min_share * total
+    return [(key, count) for key, count in counts.most_common(max_keys) if total and count >= threshold]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Print the hot keys of an analysis job's input.")
+    parser.add_argument("--job", choices=("traffic", "conversation"), required=True)
+    parser.add_argument(
+        "--reducers",
+        type=int,
+        default=8,
+        help="Reducers of the job; a key is hot when it alone carries more than half "
+        "of an average reducer's share (default: 8).",
+    )
+    parser.add_argument(
+        "--min-share",
+        type=float,
+        help="Share of the map output above which a key is hot (overrides --reducers).",
+    )
+    parser.add_argument("--max-keys", type=int, default=32, help="Report at most this many keys.")
+    parser.add_argument("files", nargs="*", help="Record files (default: stdin).")
+    args = parser.parse_args(argv)
+
+    min_share = args.min_share if args.min_share is not None else 0.5 / max(1, args.reducers)
+    if args.files:
+        counts: Counter = Counter()
+        total = 0
+        for name in args.files:
+            with open(name, encoding="utf-8", errors="replace") as handle:
+                file_counts, file_total = count_keys(handle, args.job)
+            counts.update(file_counts)
+            total += file_total
+    else:
+        counts, total = count_keys(sys.stdin, args.job)
+
+    keys = hot_keys(counts, total, min_share, args.max_keys)
+    for key, count in keys:
+        print(f"Hot key {key}: {count} of {total} records ({100.0 * count / total:.1f}%)", file=sys.stderr)
+    if not keys:
+        print(f"No key carries {100.0 * min_share:.1f}% of {total} records", file=sys.stderr)
+    print(",".join(key for key, _ in keys))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
+import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import compression
+import sampling
+
 def format_size(size_bytes):
     """Format bytes into human readable string."""
     try:
@@ -13,8 +18,18 @@ def format_size(size_bytes):
     except ValueError:
         return str(size_bytes)
 
+def read_lines(paths):
+    """Lines of the given result files, or of stdin; compressed input is decompressed."""
+    if not paths:
+        return compression.text_input().readlines()
+    lines = []
+    for path in paths:
+        with compression.text_input(open(path, 'rb')) as handle:
+            lines.extend(handle)
+    return lines
+
 def main():
-    lines = sys.stdin.readlines()
+    lines = read_lines(sys.argv[1:])
     if not lines:
         return
 
@@ -22,12 +37,20 @@ def main():
     first_line_parts = lines[0].strip().split('\t')
     num_cols = len(first_line_parts)
 
+    # Flow-sampled runs add CI columns to traffic output and a weight to
+    # conversations; conversation keys look like "a:pa-b:pb"
+    is_conversation = '-' in first_line_parts[0] and ':' in first_line_parts[0]
+
     headers = []
     if num_cols == 3:
         headers = ["IP Address", "Bytes Sent", "Bytes Recv"]
         # Optional: Format byte columns
+    elif num_cols == 5 and not is_conversation:
+        headers = ["IP Address", "Est. Sent", "Est. Recv", "Sent ±95%", "Recv ±95%"]
     elif num_cols == 5:
         headers = ["Conversation", "RTT (ms)", "Duration (s)", "Volume", "Packets"]
+    elif num_cols == 6:
+        headers = ["Conversation", "RTT (ms)", "Duration (s)", "Volume", "Packets", "Weight"]
     else:
         # Fallback for unknown formats
         headers = [f"Col {i+1}" for i in range(num_cols)]
@@ -35,17 +58,28 @@ def main():
     # Calculate column widths
     col_widths = [len(h) for h in headers]
     data = []
+    # (value, sample rate) per sampled conversation, for the estimated totals
+    sampled_conversations = []
+    sampled_volumes = []
     
     for line in lines:
         parts = line.strip().split('\t')
         # Pad with empty strings if line is short
         parts += [''] * (len(headers) - len(parts))
         
+        if num_cols == 6:
+            try:
+                rate = 1.0 / float(parts[5])
+                sampled_conversations.append((1, rate))
+                sampled_volumes.append((int(parts[3]), rate))
+            except (ValueError, ZeroDivisionError):
+                pass
+        
         # Format specific columns if known type
-        if num_cols == 3:
-            parts[1] = format_size(parts[1])
-            parts[2] = format_size(parts[2])
-        elif num_cols == 5:
+        if num_cols == 3 or (num_cols == 5 and not is_conversation):
+            for i in range(1, num_cols):
+                parts[i] = format_size(parts[i])
+        elif num_cols in (5, 6):
             parts[3] = format_size(parts[3])
 
         data.append(parts)
@@ -62,5 +96,13 @@ def main():
     for parts in data:
         print(" | ".join(str(p).ljust(w) for p, w in zip(parts, col_widths)))
 
+    if sampled_conversations:
+        count, count_ci = sampling.estimate_total(sampled_conversations)
+        volume, volume_ci = sampling.estimate_total(sampled_volumes)
+        print("-" * len(header_row))
+        print(f"Sampled: {len(sampled_conversations)} conversations shown; estimated totals "
+              f"{count:.0f} ± {count_ci:.0f} conversations, "
+              f"{format_size(volume)} ± {format_size(volume_ci)} (95% confidence)")
+
 if __name__ == "__main__":
     main()
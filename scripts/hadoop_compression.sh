@@ -0,0 +1,43 @@
+#!/bin/bash
+# Hadoop compression options shared by the run_*.sh job scripts (sourced).
+#
+#   MAP_OUTPUT_CODEC    codec for the map output sent over the shuffle: lz4
+#                       (default; built into Hadoop 3.3+), snappy, zstd, gzip,
+#                       bzip2, a codec class name, or none
+#   OUTPUT_COMPRESSION  codec for the job's output files: none (default), gzip
+#                       or bzip2. Hadoop reads compressed inputs transparently
+#                       and bzip2 files stay splittable, so a bzip2-compressed
+#                       preprocessing output is still read by many map tasks
+#
+# Sets COMPRESSION_OPTS to the generic -D options for `hadoop jar`.
+
+codec_class() {
+    case "$1" in
+        lz4)     echo "org.apache.hadoop.io.compress.Lz4Codec" ;;
+        snappy)  echo "org.apache.hadoop.io.compress.SnappyCodec" ;;
+        zstd)    echo "org.apache.hadoop.io.compress.ZStandardCodec" ;;
+        gzip)    echo "org.apache.hadoop.io.compress.GzipCodec" ;;
+        bzip2)   echo "org.apache.hadoop.io.compress.BZip2Codec" ;;
+        deflate) echo "org.apache.hadoop.io.compress.DefaultCodec" ;;
+        *)       echo "$1" ;;
+    esac
+}
+
+COMPRESSION_OPTS=()
+MAP_OUTPUT_CODEC=${MAP_OUTPUT_CODEC:-lz4}
+if [ "$MAP_OUTPUT_CODEC" != "none" ]; then
+    COMPRESSION_OPTS+=(-D mapreduce.map.output.compress=true
+                       -D "mapreduce.map.output.compress.codec=$(codec_class "$MAP_OUTPUT_CODEC")")
+fi
+OUTPUT_COMPRESSION=${OUTPUT_COMPRESSION:-none}
+case "$OUTPUT_COMPRESSION" in
+    none) ;;
+    gzip|bzip2)
+        COMPRESSION_OPTS+=(-D mapreduce.output.fileoutputformat.compress=true
+                           -D "mapreduce.output.fileoutputformat.compress.codec=$(codec_class "$OUTPUT_COMPRESSION")")
+        ;;
+    *)
+        echo "Error: OUTPUT_COMPRESSION must be none, gzip or bzip2 (got $OUTPUT_COMPRESSION)."
+        exit 1
+        ;;
+esac
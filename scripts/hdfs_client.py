@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+HDFS access layer for the PCAP watcher.
+
+Two interchangeable clients are provided:
+
+* WebHdfsClient talks to the NameNode/DataNodes over the WebHDFS REST API
+  using pooled keep-alive HTTP connections, retries with backoff and chunked
+  streaming uploads. No JVM is started per operation.
+* HadoopCliClient wraps the ``hadoop fs`` CLI and is used when no WebHDFS URL
+  is configured.
+
+Both expose mkdir, put, put_stream, stat, rm, listdir and cat with the same
+semantics, and raise HdfsError on failure.
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import queue
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote, urlencode, urlsplit
+
+
+CHUNK_SIZE = 1024 * 1024
+RETRYABLE_STATUS = (500, 502, 503, 504)
+
+Body = Union[None, bytes, BinaryIO, Iterable[bytes]]
+
+
+class HdfsError(RuntimeError):
+    """Raised when an HDFS operation fails."""
+
+
+def iter_chunks(handle: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    return iter(lambda: handle.read(chunk_size), b"")
+
+
+def read_stderr(handle: BinaryIO) -> str:
+    """Contents of a child's stderr spooled to a temporary file."""
+    handle.seek(0)
+    return handle.read().decode(errors="replace").strip()
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Re-assemble newline-terminated lines from a stream of byte chunks."""
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending + b"\n"
+
+
+class _ConnectionPool:
+    """Keep-alive HTTP connections to a single host:port."""
+
+    def __init__(self, scheme: str, host: str, port: int, size: int, timeout: float) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=size)
+
+    def new_connection(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.new_connection()
+
+    def release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class WebHdfsClient:
+    """Minimal WebHDFS REST client with pooled connections and retries."""
+
+    def __init__(
+        self,
+        base_url: str,
+        user: Optional[str] = None,
+        pool_size: int = 8,
+        retries: int = 3,
+        timeout: float = 60.0,
+        backoff: float = 0.5,
+    ) -> None:
+        parts = urlsplit(base_url if "://" in base_url else f"http://{base_url}")
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.scheme == "https" else 9870)
+        self.user = user
+        self.pool_size = pool_size
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self._pools: Dict[Tuple[str, str, int], _ConnectionPool] = {}
+
+    # -- public API -------------------------------------------------------
+
+    def mkdir(self, path: str) -> None:
+        self._call("PUT", path, "MKDIRS")
+
+    def put(self, local_path: Path, dest: str, overwrite: bool = True) -> str:
+        """Upload a local file. ``dest`` may be a directory or a file path."""
+        target = self._resolve_put_target(Path(local_path).name, dest)
+        with open(local_path, "rb") as handle:
+            self._create(target, handle, overwrite)
+        return target
+
+    def put_stream(self, chunks: Iterable[bytes], dest: str, overwrite: bool = True) -> str:
+        """Upload an iterable of byte chunks to the file ``dest`` with chunked encoding."""
+        self._create(dest, chunks, overwrite)
+        return dest
+
+    def stat(self, path: str) -> Optional[Dict[str, object]]:
+        """Return the WebHDFS FileStatus dict, or None if the path does not exist."""
+        status, payload = self._call("GET", path, "GETFILESTATUS", missing_ok=True)
+        if status == 404:
+            return None
+        return payload.get("FileStatus")
+
+    def rm(self, path: str, recursive: bool = False) -> bool:
+        _, payload = self._call(
+            "DELETE", path, "DELETE", params={"recursive": str(recursive).lower()}
+        )
+        return bool(payload.get("boolean"))
+
+    def listdir(self, path: str) -> List[Dict[str, object]]:
+        _, payload = self._call("GET", path, "LISTSTATUS")
+        return payload.get("FileStatuses", {}).get("FileStatus", [])
+
+    def cat(self, path: str) -> Iterator[bytes]:
+        """Stream the contents of a file in chunks."""
+        url = self._url(path, "OPEN", {})
+        target = self._namenode()
+        for _ in range(2):
+            response, conn, pool = self._send("GET", target, url, None)
+            if response.status not in (301, 302, 303, 307):
+                break
+            location = response.getheader("Location", "")
+            response.read()
+            pool.release(conn)
+            target, url = self._location(location)
+        if response.status != 200:
+            body = response.read()
+            conn.close()
+            raise HdfsError(self._error_message("OPEN", path, response.status, body))
+        try:
+            yield from iter_chunks(response)  # type: ignore[arg-type]
+        except BaseException:
+            conn.close()
+            raise
+        pool.release(conn)
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+    # -- internals --------------------------------------------------------
+
+    def _resolve_put_target(self, name: str, dest: str) -> str:
+        info = self.stat(dest)
+        if info is not None and info.get("type") == "DIRECTORY":
+            return f"{dest.rstrip('/')}/{name}"
+        return dest
+
+    def _create(self, path: str, body: Body, overwrite: bool) -> None:
+        url = self._url(path, "CREATE", {"overwrite": str(overwrite).lower()})
+        status, headers, payload = self._request("PUT", self._namenode(), url, None)
+        if status == 201:
+            return
+        if status != 307 or "Location" not in headers:
+            raise HdfsError(self._error_message("CREATE", path, status, payload))
+        target, datanode_url = self._location(headers["Location"])
+        status, _, payload = self._request("PUT", target, datanode_url, body)
+        if status != 201:
+            raise HdfsError(self._error_message("CREATE", path, status, payload))
+
+    def _call(
+        self,
+        method: str,
+        path: str,
+        op: str,
+        params: Optional[Dict[str, str]] = None,
+        missing_ok: bool = False,
+    ) -> Tuple[int, Dict[str, object]]:
+        url = self._url(path, op, params or {})
+        status, _, body = self._request(method, self._namenode(), url, None)
+        if status == 404 and missing_ok:
+            return status, {}
+        if status != 200:
+            raise HdfsError(self._error_message(op, path, status, body))
+        return status, json.loads(body) if body else {}
+
+    def _url(self, path: str, op: str, params: Dict[str, str]) -> str:
+        query = {"op": op, **params}
+        if self.user:
+            query["user.name"] = self.user
+        return f"/webhdfs/v1/{quote(path.lstrip('/'))}?{urlencode(query)}"
+
+    def _namenode(self) -> Tuple[str, str, int]:
+        return self.scheme, self.host, self.port
+
+    def _location(self, location: str) -> Tuple[Tuple[str, str, int], str]:
+        """Split a redirect Location into a pool target and a request path."""
+        parts = urlsplit(location)
+        target = (parts.scheme or self.scheme, parts.hostname or self.host, parts.port or self.port)
+        return target, f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+    def _pool(self, scheme: str, host: str, port: int) -> _ConnectionPool:
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools.setdefault(
+                key, _ConnectionPool(scheme, host, port, self.pool_size, self.timeout)
+            )
+        return pool
+
+    def _request(
+        self, method: str, target: Tuple[str, str, int], url: str, body: Body
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """Send a request and read the full response, retrying when it is safe.
+
+        Retries cover connection failures and 5xx responses. A body that is a
+        one-shot iterable (e.g. a mapper pipe) cannot be replayed, so those
+        uploads are attempted only once.
+        """
+        replayable = body is None or isinstance(body, bytes) or hasattr(body, "seek")
+        start_pos = body.tell() if replayable and hasattr(body, "seek") else None
+        attempts = self.retries + 1 if replayable else 1
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+                if start_pos is not None:
+                    body.seek(start_pos)  # type: ignore[union-attr]
+            try:
+                response, conn, pool = self._send(method, target, url, body)
+                payload = response.read()
+            except (OSError, http.client.HTTPException) as exc:
+                last_error = exc
+                continue
+            if response.will_close:
+                conn.close()
+            else:
+                pool.release(conn)
+            status = response.status
+            if status in RETRYABLE_STATUS and attempt + 1 < attempts:
+                last_error = HdfsError(f"HTTP {status} from {target[1]}:{target[2]}")
+                continue
+            return status, dict(response.getheaders()), payload
+
+        raise HdfsError(f"WebHDFS {method} {url.split('?')[0]} failed: {last_error}")
+
+    def _send(
+        self, method: str, target: Tuple[str, str, int], url: str, body: Body
+    ) -> Tuple[http.client.HTTPResponse, http.client.HTTPConnection, _ConnectionPool]:
+        pool = self._pool(*target)
+        headers: Dict[str, str] = {}
+        options: Dict[str, bool] = {}
+        if body is not None and not isinstance(body, bytes):
+            headers["Content-Type"] = "application/octet-stream"
+            options["encode_chunked"] = True
+            if hasattr(body, "read"):
+                body = iter_chunks(body)  # type: ignore[arg-type]
+            # A one-shot stream cannot be resent if a pooled keep-alive
+            # connection turns out to be stale, so give it a fresh one.
+            conn = pool.new_connection()
+        else:
+            conn = pool.acquire()
+        try:
+            conn.request(method, url, body=body, headers=headers, **options)
+            response = conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+        return response, conn, pool
+
+    @staticmethod
+    def _error_message(op: str, path: str, status: int, body: bytes) -> str:
+        detail = body.decode("utf-8", errors="replace").strip()
+        try:
+            remote = json.loads(detail).get("RemoteException", {})
+            detail = f"{remote.get('exception')}: {remote.get('message')}"
+        except (ValueError, AttributeError):
+            pass
+        return f"WebHDFS {op} {path} failed with HTTP {status}: {detail}"
+
+
+class HadoopCliClient:
+    """HDFS client backed by the ``hadoop fs`` command line."""
+
+    def __init__(self, hadoop_bin: str = "hadoop", run: Optional[Callable[[List[str]], None]] = None) -> None:
+        self.hadoop_bin = hadoop_bin
+        self._run = run
+
+    def _fs(self, *args: str) -> None:
+        cmd = [self.hadoop_bin, "fs", *args]
+        if self._run is not None:
+            try:
+                self._run(cmd)
+            except Exception as exc:
+                raise HdfsError(str(exc)) from exc
+            return
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise HdfsError(f"{' '.join(cmd)} failed ({result.returncode}): {result.stderr.strip()}")
+
+    def mkdir(self, path: str) -> None:
+        self._fs("-mkdir", "-p", path)
+
+    def put(self, local_path: Path, dest: str, overwrite: bool = True) -> str:
+        self._fs("-put", *(["-f"] if overwrite else []), str(local_path), dest)
+        return dest
+
+    def put_stream(self, chunks: Iterable[bytes], dest: str, overwrite: bool = True) -> str:
+        cmd = [self.hadoop_bin, "fs", "-put", *(["-f"] if overwrite else []), "-", dest]
+        # stderr goes to a file, not a pipe: log4j warnings filling a pipe
+        # nobody reads while stdin is being written would block both sides.
+        with tempfile.TemporaryFile() as errors:
+            upload = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=errors
+            )
+            assert upload.stdin is not None
+            try:
+                for chunk in chunks:
+                    upload.stdin.write(chunk)
+                upload.stdin.close()
+            except BrokenPipeError:
+                pass
+            except BaseException:
+                upload.kill()
+                upload.wait()
+                raise
+            if upload.wait() != 0:
+                raise HdfsError(f"{' '.join(cmd)} failed ({upload.returncode}): {read_stderr(errors)}")
+        return dest
+
+    def stat(self, path: str) -> Optional[Dict[str, object]]:
+        result = subprocess.run(
+            [self.hadoop_bin, "fs", "-stat", "%F|%b|%Y", path], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None
+        kind, length, mtime = result.stdout.strip().split("|")
+        return {
+            "type": "DIRECTORY" if kind == "directory" else "FILE",
+            "length": int(length),
+            "modificationTime": int(mtime),
+        }
+
+    def rm(self, path: str, recursive: bool = False) -> bool:
+        self._fs("-rm", *(["-r"] if recursive else []), "-f", path)
+        return True
+
+    def listdir(self, path: str) -> List[Dict[str, object]]:
+        result = subprocess.run(
+            [self.hadoop_bin, "fs", "-ls", "-C", path], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise HdfsError(f"hadoop fs -ls {path} failed: {result.stderr.strip()}")
+        return [
+            {"pathSuffix": line.rstrip("/").rsplit("/", 1)[-1]}
+            for line in result.stdout.splitlines()
+            if line.strip()
+        ]
+
+    def cat(self, path: str) -> Iterator[bytes]:
+        with tempfile.TemporaryFile() as errors:
+            proc = subprocess.Popen(
+                [self.hadoop_bin, "fs", "-cat", path], stdout=subprocess.PIPE, stderr=errors
+            )
+            assert proc.stdout is not None
+            try:
+                yield from iter_chunks(proc.stdout)
+            finally:
+                proc.stdout.close()
+                if proc.wait() != 0:
+                    raise HdfsError(f"hadoop fs -cat {path} failed: {read_stderr(errors)}")
+
+    def close(self) -> None:
+        pass
+
+
+HdfsClient = Union[WebHdfsClient, HadoopCliClient]
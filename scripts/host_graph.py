@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Host communication graph of a run: fan-in/fan-out, top pairs and components.
+
+Builds a directed, weighted host-to-host graph in one pass over the
+conversation analysis output (or over preprocessing JSON records, which also
+cover UDP and ICMP) and reports:
+
+  - the fan-out (distinct peers contacted) and fan-in (distinct peers
+    contacting it) distribution and the hosts with the largest of each,
+  - the heaviest host pairs by bytes or packets,
+  - the connected components (ignoring direction) and their size.
+
+IP addresses are mapped to dense integer ids as they are first seen, and the
+edges are kept in flat `array` columns (source id, destination id, bytes,
+packets) rather than per-edge Python objects. The adjacency is then a CSR
+(compressed sparse row) index over those columns in both directions: the
+edges of host i are out_edges[out_offsets[i]:out_offsets[i + 1]], built by a
+counting sort in O(hosts + edges). The built graph takes 32 bytes per edge
+(the dictionary that merges edges while reading is released once the CSR is
+built), and degrees, neighbours and a breadth-first walk for the components
+are plain array lookups.
+
+Conversation keys are direction-less ("a:pa-b:pb", ordered as strings) and
+the packets of a conversation flow both ways, so edges point from client to
+server, the server being the endpoint with the lower port. Flow-sampled
+inputs are scaled by the conversation Weight (or 1/sample_rate) like the
+other estimates.
+
+Usage:
+    hadoop fs -text /output/conversation_analysis/part-* | python3 scripts/host_graph.py
+    python3 scripts/host_graph.py --by packets -n 20 results/conversation_analysis/part-00000
+    python3 scripts/host_graph.py --host 10.0.0.5 part-00000.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import os
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import compression  # noqa: E402
+
+
+def parse_endpoint(endpoint: str) -> Tuple[str, int]:
+    """"ip:port" (IPv6 addresses contain colons themselves)."""
+    ip, _, port = endpoint.rpartition(":")
+    return ip, int(port)
+
+
+class GraphBuilder:
+    """Accumulates weighted host-to-host edges in one pass."""
+
+    def __init__(self) -> None:
+        self.ips: List[str] = []
+        self.ids: Dict[str, int] = {}
+        # Edge columns; an edge is identified by (src << 32) | dst while building.
+        self.edge_index: Dict[int, int] = {}
+        self.src = array("i")
+        self.dst = array("i")
+        self.bytes = array("d")
+        self.packets = array("d")
+        self.skipped = 0
+
+    def host_id(self, ip: str) -> int:
+        host = self.ids.get(ip)
+        if host is None:
+            host = self.ids[ip] = len(self.ips)
+            self.ips.append(ip)
+        return host
+
+    def add(self, src_ip: str, dst_ip: str, size: float, packets: float) -> None:
+        src, dst = self.host_id(src_ip), self.host_id(dst_ip)
+        key = (src << 32) | dst
+        edge = self.edge_index.get(key)
+        if edge is None:
+            self.edge_index[key] = len(self.src)
+            self.src.append(src)
+            self.dst.append(dst)
+            self.bytes.append(size)
+            self.packets.append(packets)
+        else:
+            self.bytes[edge] += size
+            self.packets[edge] += packets
+
+    def add_flow(self, ip_a: str, port_a: Optional[int], ip_b: str, port_b: Optional[int],
+                 size: float, packets: float) -> None:
+        """Add traffic between two endpoints as an edge from the client to the server.
+
+        The endpoint with the lower port is taken to be the server, so both
+        directions of a conversation count towards the same edge; without
+        ports (ICMP) the edge follows the packet.
+        """
+        if port_a is not None and port_b is not None and port_a < port_b:
+            self.add(ip_b, ip_a, size, packets)
+        else:
+            self.add(ip_a, ip_b, size, packets)
+
+    def add_conversations(self, lines: Iterable[str]) -> None:
+        """Conversation analysis output: key, RTT, duration, volume, packets[, weight]."""
+        for line in lines:
+            parts = line.split("\t")
+            try:
+                key = parts[0].rpartition("|")[2]  # batched runs prefix keys with "<run_id>|"
+                first, _, second = key.partition("-")
+                ip_a, port_a = parse_endpoint(first)
+                ip_b, port_b = parse_endpoint(second)
+                weight = float(parts[5]) if len(parts) > 5 else 1.0
+                size, packets = float(parts[3]) * weight, float(parts[4]) * weight
+            except (IndexError, ValueError):
+                self.skipped += 1
+                continue
+            self.add_flow(ip_a, port_a, ip_b, port_b, size, packets)
+
+    def add_records(self, lines: Iterable[str]) -> None:
+        """Preprocessing JSON records, one packet each."""
+        for line in lines:
+            try:
+                record = json.loads(line)
+                src_ip, dst_ip = record["src_ip"], record["dst_ip"]
+                weight = 1.0 / float(record.get("sample_rate") or 1.0)
+                size = float(record.get("size") or 0) * weight
+            except (ValueError, KeyError, TypeError, ZeroDivisionError):
+                self.skipped += 1
+                continue
+            if not src_ip or not dst_ip:
+                self.skipped += 1
+                continue
+            self.add_flow(src_ip, record.get("src_port"), dst_ip, record.get("dst_port"), size, weight)
+
+    def build(self) -> "HostGraph":
+        graph = HostGraph(self.ips, self.src, self.dst, self.bytes, self.packets)
+        self.edge_index = {}
+        return graph
+
+
+def csr(keys: array, hosts: int) -> Tuple[array, array]:
+    """Offsets and edge ids of a CSR index grouping the edges by `keys` (counting sort)."""
+    offsets = array("q", bytes(8 * (hosts + 1)))
+    for key in keys:
+        offsets[key + 1] += 1
+    for i in range(hosts):
+        offsets[i + 1] += offsets[i]
+    position = offsets[:-1]
+    edges = array("i", bytes(4 * len(keys)))
+    for edge, key in enumerate(keys):
+        edges[position[key]] = edge
+        position[key] += 1
+    return offsets, edges
+
+
+class HostGraph:
+    """Directed weighted host graph with CSR indexes by source and by destination."""
+
+    def __init__(self, ips: List[str], src: array, dst: array, size: array, packets: array) -> None:
+        self.ips = ips
+        self.src = src
+        self.dst = dst
+        self.bytes = size
+        self.packets = packets
+        self.hosts = len(ips)
+        self.edges = len(src)
+        self.out_offsets, self.out_edges = csr(src, self.hosts)
+        self.in_offsets, self.in_edges = csr(dst, self.hosts)
+
+    def fan_out(self, host: int) -> int:
+        return self.out_offsets[host + 1] - self.out_offsets[host]
+
+    def fan_in(self, host: int) -> int:
+        return self.in_offsets[host + 1] - self.in_offsets[host]
+
+    def outgoing(self, host: int) -> Iterable[int]:
+        return self.out_edges[self.out_offsets[host]:self.out_offsets[host + 1]]
+
+    def incoming(self, host: int) -> Iterable[int]:
+        return self.in_edges[self.in_offsets[host]:self.in_offsets[host + 1]]
+
+    def degree_histogram(self, direction: str) -> List[Tuple[str, int]]:
+        """Hosts per power-of-two degree bucket ("0", "1", "2-3", "4-7", ...)."""
+        offsets = self.out_offsets if direction == "out" else self.in_offsets
+        counts: Dict[int, int] = {}
+        for host in range(self.hosts):
+            bucket = (offsets[host + 1] - offsets[host]).bit_length()
+            counts[bucket] = counts.get(bucket, 0) + 1
+        histogram = []
+        for bucket in sorted(counts):
+            low, high = (1 << bucket) >> 1, (1 << bucket) - 1
+            histogram.append((str(low) if low == high else f"{low}-{high}", counts[bucket]))
+        return histogram
+
+    def top_hosts(self, direction: str, limit: int) -> List[int]:
+        degree = self.fan_out if direction == "out" else self.fan_in
+        return heapq.nlargest(limit, range(self.hosts), key=degree)
+
+    def top_edges(self, limit: int, by: str = "bytes") -> List[int]:
+        weights = self.bytes if by == "bytes" else self.packets
+        return heapq.nlargest(limit, range(self.edges), key=weights.__getitem__)
+
+    def components(self) -> Tuple[array, List[int]]:
+        """Component label of every host (ignoring direction) and the size of each component."""
+        label = array("i", [-1]) * self.hosts
+        sizes: List[int] = []
+        src, dst = self.src, self.dst
+        out_offsets, out_edges = self.out_offsets, self.out_edges
+        in_offsets, in_edges = self.in_offsets, self.in_edges
+        for start in range(self.hosts):
+            if label[start] >= 0:
+                continue
+            component = len(sizes)
+            label[start] = component
+            stack = [start]
+            size = 0
+            while stack:
+                host = stack.pop()
+                size += 1
+                for k in range(out_offsets[host], out_offsets[host + 1]):
+                    peer = dst[out_edges[k]]
+                    if label[peer] < 0:
+                        label[peer] = component
+                        stack.append(peer)
+                for k in range(in_offsets[host], in_offsets[host + 1]):
+                    peer = src[in_edges[k]]
+                    if label[peer] < 0:
+                        label[peer] = component
+                        stack.append(peer)
+            sizes.append(size)
+        return label, sizes
+
+    def component_summary(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """Number of components and the largest `limit` with their edges, bytes and busiest host."""
+        label, sizes = self.components()
+        edges = array("q", bytes(8 * len(sizes)))
+        volume = array("d", bytes(8 * len(sizes)))
+        for edge in range(self.edges):
+            component = label[self.src[edge]]
+            edges[component] += 1
+            volume[component] += self.bytes[edge]
+        hubs = array("i", [-1]) * len(sizes)
+        for host in range(self.hosts):
+            component = label[host]
+            hub = hubs[component]
+            if hub < 0 or self.fan_in(host) + self.fan_out(host) > self.fan_in(hub) + self.fan_out(hub):
+                hubs[component] = host
+        largest = heapq.nlargest(limit, range(len(sizes)), key=sizes.__getitem__)
+        return len(sizes), [
+            {
+                "hosts": sizes[component],
+                "edges": edges[component],
+                "bytes": round(volume[component]),
+                "hub": self.ips[hubs[component]],
+            }
+            for component in largest
+        ]
+
+    def neighbours(self, host: int) -> List[Dict[str, Any]]:
+        peers = [
+            {"direction": "out", "peer": self.ips[self.dst[edge]], "bytes": round(self.bytes[edge]),
+             "packets": round(self.packets[edge])}
+            for edge in self.outgoing(host)
+        ]
+        peers += [
+            {"direction": "in", "peer": self.ips[self.src[edge]], "bytes": round(self.bytes[edge]),
+             "packets": round(self.packets[edge])}
+            for edge in self.incoming(host)
+        ]
+        peers.sort(key=lambda peer: peer["bytes"], reverse=True)
+        return peers
+
+
+def read_graph(paths: List[str]) -> GraphBuilder:
+    """Build the edge list from conversation output or JSON records (files or stdin)."""
+    builder = GraphBuilder()
+    for path in paths or [None]:
+        with compression.text_input(open(path, "rb") if path else None) as handle:
+            first = handle.readline()
+            if not first:
+                continue
+            if first.lstrip().startswith("{"):
+                builder.add_records([first])
+                builder.add_records(handle)
+            else:
+                builder.add_conversations([first])
+                builder.add_conversations(handle)
+    return builder
+
+
+def report(graph: HostGraph, limit: int, by: str) -> Dict[str, Any]:
+    components, largest = graph.component_summary(limit)
+    return {
+        "hosts": graph.hosts,
+        "edges": graph.edges,
+        "bytes": round(sum(graph.bytes)),
+        "fan_out_histogram": graph.degree_histogram("out"),
+        "fan_in_histogram": graph.degree_histogram("in"),
+        "top_fan_out": [
+            {"ip": graph.ips[host], "fan_out": graph.fan_out(host)} for host in graph.top_hosts("out", limit)
+        ],
+        "top_fan_in": [
+            {"ip": graph.ips[host], "fan_in": graph.fan_in(host)} for host in graph.top_hosts("in", limit)
+        ],
+        "top_edges": [
+            {
+                "src": graph.ips[graph.src[edge]],
+                "dst": graph.ips[graph.dst[edge]],
+                "bytes": round(graph.bytes[edge]),
+                "packets": round(graph.packets[edge]),
+            }
+            for edge in graph.top_edges(limit, by)
+        ],
+        "components": components,
+        "largest_components": largest,
+    }
+
+
+def print_table(title: str, columns: List[str], rows: List[List[Any]], out: TextIO) -> None:
+    cells = [[str(value) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    header = " | ".join(column.ljust(width) for column, width in zip(columns, widths))
+    out.write(f"\n{title}\n" + "-" * len(header) + "\n" + header + "\n" + "-" * len(header) + "\n")
+    for row in cells:
+        out.write(" | ".join(cell.ljust(width) for cell, width in zip(row, widths)) + "\n")
+
+
+def print_report(result: Dict[str, Any], by: str, out: TextIO) -> None:
+    out.write(f"Hosts: {result['hosts']}  Edges: {result['edges']}  Bytes: {result['bytes']}  "
+              f"Components: {result['components']}\n")
+    fan_out = dict(result["fan_out_histogram"])
+    fan_in = dict(result["fan_in_histogram"])
+    buckets = sorted(set(fan_out) | set(fan_in), key=lambda bucket: int(bucket.split("-")[0]))
+    print_table(
+        "Degree distribution (hosts per number of distinct peers)",
+        ["Peers", "Fan-out", "Fan-in"],
+        [[bucket, fan_out.get(bucket, 0), fan_in.get(bucket, 0)] for bucket in buckets],
+        out,
+    )
+    print_table("Top fan-out", ["IP Address", "Peers"],
+                [[row["ip"], row["fan_out"]] for row in result["top_fan_out"]], out)
+    print_table("Top fan-in", ["IP Address", "Peers"],
+                [[row["ip"], row["fan_in"]] for row in result["top_fan_in"]], out)
+    print_table(
+        f"Top pairs by {by}",
+        ["Source", "Destination", "Bytes", "Packets"],
+        [[row["src"], row["dst"], row["bytes"], row["packets"]] for row in result["top_edges"]],
+        out,
+    )
+    print_table(
+        "Largest components",
+        ["Hosts", "Edges", "Bytes", "Busiest host"],
+        [[row["hosts"], row["edges"], row["bytes"], row["hub"]] for row in result["largest_components"]],
+        out,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Fan-in/fan-out, top pairs and connected components of the host communication graph."
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Conversation analysis output or preprocessing JSON records, optionally compressed (default: stdin).",
+    )
+    parser.add_argument("-n", "--limit", type=int, default=10, help="Rows per top-N list (default: 10).")
+    parser.add_argument("--by", choices=("bytes", "packets"), default="bytes", help="Weight of the top pairs.")
+    parser.add_argument("--host", help="List the peers of this IP address instead of the graph summary.")
+    parser.add_argument("--format", choices=("table", "json"), default="table")
+    args = parser.parse_args(argv)
+
+    builder = read_graph(args.files)
+    if builder.skipped:
+        print(f"Warning: skipped {builder.skipped} unparseable lines", file=sys.stderr)
+    graph = builder.build()
+
+    if args.host is not None:
+        host = builder.ids.get(args.host)
+        if host is None:
+            print(f"{args.host} does not appear in the graph", file=sys.stderr)
+            return 1
+        peers = graph.neighbours(host)
+        if args.format == "json":
+            print(json.dumps({"ip": args.host, "fan_out": graph.fan_out(host), "fan_in": graph.fan_in(host),
+                              "peers": peers}))
+        else:
+            print(f"{args.host}: fan-out {graph.fan_out(host)}, fan-in {graph.fan_in(host)}")
+            print_table("Peers", ["Direction", "Peer", "Bytes", "Packets"],
+                        [[peer["direction"], peer["peer"], peer["bytes"], peer["packets"]] for peer in peers],
+                        sys.stdout)
+        return 0
+
+    result = report(graph, args.limit, args.by)
+    if args.format == "json":
+        print(json.dumps(result))
+    else:
+        print_report(result, args.by, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Minimal inotify binding used by the PCAP watcher.
+
+Only the pieces the watcher needs are implemented: a non-blocking inotify
+descriptor watching a single directory for IN_CLOSE_WRITE and IN_MOVED_TO
+events. The binding uses ctypes against libc so no third-party package is
+required. On platforms without inotify, constructing DirectoryEvents raises
+InotifyUnavailable and the caller is expected to fall back to polling.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class InotifyUnavailable(OSError):
+    """Raised when inotify cannot be used on this host."""
+
+
+def _load_libc() -> ctypes.CDLL:
+    libc_name = ctypes.util.find_library("c")
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+    except OSError as exc:
+        raise InotifyUnavailable(f"could not load libc: {exc}") from exc
+    if not hasattr(libc, "inotify_init1"):
+        raise InotifyUnavailable("libc does not provide inotify_init1")
+    return libc
+
+
+class DirectoryEvents:
+    """Report files that were closed after writing or moved into a directory."""
+
+    def __init__(self, directory: Path, suffix: str = ".pcap", track_created: bool = False) -> None:
+        self.directory = directory
+        self.suffix = suffix
+        self.overflowed = False
+        # Files that appeared (IN_CREATE) but are not complete yet; only
+        # collected when track_created is set, and drained by the caller.
+        self.created: List[Path] = []
+
+        libc = _load_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise InotifyUnavailable(err, f"inotify_init1 failed: {os.strerror(err)}")
+
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_ONLYDIR
+        if track_created:
+            mask |= IN_CREATE
+        wd = libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise InotifyUnavailable(
+                err, f"inotify_add_watch failed for {directory}: {os.strerror(err)}"
+            )
+        self._fd: Optional[int] = fd
+
+    def fileno(self) -> int:
+        if self._fd is None:
+            raise ValueError("DirectoryEvents is closed")
+        return self._fd
+
+    def wait(self, timeout: Optional[float]) -> List[Path]:
+        """Block up to timeout seconds and return completed files, in event order.
+
+        A timeout of None blocks until at least one event arrives. When the
+        kernel queue overflowed, ``overflowed`` is set so the caller can fall
+        back to a full directory scan.
+        """
+        readable, _, _ = select.select([self.fileno()], [], [], timeout)
+        if not readable:
+            return []
+
+        completed: List[Path] = []
+        seen = set()
+        for mask, name in self._read_events():
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED or not name:
+                continue
+            if not name.endswith(self.suffix):
+                continue
+            if mask & IN_CREATE:
+                self.created.append(self.directory / name)
+                continue
+            if name in seen:
+                continue
+            seen.add(name)
+            completed.append(self.directory / name)
+        return completed
+
+    def _read_events(self) -> List[Tuple[int, str]]:
+        events: List[Tuple[int, str]] = []
+        while True:
+            try:
+                buffer = os.read(self.fileno(), _READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                raise
+            if not buffer:
+                break
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                _, mask, _, name_len = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                raw_name = buffer[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+                events.append((mask, os.fsdecode(raw_name)))
+        return events
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "DirectoryEvents":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Pick the archived runs an investigation has to read.
+
+Every run the watcher preprocesses gets a sidecar index, "_index.json" next to
+its preprocessing output (see common/run_index.py), with the run's packet
+timestamp range, record and byte counts and Bloom filters over its IP
+addresses and ports. This script reads the sidecars of all runs under --base
+and prints the preprocessing directories of the runs that may hold packets of
+the given hosts and ports in the given time range, comma-separated, ready to
+be passed as INPUT_DIR to the analysis jobs:
+
+    INPUTS=$(python3 scripts/plan_runs.py --ip 10.0.0.5 --since 2026-10-01 --until 2026-10-08) \\
+        && ./scripts/run_traffic_volume.sh "$INPUTS" /output/investigation/traffic
+
+A Bloom filter never misses an address the run contains, so no relevant run is
+left out; at most a few irrelevant runs (the watcher's --index-error-rate) are
+read. Runs without a sidecar (e.g. preprocessed before indexes were written)
+are always selected unless --indexed-only is given.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "common"))
+
+from run_index import INDEX_NAME, RunSidecar
+from hdfs_client import HadoopCliClient, HdfsClient, HdfsError, WebHdfsClient
+from result_store import parse_time
+
+DEFAULT_BASE = "/output/preprocessing/live"
+
+
+def list_runs(hdfs: HdfsClient, base: str) -> List[str]:
+    """Run directories under ``base``, oldest first (run ids start with their time)."""
+    return sorted(
+        str(entry["pathSuffix"])
+        for entry in hdfs.listdir(base)
+        if entry.get("type", "DIRECTORY") == "DIRECTORY"
+        and not str(entry["pathSuffix"]).startswith(("_", "."))
+    )
+
+
+def parse_sidecars(data: bytes) -> List[RunSidecar]:
+    sidecars = []
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            sidecars.append(RunSidecar.loads(line))
+        except (ValueError, KeyError) as exc:
+            print(f"Warning: ignoring unreadable run index: {exc}", file=sys.stderr)
+    return sidecars
+
+
+def read_sidecars(hdfs: HdfsClient, base: str, runs: List[str]) -> Dict[str, RunSidecar]:
+    """Sidecars of ``runs`` by run directory; runs without one are left out.
+
+    With the hadoop CLI all sidecars are read by a single glob ``-cat`` (one
+    JVM start instead of one per run); WebHDFS reads them one by one over its
+    pooled connections.
+    """
+    if isinstance(hdfs, HadoopCliClient):
+        try:
+            data = b"".join(hdfs.cat(f"{base}/*/{INDEX_NAME}"))
+        except HdfsError:
+            # No run has a sidecar yet (the glob matched nothing).
+            return {}
+        wanted = set(runs)
+        return {
+            sidecar.run_id: sidecar for sidecar in parse_sidecars(data) if sidecar.run_id in wanted
+        }
+    sidecars = {}
+    for run in runs:
+        try:
+            data = b"".join(hdfs.cat(f"{base}/{run}/{INDEX_NAME}"))
+        except HdfsError:
+            continue
+        for sidecar in parse_sidecars(data):
+            sidecars[run] = sidecar
+    return sidecars
+
+
+def select(
+    sidecar: RunSidecar,
+    ips: List[str],
+    ports: List[int],
+    since: Optional[float],
+    until: Optional[float],
+    match_all: bool,
+) -> bool:
+    """Whether a run may hold packets matching the query."""
+    if not sidecar.overlaps(since, until):
+        return False
+    combine = all if match_all else any
+    if ips and not combine(sidecar.may_contain_ip(ip) for ip in ips):
+        return False
+    if ports and not combine(sidecar.may_contain_port(port) for port in ports):
+        return False
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Print the preprocessing directories of the runs that may match a query."
+    )
+    parser.add_argument(
+        "--base",
+        default=DEFAULT_BASE,
+        help=f"HDFS directory holding one preprocessing directory per run (default: {DEFAULT_BASE}).",
+    )
+    parser.add_argument("--ip", action="append", default=[], help="IP address to look for (repeatable).")
+    parser.add_argument("--port", action="append", type=int, default=[], help="Port to look for (repeatable).")
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Select runs that may contain all given IPs (and all given ports) rather than any.",
+    )
+    parser.add_argument("--since", help="Only runs with packets at or after this time (e.g. 24h, 7d, 2026-01-31).")
+    parser.add_argument("--until", help="Only runs with packets before this time.")
+    parser.add_argument(
+        "--indexed-only", action="store_true", help="Leave out runs without a sidecar index."
+    )
+    parser.add_argument(
+        "--format",
+        choices=("csv", "lines", "json"),
+        default="csv",
+        help="csv: one comma-separated line for INPUT_DIR (default); lines: one directory per line; "
+        "json: one object per selected run with its index summary.",
+    )
+    parser.add_argument("--webhdfs-url", help="WebHDFS endpoint; otherwise 'hadoop fs' is used.")
+    parser.add_argument("--webhdfs-user", help="user.name for WebHDFS simple authentication.")
+    parser.add_argument("--hadoop-bin", default="hadoop", help="Hadoop CLI for HDFS reads.")
+    args = parser.parse_args(argv)
+
+    try:
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until) if args.until else None
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    base = args.base.rstrip("/")
+    if args.webhdfs_url:
+        hdfs: HdfsClient = WebHdfsClient(args.webhdfs_url, user=args.webhdfs_user)
+    else:
+        hdfs = HadoopCliClient(args.hadoop_bin)
+    try:
+        runs = list_runs(hdfs, base)
+        sidecars = read_sidecars(hdfs, base, runs)
+    except HdfsError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        hdfs.close()
+
+    selected = []
+    unindexed = records = size = 0
+    for run in runs:
+        sidecar = sidecars.get(run)
+        if sidecar is None:
+            if args.indexed_only:
+                continue
+            unindexed += 1
+        elif not select(sidecar, args.ip, args.port, since, until, args.all):
+            continue
+        else:
+            records += sidecar.records
+            size += sidecar.bytes
+        selected.append((run, sidecar))
+
+    if args.format == "csv":
+        print(",".join(f"{base}/{run}" for run, _ in selected))
+    for run, sidecar in selected:
+        if args.format == "lines":
+            print(f"{base}/{run}")
+        elif args.format == "json":
+            print(json.dumps({
+                "run_id": run,
+                "path": f"{base}/{run}",
+                "indexed": sidecar is not None,
+                "first_timestamp": sidecar.first_timestamp if sidecar else None,
+                "last_timestamp": sidecar.last_timestamp if sidecar else None,
+                "records": sidecar.records if sidecar else None,
+                "bytes": sidecar.bytes if sidecar else None,
+            }))
+
+    summary = f"Selected {len(selected)} of {len(runs)} runs ({records} records, {size} bytes indexed"
+    if unindexed:
+        summary += f"; {unindexed} runs without {INDEX_NAME} included"
+    print(summary + ")", file=sys.stderr)
+    return 0 if selected else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
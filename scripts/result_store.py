@@ -0,0 +1,752 @@
+#!/usr/bin/env python3
+"""
+Indexed store of traffic volume and conversation results across runs.
+
+Each analysis run writes its results to its own HDFS directory, which makes
+questions that span runs ("top talkers this week", "history of one host")
+expensive to answer. This module loads the TSV outputs of every run into a
+local SQLite database:
+
+  - runs: one row per run id with its run time and source directories;
+  - traffic: bytes sent/received per (run, IP), indexed by IP and run time;
+  - conversations: per-conversation metrics, indexed by both endpoints and
+    run time;
+  - hosts: all-time per-IP totals, updated on ingest, so all-time top-N
+    queries read a handful of index entries.
+
+Results are ingested by the watcher (--result-store) as each capture is
+processed, from the watcher state (every processed run not yet loaded), or
+from local part files. Query results are streamed row by row, so dumps of
+large time ranges run in constant memory.
+
+    python3 scripts/result_store.py ingest --from-state state/pcap_watch_state.db
+    python3 scripts/result_store.py top hosts --since 7d -n 20
+    python3 scripts/result_store.py top conversations --by rtt --run-id capture_20260101T000000Z
+    python3 scripts/result_store.py history 192.168.1.10 --since 2026-01-01
+    python3 scripts/result_store.py dump traffic --since 24h --format tsv
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "common"))
+
+import compression  # noqa: E402
+from format_results import format_size  # noqa: E402
+from hdfs_client import HadoopCliClient, HdfsClient, HdfsError, WebHdfsClient, iter_lines  # noqa: E402
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_RESULT_STORE = PROJECT_ROOT / "state" / "results.db"
+RUN_TIME_PATTERN = re.compile(r"_(\d{8}T\d{6}Z)$")
+RELATIVE_TIME_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+RELATIVE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+INSERT_BATCH = 5000
+TABLE_WIDTH_SAMPLE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    capture TEXT,
+    run_time REAL NOT NULL,
+    ingested_at REAL NOT NULL,
+    traffic_source TEXT,
+    conversation_source TEXT,
+    hosts INTEGER NOT NULL DEFAULT 0,
+    conversations INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (run_time);
+CREATE TABLE IF NOT EXISTS traffic (
+    run_id TEXT NOT NULL,
+    run_time REAL NOT NULL,
+    ip TEXT NOT NULL,
+    bytes_sent INTEGER NOT NULL,
+    bytes_received INTEGER NOT NULL,
+    PRIMARY KEY (run_id, ip)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS traffic_ip ON traffic (ip, run_time, bytes_sent, bytes_received);
+CREATE INDEX IF NOT EXISTS traffic_time ON traffic (run_time, ip, bytes_sent, bytes_received);
+CREATE TABLE IF NOT EXISTS conversations (
+    run_id TEXT NOT NULL,
+    run_time REAL NOT NULL,
+    conversation TEXT NOT NULL,
+    ip_a TEXT NOT NULL,
+    port_a INTEGER,
+    ip_b TEXT NOT NULL,
+    port_b INTEGER,
+    rtt_ms REAL,
+    duration_sec REAL NOT NULL,
+    volume_bytes INTEGER NOT NULL,
+    packets INTEGER NOT NULL,
+    PRIMARY KEY (run_id, conversation)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS conversations_ip_a ON conversations (ip_a, run_time);
+CREATE INDEX IF NOT EXISTS conversations_ip_b ON conversations (ip_b, run_time);
+CREATE INDEX IF NOT EXISTS conversations_time ON conversations (run_time);
+CREATE INDEX IF NOT EXISTS conversations_volume ON conversations (volume_bytes);
+CREATE INDEX IF NOT EXISTS conversations_rtt ON conversations (rtt_ms);
+CREATE TABLE IF NOT EXISTS hosts (
+    ip TEXT PRIMARY KEY,
+    bytes_sent INTEGER NOT NULL,
+    bytes_received INTEGER NOT NULL,
+    runs INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hosts_sent ON hosts (bytes_sent);
+CREATE INDEX IF NOT EXISTS hosts_received ON hosts (bytes_received);
+CREATE INDEX IF NOT EXISTS hosts_total ON hosts (bytes_sent + bytes_received);
+"""
+
+# Sort keys accepted by "top" and the result column each one orders by.
+HOST_ORDER = {
+    "total": "bytes_total",
+    "sent": "bytes_sent",
+    "received": "bytes_received",
+}
+CONVERSATION_ORDER = {
+    "volume": "volume_bytes",
+    "packets": "packets",
+    "duration": "duration_sec",
+    "rtt": "rtt_ms",
+}
+BYTE_COLUMNS = {"bytes_sent", "bytes_received", "bytes_total", "volume_bytes"}
+TIME_COLUMNS = {"run_time", "first_seen", "last_seen", "ingested_at"}
+
+Line = Union[str, bytes]
+
+
+class ResultStoreError(RuntimeError):
+    """Raised when results cannot be ingested or queried."""
+
+
+def run_time_from_id(run_id: str) -> Optional[float]:
+    """Return the UTC start time encoded in a watcher run id, if any."""
+    match = RUN_TIME_PATTERN.search(run_id)
+    if match is None:
+        return None
+    stamp = datetime.strptime(match.group(1), "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """Parse "now", a relative age ("90m", "24h", "7d"), epoch seconds or an ISO date."""
+    now = time.time() if now is None else now
+    text = value.strip()
+    if text == "now":
+        return now
+    relative = RELATIVE_TIME_PATTERN.match(text)
+    if relative is not None:
+        return now - float(relative.group(1)) * RELATIVE_UNITS[relative.group(2)]
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        stamp = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError as exc:
+        raise ValueError(f"Unrecognised time: {value!r}") from exc
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+
+def format_time(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _decode(line: Line) -> str:
+    return line.decode("utf-8", errors="replace") if isinstance(line, bytes) else line
+
+
+def parse_traffic_lines(lines: Iterable[Line]) -> Iterator[Tuple[str, int, int]]:
+    """Yield (ip, bytes_sent, bytes_received) from traffic volume output.
+
+    Output of a flow-sampled run has two confidence interval columns after the
+    (estimated) totals; only the estimates are kept.
+    """
+    for raw in lines:
+        parts = _decode(raw).rstrip("\r\n").split("\t")
+        if len(parts) not in (3, 5):
+            continue
+        try:
+            yield parts[0], int(parts[1]), int(parts[2])
+        except ValueError:
+            continue
+
+
+def parse_conversation_lines(lines: Iterable[Line]) -> Iterator[Tuple]:
+    """Yield conversation rows (key, ip_a, port_a, ip_b, port_b, rtt, duration, volume, packets).
+
+    The weight column of a flow-sampled run is ignored: sampled conversations
+    are stored as measured.
+    """
+    for raw in lines:
+        parts = _decode(raw).rstrip("\r\n").split("\t")
+        if len(parts) not in (5, 6):
+            continue
+        key, rtt, duration, volume, packets = parts[:5]
+        left, _, right = key.partition("-")
+        ip_a, _, port_a = left.rpartition(":")
+        ip_b, _, port_b = right.rpartition(":")
+        try:
+            yield (
+                key,
+                ip_a or left,
+                int(port_a) if port_a.isdigit() else None,
+                ip_b or right,
+                int(port_b) if port_b.isdigit() else None,
+                None if rtt == "N/A" else float(rtt),
+                float(duration),
+                int(volume),
+                int(packets),
+            )
+        except ValueError:
+            continue
+
+
+def local_output_lines(path: Path) -> Iterator[bytes]:
+    """Lines of a local result file, or of the part-* files in a job output directory.
+
+    Compressed files (part-00000.bz2, results.gz) are decompressed by suffix.
+    """
+    files = sorted(path.glob("part-*")) if path.is_dir() else [path]
+    for file_path in files:
+        with compression.open_file(file_path) as handle:
+            yield from handle
+
+
+def hdfs_output_lines(hdfs: HdfsClient, output_dir: str) -> Iterator[bytes]:
+    """Lines of the part-* files in an HDFS job output directory, decompressed by suffix."""
+    names = sorted(
+        str(entry.get("pathSuffix", ""))
+        for entry in hdfs.listdir(output_dir)
+        if str(entry.get("pathSuffix", "")).startswith("part-")
+    )
+    for name in names:
+        chunks = hdfs.cat(f"{output_dir.rstrip('/')}/{name}")
+        yield from iter_lines(compression.decompress_chunks(chunks, compression.codec_for_name(name)))
+
+
+class ResultStore:
+    """Traffic and conversation results of many runs in one indexed database.
+
+    Like the watcher's StateStore, one connection is shared between threads and
+    every public method runs under a lock; ingesting a run is one transaction.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    # -- ingest ---------------------------------------------------------------
+
+    def has_run(self, run_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row is not None
+
+    def ingest_run(
+        self,
+        run_id: str,
+        traffic: Iterable[Line] = (),
+        conversations: Iterable[Line] = (),
+        run_time: Optional[float] = None,
+        capture: Optional[str] = None,
+        sources: Optional[Dict[str, str]] = None,
+    ) -> Tuple[int, int]:
+        """Load (or replace) the results of one run; returns (hosts, conversations)."""
+        if run_time is None:
+            run_time = run_time_from_id(run_id)
+        if run_time is None:
+            run_time = time.time()
+        sources = sources or {}
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._remove_run(run_id)
+            hosts = self._insert_batches(
+                "INSERT OR REPLACE INTO traffic (run_id, run_time, ip, bytes_sent, bytes_received) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((run_id, run_time, *row) for row in parse_traffic_lines(traffic)),
+            )
+            conversation_count = self._insert_batches(
+                "INSERT OR REPLACE INTO conversations (run_id, run_time, conversation, ip_a, port_a, "
+                "ip_b, port_b, rtt_ms, duration_sec, volume_bytes, packets) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, run_time, *row) for row in parse_conversation_lines(conversations)),
+            )
+            self._conn.execute(
+                """
+                INSERT INTO hosts (ip, bytes_sent, bytes_received, runs, first_seen, last_seen)
+                SELECT ip, bytes_sent, bytes_received, 1, run_time, run_time
+                FROM traffic WHERE run_id = ?
+                ON CONFLICT (ip) DO UPDATE SET
+                    bytes_sent = hosts.bytes_sent + excluded.bytes_sent,
+                    bytes_received = hosts.bytes_received + excluded.bytes_received,
+                    runs = hosts.runs + 1,
+                    first_seen = min(hosts.first_seen, excluded.first_seen),
+                    last_seen = max(hosts.last_seen, excluded.last_seen)
+                """,
+                (run_id,),
+            )
+            self._conn.execute(
+                """
+                INSERT INTO runs (run_id, capture, run_time, ingested_at, traffic_source,
+                                  conversation_source, hosts, conversations)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    run_id, capture, run_time, time.time(), sources.get("traffic"),
+                    sources.get("conversation"), hosts, conversation_count,
+                ),
+            )
+        return hosts, conversation_count
+
+    def forget_run(self, run_id: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            return self._remove_run(run_id)
+
+    def _insert_batches(self, sql: str, rows: Iterable[Tuple]) -> int:
+        count = 0
+        batch: List[Tuple] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH:
+                self._conn.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._conn.executemany(sql, batch)
+            count += len(batch)
+        return count
+
+    def _remove_run(self, run_id: str) -> bool:
+        """Delete a run inside the caller's transaction and back it out of the host totals."""
+        if self._conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is None:
+            return False
+        ips = [row["ip"] for row in self._conn.execute(
+            "SELECT ip FROM traffic WHERE run_id = ?", (run_id,)
+        )]
+        self._conn.execute("DELETE FROM traffic WHERE run_id = ?", (run_id,))
+        self._conn.execute("DELETE FROM conversations WHERE run_id = ?", (run_id,))
+        self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        # Removing a run is rare, so the affected totals are simply recomputed.
+        for start in range(0, len(ips), 500):
+            chunk = ips[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            self._conn.execute(f"DELETE FROM hosts WHERE ip IN ({marks})", chunk)
+            self._conn.execute(
+                f"""
+                INSERT INTO hosts (ip, bytes_sent, bytes_received, runs, first_seen, last_seen)
+                SELECT ip, SUM(bytes_sent), SUM(bytes_received), COUNT(*), MIN(run_time), MAX(run_time)
+                FROM traffic WHERE ip IN ({marks}) GROUP BY ip
+                """,
+                chunk,
+            )
+        return True
+
+    # -- queries --------------------------------------------------------------
+
+    def query(self, sql: str, params: Sequence[object] = ()) -> Tuple[List[str], Iterator[Tuple]]:
+        """Run a read query; rows are fetched lazily in batches."""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+        return columns, self._fetch(cursor)
+
+    def _fetch(self, cursor: sqlite3.Cursor) -> Iterator[Tuple]:
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+
+    def runs(self, since: Optional[float], until: Optional[float], limit: Optional[int]):
+        where, params = _where(since, until)
+        sql = (
+            "SELECT run_id, capture, run_time, hosts, conversations FROM runs"
+            f"{where} ORDER BY run_time DESC"
+        )
+        return self.query(*_limit(sql, params, limit))
+
+    def top_hosts(
+        self,
+        by: str,
+        limit: int,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        run_id: Optional[str] = None,
+    ):
+        order = HOST_ORDER[by]
+        if run_id is not None:
+            sql = (
+                "SELECT ip, bytes_sent, bytes_received, bytes_sent + bytes_received AS bytes_total "
+                f"FROM traffic WHERE run_id = ? ORDER BY {order} DESC"
+            )
+            return self.query(*_limit(sql, [run_id], limit))
+        if since is None and until is None:
+            # All-time totals are kept up to date in the hosts table.
+            sql = (
+                "SELECT ip, bytes_sent, bytes_received, bytes_sent + bytes_received AS bytes_total, "
+                f"runs, first_seen, last_seen FROM hosts ORDER BY {order} DESC"
+            )
+            return self.query(*_limit(sql, [], limit))
+        where, params = _where(since, until)
+        sql = (
+            "SELECT ip, SUM(bytes_sent) AS bytes_sent, SUM(bytes_received) AS bytes_received, "
+            "SUM(bytes_sent + bytes_received) AS bytes_total, COUNT(*) AS runs, "
+            "MIN(run_time) AS first_seen, MAX(run_time) AS last_seen "
+            f"FROM traffic{where} GROUP BY ip ORDER BY {order} DESC"
+        )
+        return self.query(*_limit(sql, params, limit))
+
+    def top_conversations(
+        self,
+        by: str,
+        limit: int,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        run_id: Optional[str] = None,
+    ):
+        order = CONVERSATION_ORDER[by]
+        conditions, params = [f"{order} IS NOT NULL"], []
+        if run_id is not None:
+            conditions.append("run_id = ?")
+            params.append(run_id)
+        where, params = _where(since, until, conditions, params)
+        sql = (
+            "SELECT run_id, conversation, rtt_ms, duration_sec, volume_bytes, packets "
+            f"FROM conversations{where} ORDER BY {order} DESC"
+        )
+        return self.query(*_limit(sql, params, limit))
+
+    def host_history(self, ip: str, since: Optional[float], until: Optional[float], limit: Optional[int]):
+        where, params = _where(since, until, ["ip = ?"], [ip])
+        sql = (
+            "SELECT run_time, run_id, bytes_sent, bytes_received FROM traffic"
+            f"{where} ORDER BY run_time"
+        )
+        return self.query(*_limit(sql, params, limit))
+
+    def host_conversations(
+        self, ip: str, since: Optional[float], until: Optional[float], limit: Optional[int]
+    ):
+        # Two index range scans (one per endpoint column) instead of an OR that
+        # would force a full scan.
+        where_a, params_a = _where(since, until, ["ip_a = ?"], [ip])
+        where_b, params_b = _where(since, until, ["ip_b = ?", "ip_a != ?"], [ip, ip])
+        columns = "run_time, run_id, conversation, rtt_ms, duration_sec, volume_bytes, packets"
+        sql = (
+            f"SELECT {columns} FROM conversations{where_a} "
+            f"UNION ALL SELECT {columns} FROM conversations{where_b} ORDER BY run_time"
+        )
+        return self.query(*_limit(sql, [*params_a, *params_b], limit))
+
+    def dump(
+        self,
+        kind: str,
+        since: Optional[float],
+        until: Optional[float],
+        run_id: Optional[str],
+        limit: Optional[int],
+    ):
+        where, params = _where(since, until, ["run_id = ?"] if run_id else [], [run_id] if run_id else [])
+        if kind == "traffic":
+            columns = "run_time, run_id, ip, bytes_sent, bytes_received"
+        else:
+            columns = "run_time, run_id, conversation, rtt_ms, duration_sec, volume_bytes, packets"
+        sql = f"SELECT {columns} FROM {kind}{where} ORDER BY run_time"
+        return self.query(*_limit(sql, params, limit))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _where(
+    since: Optional[float],
+    until: Optional[float],
+    conditions: Sequence[str] = (),
+    params: Sequence[object] = (),
+) -> Tuple[str, List[object]]:
+    """Build a WHERE clause from extra conditions plus a run_time range."""
+    clauses = list(conditions)
+    values = list(params)
+    if since is not None:
+        clauses.append("run_time >= ?")
+        values.append(since)
+    if until is not None:
+        clauses.append("run_time < ?")
+        values.append(until)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), values
+
+
+def _limit(sql: str, params: List[object], limit: Optional[int]) -> Tuple[str, List[object]]:
+    if limit is None:
+        return sql, params
+    return f"{sql} LIMIT ?", [*params, limit]
+
+
+def ingest_from_hdfs(
+    results: ResultStore,
+    hdfs: HdfsClient,
+    run_id: str,
+    paths: Dict[str, str],
+    capture: Optional[str] = None,
+) -> Tuple[int, int]:
+    """Ingest a watcher run from its HDFS output directories (CaptureJob.paths)."""
+    traffic_dir = paths.get("hdfs_traffic")
+    conversation_dir = paths.get("hdfs_conversation")
+    return results.ingest_run(
+        run_id,
+        hdfs_output_lines(hdfs, traffic_dir) if traffic_dir else (),
+        hdfs_output_lines(hdfs, conversation_dir) if conversation_dir else (),
+        capture=capture,
+        sources={"traffic": traffic_dir or "", "conversation": conversation_dir or ""},
+    )
+
+
+def write_rows(
+    columns: List[str],
+    rows: Iterator[Tuple],
+    output_format: str,
+    out: TextIO = sys.stdout,
+) -> int:
+    """Stream rows as an aligned table, TSV or JSON lines; returns the row count."""
+    count = 0
+    if output_format == "json":
+        for row in rows:
+            record = {
+                column: format_time(value) if column in TIME_COLUMNS and value is not None else value
+                for column, value in zip(columns, row)
+            }
+            out.write(json.dumps(record) + "\n")
+            count += 1
+        return count
+    if output_format == "tsv":
+        out.write("\t".join(columns) + "\n")
+        for row in rows:
+            out.write("\t".join(_cell(column, value, False) for column, value in zip(columns, row)) + "\n")
+            count += 1
+        return count
+
+    # Table: column widths come from the first rows; later rows stream through.
+    sample: List[List[str]] = []
+    for row in rows:
+        sample.append([_cell(column, value, True) for column, value in zip(columns, row)])
+        if len(sample) >= TABLE_WIDTH_SAMPLE:
+            break
+    widths = [max([len(column)] + [len(cells[i]) for cells in sample]) for i, column in enumerate(columns)]
+    header = " | ".join(column.ljust(width) for column, width in zip(columns, widths))
+    out.write("-" * len(header) + "\n" + header + "\n" + "-" * len(header) + "\n")
+    for cells in sample:
+        out.write(" | ".join(cell.ljust(width) for cell, width in zip(cells, widths)) + "\n")
+        count += 1
+    for row in rows:
+        cells = [_cell(column, value, True) for column, value in zip(columns, row)]
+        out.write(" | ".join(cell.ljust(width) for cell, width in zip(cells, widths)) + "\n")
+        count += 1
+    return count
+
+
+def _cell(column: str, value: object, human: bool) -> str:
+    if value is None:
+        return "N/A"
+    if column in TIME_COLUMNS:
+        return format_time(float(value))  # type: ignore[arg-type]
+    if human and column in BYTE_COLUMNS:
+        return format_size(value)
+    if isinstance(value, float):
+        return f"{value:.3f}" if column == "rtt_ms" else f"{value:.6f}"
+    return str(value)
+
+
+def make_hdfs_client(args: argparse.Namespace) -> HdfsClient:
+    if args.webhdfs_url:
+        return WebHdfsClient(args.webhdfs_url, user=args.webhdfs_user)
+    return HadoopCliClient(args.hadoop_bin)
+
+
+def ingest_command(results: ResultStore, args: argparse.Namespace) -> int:
+    if args.from_state is not None:
+        from watch_state import STATUS_PROCESSED, StateStore
+
+        hdfs = make_hdfs_client(args)
+        loaded = failed = 0
+        try:
+            with StateStore(args.from_state.expanduser().resolve()) as state:
+                for entry in state.entries(STATUS_PROCESSED):
+                    run_id = str(entry["run_id"])
+                    if not args.reingest and results.has_run(run_id):
+                        continue
+                    paths = {key: str(value) for key, value in entry.items() if key.startswith("hdfs_")}
+                    try:
+                        hosts, conversations = ingest_from_hdfs(
+                            results, hdfs, run_id, paths, capture=Path(str(entry["path"])).name
+                        )
+                    except HdfsError as exc:
+                        print(f"Skipping {run_id}: {exc}", file=sys.stderr)
+                        failed += 1
+                        continue
+                    print(f"Ingested {run_id}: {hosts} hosts, {conversations} conversations")
+                    loaded += 1
+        finally:
+            hdfs.close()
+        print(f"{loaded} runs ingested, {failed} failed")
+        return 1 if failed else 0
+
+    if args.run_id is None or (args.traffic is None and args.conversations is None):
+        raise ResultStoreError("ingest needs --from-state, or --run-id with --traffic and/or --conversations")
+    hosts, conversations = results.ingest_run(
+        args.run_id,
+        local_output_lines(args.traffic) if args.traffic else (),
+        local_output_lines(args.conversations) if args.conversations else (),
+        run_time=parse_time(args.run_time) if args.run_time else None,
+        capture=args.capture,
+        sources={
+            "traffic": str(args.traffic or ""),
+            "conversation": str(args.conversations or ""),
+        },
+    )
+    print(f"Ingested {args.run_id}: {hosts} hosts, {conversations} conversations")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Load analysis results of many runs into an indexed store and query them."
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=DEFAULT_RESULT_STORE,
+        help=f"Result store database (default: {DEFAULT_RESULT_STORE}).",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_query_options(sub: argparse.ArgumentParser, limit: Optional[int] = None) -> None:
+        sub.add_argument("--since", help="Only runs at or after this time (e.g. 24h, 7d, 2026-01-31).")
+        sub.add_argument("--until", help="Only runs before this time.")
+        sub.add_argument("-n", "--limit", type=int, default=limit, help="Maximum rows to print.")
+        sub.add_argument(
+            "--format",
+            choices=("table", "tsv", "json"),
+            default="table",
+            help="Output format; all formats stream rows as they are read.",
+        )
+
+    ingest = subparsers.add_parser("ingest", help="Load the results of one or more runs.")
+    ingest.add_argument(
+        "--from-state",
+        type=Path,
+        help="Watcher state database; every processed run not yet loaded is read from HDFS.",
+    )
+    ingest.add_argument("--reingest", action="store_true", help="Reload runs that are already loaded.")
+    ingest.add_argument("--run-id", help="Run id for --traffic/--conversations.")
+    ingest.add_argument("--traffic", type=Path, help="Local traffic volume output (file or part-* dir).")
+    ingest.add_argument("--conversations", type=Path, help="Local conversation output (file or part-* dir).")
+    ingest.add_argument("--run-time", help="Run time (default: taken from the run id, else now).")
+    ingest.add_argument("--capture", help="Capture file name recorded for the run.")
+    ingest.add_argument("--webhdfs-url", help="WebHDFS endpoint; otherwise 'hadoop fs' is used.")
+    ingest.add_argument("--webhdfs-user", help="user.name for WebHDFS simple authentication.")
+    ingest.add_argument("--hadoop-bin", default="hadoop", help="Hadoop CLI for HDFS reads.")
+
+    runs = subparsers.add_parser("runs", help="List loaded runs, newest first.")
+    add_query_options(runs)
+
+    top = subparsers.add_parser("top", help="Top hosts or conversations.")
+    top.add_argument("kind", choices=("hosts", "conversations"))
+    top.add_argument(
+        "--by",
+        help=f"Sort key: hosts {'/'.join(HOST_ORDER)} (default total), "
+        f"conversations {'/'.join(CONVERSATION_ORDER)} (default volume).",
+    )
+    top.add_argument("--run-id", help="Restrict to one run.")
+    add_query_options(top, limit=10)
+
+    history = subparsers.add_parser("history", help="Per-run traffic of one IP address.")
+    history.add_argument("ip")
+    history.add_argument(
+        "--conversations", action="store_true", help="List the IP's conversations instead of its traffic."
+    )
+    add_query_options(history)
+
+    dump = subparsers.add_parser("dump", help="Stream all rows of a time range.")
+    dump.add_argument("kind", choices=("traffic", "conversations"))
+    dump.add_argument("--run-id", help="Restrict to one run.")
+    add_query_options(dump)
+
+    forget = subparsers.add_parser("forget", help="Remove a run from the store.")
+    forget.add_argument("run_id")
+
+    args = parser.parse_args(argv)
+    try:
+        since = parse_time(args.since) if getattr(args, "since", None) else None
+        until = parse_time(args.until) if getattr(args, "until", None) else None
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    with ResultStore(args.db.expanduser().resolve()) as results:
+        try:
+            if args.command == "ingest":
+                return ingest_command(results, args)
+            if args.command == "forget":
+                if not results.forget_run(args.run_id):
+                    print(f"No run {args.run_id} in {args.db}")
+                    return 1
+                return 0
+            if args.command == "runs":
+                columns, rows = results.runs(since, until, args.limit)
+            elif args.command == "top" and args.kind == "hosts":
+                by = args.by or "total"
+                if by not in HOST_ORDER:
+                    parser.error(f"--by for hosts must be one of {', '.join(HOST_ORDER)}")
+                columns, rows = results.top_hosts(by, args.limit, since, until, args.run_id)
+            elif args.command == "top":
+                by = args.by or "volume"
+                if by not in CONVERSATION_ORDER:
+                    parser.error(f"--by for conversations must be one of {', '.join(CONVERSATION_ORDER)}")
+                columns, rows = results.top_conversations(by, args.limit, since, until, args.run_id)
+            elif args.command == "history" and args.conversations:
+                columns, rows = results.host_conversations(args.ip, since, until, args.limit)
+            elif args.command == "history":
+                columns, rows = results.host_history(args.ip, since, until, args.limit)
+            else:
+                columns, rows = results.dump(args.kind, since, until, args.run_id, args.limit)
+            write_rows(columns, rows, args.format)
+        except (ResultStoreError, sqlite3.Error) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            return 1
+        except BrokenPipeError:
+            # Output piped into head/less that exited early.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -33,8 +33,28 @@ echo "Starting preprocessing job..."
 echo "Input: $INPUT_DIR"
 echo "Output: $OUTPUT_DIR"
 
+# Forward profiling and counter settings (see common/instrumentation.py), the
+# duplicate filter settings (see common/bloom.py; each map task deduplicates its
+# own input split) and the flow sampling settings (see common/sampling.py; a
+# fixed SAMPLE_RATE keeps the same flows in every map task) and the I/O thread
+# settings (see common/stream_io.py) to the tasks
+STREAMING_ENV=()
+for var in STREAMING_PROFILE STREAMING_PROFILE_DIR STREAMING_PROFILE_INTERVAL STREAMING_PROFILE_FRAMES STREAMING_REPORT_INTERVAL \
+           DEDUP_WINDOW DEDUP_CAPACITY DEDUP_ERROR_RATE DEDUP_PAYLOAD_BYTES \
+           SAMPLE_RATE SAMPLE_TARGET_PPS SAMPLE_MIN_RATE SAMPLE_IDLE_TIMEOUT \
+           IO_BUFFER_MB IO_BUFFERS OUTPUT_BATCH_RECORDS; do
+    if [ -n "${!var}" ]; then
+        STREAMING_ENV+=(-cmdenv "$var=${!var}")
+    fi
+done
+
+# Shuffle and output compression (MAP_OUTPUT_CODEC, OUTPUT_COMPRESSION)
+source "$PROJECT_DIR/scripts/hadoop_compression.sh"
+
 hadoop jar $HADOOP_STREAMING_JAR \
-    -files "$PROJECT_DIR/preprocessing/mapper.py,$PROJECT_DIR/preprocessing/reducer.py" \
+    "${COMPRESSION_OPTS[@]}" \
+    -files "$PROJECT_DIR/preprocessing/mapper.py,$PROJECT_DIR/preprocessing/reducer.py,$PROJECT_DIR/common/instrumentation.py,$PROJECT_DIR/common/bloom.py,$PROJECT_DIR/common/run_index.py,$PROJECT_DIR/common/sampling.py,$PROJECT_DIR/common/stream_io.py" \
+    "${STREAMING_ENV[@]}" \
     -mapper "python3 mapper.py" \
     -reducer "python3 reducer.py" \
     -input "$INPUT_DIR" \
@@ -43,7 +63,7 @@ hadoop jar $HADOOP_STREAMING_JAR \
 if [ $? -eq 0 ]; then
     echo "Preprocessing job completed successfully!"
     echo "Output available at: $OUTPUT_DIR"
-    echo "To view results: hadoop fs -cat $OUTPUT_DIR/part-*"
+    echo "To view results: hadoop fs -text $OUTPUT_DIR/part-*"
 else
     echo "Preprocessing job failed!"
     exit 1
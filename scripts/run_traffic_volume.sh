@@ -15,12 +15,15 @@ if ! command -v hadoop &> /dev/null; then
     exit 1
 fi
 
-# Check if input directory exists in HDFS
-if ! hadoop fs -test -d "$INPUT_DIR"; then
-    echo "Error: Input directory $INPUT_DIR does not exist in HDFS."
-    echo "Please run the preprocessing job first or specify a valid input directory."
-    exit 1
-fi
+# Check if input directories exist in HDFS (INPUT_DIR may be a comma-separated list)
+IFS=',' read -ra INPUT_PATHS <<< "$INPUT_DIR"
+for input_path in "${INPUT_PATHS[@]}"; do
+    if ! hadoop fs -test -d "$input_path"; then
+        echo "Error: Input directory $input_path does not exist in HDFS."
+        echo "Please run the preprocessing job first or specify a valid input directory."
+        exit 1
+    fi
+done
 
 # Remove output directory if it exists
 echo "Removing existing output directory: $OUTPUT_DIR"
@@ -31,17 +34,64 @@ echo "Starting traffic volume analysis job..."
 echo "Input: $INPUT_DIR"
 echo "Output: $OUTPUT_DIR"
 
+# Skew handling (see common/skew.py): keys listed in SKEW_HOT_KEYS, or found in a
+# sample of the input with SKEW_DETECT=1, are salted over SKEW_SALTS reducers and
+# their partial results merged by a second, small job over the first job's output
+if [ -z "$SKEW_HOT_KEYS" ] && [ "$SKEW_DETECT" = "1" ]; then
+    echo "Sampling ${SKEW_SAMPLE_RECORDS:-200000} input records for hot keys..."
+    SKEW_HOT_KEYS=$(hadoop fs -text "${INPUT_PATHS[@]/%//*}" 2>/dev/null \
+        | head -n "${SKEW_SAMPLE_RECORDS:-200000}" \
+        | python3 "$PROJECT_DIR/scripts/find_hot_keys.py" --job traffic --reducers "${SKEW_REDUCERS:-8}")
+fi
+JOB_OUTPUT="$OUTPUT_DIR"
+if [ -n "$SKEW_HOT_KEYS" ]; then
+    echo "Salting hot keys over ${SKEW_SALTS:-8} reducers: $SKEW_HOT_KEYS"
+    JOB_OUTPUT="${OUTPUT_DIR}_salted"
+    hadoop fs -rm -r -f "$JOB_OUTPUT"
+fi
+
+# Forward profiling and counter settings (see common/instrumentation.py) and the
+# hot keys to the tasks
+STREAMING_ENV=()
+for var in STREAMING_PROFILE STREAMING_PROFILE_DIR STREAMING_PROFILE_INTERVAL STREAMING_PROFILE_FRAMES STREAMING_REPORT_INTERVAL \
+           SKEW_HOT_KEYS SKEW_SALTS; do
+    if [ -n "${!var}" ]; then
+        STREAMING_ENV+=(-cmdenv "$var=${!var}")
+    fi
+done
+
+# Shuffle and output compression (MAP_OUTPUT_CODEC, OUTPUT_COMPRESSION)
+source "$PROJECT_DIR/scripts/hadoop_compression.sh"
+
+JOB_FILES="$PROJECT_DIR/traffic_volume/mapper.py,$PROJECT_DIR/traffic_volume/reducer.py,$PROJECT_DIR/common/instrumentation.py,$PROJECT_DIR/common/compression.py,$PROJECT_DIR/common/sampling.py,$PROJECT_DIR/common/skew.py"
+
 hadoop jar $HADOOP_STREAMING_JAR \
-    -files "$PROJECT_DIR/traffic_volume/mapper.py,$PROJECT_DIR/traffic_volume/reducer.py" \
+    "${COMPRESSION_OPTS[@]}" \
+    -files "$JOB_FILES" \
+    "${STREAMING_ENV[@]}" \
     -mapper "python3 mapper.py" \
     -reducer "python3 reducer.py" \
     -input "$INPUT_DIR" \
-    -output "$OUTPUT_DIR"
+    -output "$JOB_OUTPUT"
+STATUS=$?
+
+if [ $STATUS -eq 0 ] && [ "$JOB_OUTPUT" != "$OUTPUT_DIR" ]; then
+    echo "Merging partial results of hot keys..."
+    hadoop jar $HADOOP_STREAMING_JAR \
+        "${COMPRESSION_OPTS[@]}" \
+        -files "$JOB_FILES" \
+        -mapper "python3 mapper.py --merge" \
+        -reducer "python3 reducer.py --merge" \
+        -input "$JOB_OUTPUT" \
+        -output "$OUTPUT_DIR"
+    STATUS=$?
+    hadoop fs -rm -r -f "$JOB_OUTPUT"
+fi
 
-if [ $? -eq 0 ]; then
+if [ $STATUS -eq 0 ]; then
     echo "Traffic volume analysis job completed successfully!"
     echo "Output available at: $OUTPUT_DIR"
-    echo "To view results: hadoop fs -cat $OUTPUT_DIR/part-*"
+    echo "To view results: hadoop fs -text $OUTPUT_DIR/part-*"
 else
     echo "Traffic volume analysis job failed!"
     exit 1
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Cut a live pcap/pcapng byte stream into self-contained capture windows.
+
+dumpcap and tshark can write a capture to stdout ("-w -"). StreamWindower
+frames that stream into whole records (common/pcap_stream.py) and closes a
+window when it spans --window-seconds of packet time, when it reaches
+--window-bytes, or when it has been open for --window-seconds of wall-clock
+time (so a quiet link still produces a window every few seconds). Every
+window is the stream's preamble followed by complete records, i.e. a valid
+capture that preprocessing/mapper.py can decode straight from memory.
+
+iter_windows() reads a pipe, FIFO or file and yields windows as they close;
+the watcher (--stream / --stream-command) hands each one to its pipeline.
+Piping a capture file through exercises the same code path:
+
+    cat capture.pcap | python3 scripts/watch_and_process_pcaps.py --stream - --window-seconds 5
+"""
+
+from __future__ import annotations
+
+import os
+import select
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "common"))
+
+from pcap_stream import (  # noqa: E402
+    PCAPNG_IDB,
+    PCAPNG_SHB,
+    PcapFraming,
+    parse_preamble,
+)
+
+READ_SIZE = 1024 * 1024
+
+
+@dataclass
+class PcapWindow:
+    index: int
+    data: bytes
+    packets: int
+    first_timestamp: Optional[float]
+    last_timestamp: Optional[float]
+
+
+class StreamWindower:
+    """Accumulate stream bytes and emit capture windows as they close."""
+
+    def __init__(self, window_seconds: float, window_bytes: int) -> None:
+        if window_seconds <= 0 and window_bytes <= 0:
+            raise ValueError("a window needs a time or size limit")
+        self.window_seconds = window_seconds
+        self.window_bytes = window_bytes
+        self.framing: Optional[PcapFraming] = None
+        self.index = 0
+        self._buffer = bytearray()
+        self._parts: List[bytes] = []
+        self._size = 0
+        self._packets = 0
+        self._first: Optional[float] = None
+        self._last: Optional[float] = None
+        self._opened: Optional[float] = None
+
+    def feed(self, data: bytes) -> List[PcapWindow]:
+        """Add stream bytes; returns the windows they closed."""
+        self._buffer += data
+        closed: List[PcapWindow] = []
+        offset = 0
+        while True:
+            if self.framing is None:
+                framing, preamble_len = parse_preamble(self._buffer[offset:])
+                if framing is None:
+                    break
+                self.framing = framing
+                offset += preamble_len
+                continue
+            length = self.framing.record_length(self._buffer, offset)
+            if length is None:
+                break
+            record = bytes(self._buffer[offset:offset + length])
+            if self.framing.pcapng:
+                block_type = int.from_bytes(record[:4], "little" if self.framing.endian == "<" else "big")
+                if block_type == PCAPNG_SHB:
+                    # A new section restarts the stream with its own preamble.
+                    window = self._close()
+                    if window is not None:
+                        closed.append(window)
+                    self.framing = None
+                    continue
+                if block_type == PCAPNG_IDB:
+                    # Interfaces added mid-stream are needed by this and every
+                    # later window; the preamble is prepended when a window closes.
+                    self.framing.preamble += record
+                    offset += length
+                    continue
+            if self.framing.is_packet(self._buffer, offset):
+                timestamp = self.framing.timestamp(self._buffer, offset)
+                window = self._close_if_full(timestamp, length)
+                if window is not None:
+                    closed.append(window)
+                self._add(record, packet=True, timestamp=timestamp)
+            else:
+                self._add(record)
+            offset += length
+        del self._buffer[:offset]
+        return closed
+
+    def poll(self, now: Optional[float] = None) -> Optional[PcapWindow]:
+        """Close the current window if it has been open for window_seconds."""
+        if self._opened is None or self.window_seconds <= 0:
+            return None
+        now = time.monotonic() if now is None else now
+        if now - self._opened >= self.window_seconds:
+            return self._close()
+        return None
+
+    def time_left(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until poll() closes the current window (None if none is open)."""
+        if self._opened is None or self.window_seconds <= 0:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._opened + self.window_seconds - now)
+
+    def close(self) -> Optional[PcapWindow]:
+        """Close the last window at the end of the stream."""
+        if self._buffer:
+            print(
+                f"Warning: dropping {len(self._buffer)} bytes of an incomplete record at the end of the stream",
+                file=sys.stderr,
+            )
+            self._buffer.clear()
+        return self._close()
+
+    def _close_if_full(self, timestamp: Optional[float], length: int) -> Optional[PcapWindow]:
+        if not self._packets:
+            return None
+        if self.window_bytes > 0 and self._size + length > self.window_bytes:
+            return self._close()
+        if (
+            self.window_seconds > 0
+            and timestamp is not None
+            and self._first is not None
+            and timestamp - self._first >= self.window_seconds
+        ):
+            return self._close()
+        return None
+
+    def _add(self, record: bytes, packet: bool = False, timestamp: Optional[float] = None) -> None:
+        self._parts.append(record)
+        self._size += len(record)
+        if not packet:
+            return
+        self._packets += 1
+        if self._opened is None:
+            self._opened = time.monotonic()
+        if timestamp is not None:
+            if self._first is None:
+                self._first = timestamp
+            self._last = timestamp
+
+    def _close(self) -> Optional[PcapWindow]:
+        if not self._packets or self.framing is None:
+            return None
+        window = PcapWindow(
+            index=self.index,
+            data=self.framing.preamble + b"".join(self._parts),
+            packets=self._packets,
+            first_timestamp=self._first,
+            last_timestamp=self._last,
+        )
+        self.index += 1
+        self._parts = []
+        self._size = 0
+        self._packets = 0
+        self._first = self._last = None
+        self._opened = None
+        return window
+
+
+def iter_windows(
+    handle: BinaryIO, window_seconds: float, window_bytes: int, read_size: int = READ_SIZE
+) -> Iterator[PcapWindow]:
+    """Yield the windows of a capture stream as they close, until end of stream.
+
+    The stream is read without blocking past the wall-clock deadline of the
+    open window, so windows close on time even when no packets arrive.
+    """
+    windower = StreamWindower(window_seconds, window_bytes)
+    fd = handle.fileno()
+    while True:
+        timeout = windower.time_left()
+        readable, _, _ = select.select([fd], [], [], timeout)
+        if not readable:
+            window = windower.poll()
+            if window is not None:
+                yield window
+            continue
+        data = os.read(fd, read_size)
+        if not data:
+            break
+        yield from windower.feed(data)
+        window = windower.poll()
+        if window is not None:
+            yield window
+    window = windower.close()
+    if window is not None:
+        yield window
@@ -8,6 +8,24 @@ existing preprocessing, traffic volume, and conversation analysis jobs for
 every new file. Results are written to per-capture subdirectories in HDFS so
 previous outputs are preserved.
 
+On Linux the watcher is event driven: captures are picked up as soon as the
+writer closes them (inotify IN_CLOSE_WRITE) or renames them into the directory
+(IN_MOVED_TO). Where inotify is unavailable it falls back to polling the
+directory every --interval seconds.
+
+With --tail, captures that are still being written are processed
+incrementally: every --tail-interval seconds the records appended since the
+last checkpointed byte offset are preprocessed into a part file, and the
+offset is saved in the state file so a restart resumes mid-capture. Captures
+larger than --checkpoint-bytes are preprocessed the same way, one committed
+part file per --checkpoint-bytes, so a crash or OOM kill only costs the chunk
+that was in flight.
+
+With --stream or --stream-command, no directory is watched: a live capture
+stream (dumpcap/tshark writing to stdout) is cut into windows of a few
+seconds (see stream_ingest.py) and each window goes through the pipeline
+from memory as soon as it closes, without ring files on disk.
+
 Example usage:
 
     python3 scripts/watch_and_process_pcaps.py \
@@ -24,17 +42,61 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import shlex
 import shutil
+import sqlite3
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+from contextlib import ExitStack
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Optional
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "common"))
+
+import bloom
+import compression
+import run_index
+from capture_pipeline import CaptureJob, CapturePipeline, Stage
+from capture_tailer import PcapFormatError, TailChunk, new_checkpoint, read_appended_records
+from hdfs_client import (
+    HadoopCliClient,
+    HdfsClient,
+    HdfsError,
+    WebHdfsClient,
+    iter_chunks,
+    iter_lines,
+)
+from inotify_watch import DirectoryEvents, InotifyUnavailable
+from result_store import ResultStore, ingest_from_hdfs
+from stream_ingest import PcapWindow, iter_windows
+from watcher_metrics import WatcherMetrics, start_exporters
+from watch_state import (
+    STATUS_FAILED,
+    STATUS_IN_PROGRESS,
+    STATUS_PROCESSED,
+    StateStore,
+)
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
-DEFAULT_STATE_FILE = PROJECT_ROOT / "state" / "pcap_watch_state.json"
+DEFAULT_STATE_FILE = PROJECT_ROOT / "state" / "pcap_watch_state.db"
+DEFAULT_DEDUP_STATE = PROJECT_ROOT / "state" / "dedup_filter.bin"
+STREAM_CHUNK_SIZE = 1024 * 1024
+SPLIT_SPOOL_LIMIT = 64 * 1024 * 1024
+RUN_ID_SEP = b"|"
+# Backlog gauges share one directory scan per scrape (and per this many seconds)
+BACKLOG_CACHE_SECONDS = 5.0
+
+# kind -> (job script, CaptureJob.paths key, HDFS base argument)
+ANALYSIS_JOBS = {
+    "traffic": ("run_traffic_volume.sh", "hdfs_traffic", "hdfs_traffic_base"),
+    "conversation": ("run_conversation_analysis.sh", "hdfs_conversation", "hdfs_conversation_base"),
+}
+PIPELINE_STAGES = ("preprocess", *ANALYSIS_JOBS)
 
 
 class CommandError(RuntimeError):
@@ -69,15 +131,28 @@ def run_command(cmd: list[str], cwd: Optional[Path] = None) -> None:
         raise CommandError(error_msg) from exc
 
 
-def ensure_hdfs_directory(path: str) -> None:
-    run_command(["hadoop", "fs", "-mkdir", "-p", path])
+def make_hdfs_client(args: argparse.Namespace) -> HdfsClient:
+    """Use pooled WebHDFS when a URL is configured, otherwise the hadoop CLI."""
+    if args.webhdfs_url:
+        return WebHdfsClient(
+            args.webhdfs_url,
+            user=args.webhdfs_user,
+            pool_size=args.preprocess_workers + 2 * args.analysis_workers + 1,
+            retries=args.hdfs_retries,
+        )
+    return HadoopCliClient(args.hadoop_bin, run=run_command)
+
 
+def ensure_hdfs_directory(hdfs: HdfsClient, path: str) -> None:
+    hdfs.mkdir(path)
 
-def upload_pcap_to_hdfs(local_path: Path, hdfs_dir: str) -> str:
+
+def upload_pcap_to_hdfs(hdfs: HdfsClient, local_path: Path, hdfs_dir: str) -> str:
     """Upload the PCAP file to the specified HDFS directory."""
-    ensure_hdfs_directory(hdfs_dir)
-    run_command(["hadoop", "fs", "-put", "-f", str(local_path), hdfs_dir])
-    return f"{hdfs_dir.rstrip('/')}/{local_path.name}"
+    ensure_hdfs_directory(hdfs, hdfs_dir)
+    target = f"{hdfs_dir.rstrip('/')}/{local_path.name}"
+    hdfs.put(local_path, target)
+    return target
 
 
 def slugify(name: str) -> str:
@@ -117,25 +192,93 @@ def file_is_stable(path: Path, checks: int, interval: float) -> bool:
     return False
 
 
-def load_state(state_file: Path) -> Dict[str, Dict[str, float]]:
-    if not state_file.exists():
-        return {}
+class StabilityTracker:
+    """Non-blocking variant of file_is_stable for the continuous watch loop.
+
+    Each call to observe() records one size check. A file is reported stable
+    once its size has been identical for the configured number of checks,
+    with at least ``interval`` seconds between checks, so several growing
+    files can be tracked without sleeping on any of them.
+    """
+
+    def __init__(self, checks: int, interval: float) -> None:
+        self.checks = checks
+        self.interval = interval
+        self._entries: Dict[Path, Tuple[int, int, float]] = {}
+
+    def observe(self, path: Path, now: Optional[float] = None) -> Optional[bool]:
+        """Return True when stable, False when still growing, None if gone."""
+        if self.checks <= 1:
+            return True
+        now = time.monotonic() if now is None else now
+        try:
+            current_size = path.stat().st_size
+        except FileNotFoundError:
+            self.forget(path)
+            return None
+
+        entry = self._entries.get(path)
+        if entry is None:
+            self._entries[path] = (current_size, 1, now)
+            return False
+
+        last_size, stable_count, last_check = entry
+        if now - last_check < self.interval:
+            return False
+        stable_count = stable_count + 1 if current_size == last_size else 1
+        self._entries[path] = (current_size, stable_count, now)
+        return stable_count >= self.checks
+
+    def forget(self, path: Path) -> None:
+        self._entries.pop(path, None)
+
+
+def is_already_processed(path: Path, store: StateStore) -> bool:
     try:
-        with state_file.open("r", encoding="utf-8") as handle:
-            data = json.load(handle)
-        if isinstance(data, dict):
-            return data
-    except (json.JSONDecodeError, OSError):
-        log(f"Warning: could not read state file {state_file}, starting fresh.")
-    return {}
+        stat_result = path.stat()
+    except FileNotFoundError:
+        return True
+    return store.is_processed(str(path.resolve()), stat_result.st_size, stat_result.st_mtime)
+
+
+def find_unprocessed(local_dir: Path, store: StateStore) -> List[Path]:
+    """Full directory scan for captures that have not been processed yet."""
+    return [
+        pcap_path
+        for pcap_path in sorted(local_dir.glob("*.pcap"))
+        if pcap_path.is_file() and not is_already_processed(pcap_path, store)
+    ]
+
+
+def open_state_store(state_file: Path) -> StateStore:
+    """Open the state database, importing a legacy JSON state file if present.
+
+    For backwards compatibility a ``--state-file`` ending in .json selects the
+    database next to it (same name, .db suffix) and imports the JSON file.
+    """
+    if state_file.suffix == ".json":
+        legacy_json, db_path = state_file, state_file.with_suffix(".db")
+    else:
+        legacy_json, db_path = state_file.with_suffix(".json"), state_file
+    store = StateStore(db_path)
+    if not store.is_imported(legacy_json):
+        log(f"Importing legacy state file {legacy_json} into {db_path}")
+        store.import_json(legacy_json)
+    return store
+
 
+def tail_checkpoint(store: StateStore, local_path: Path, size: int) -> Optional[Dict[str, object]]:
+    """Return the state entry of a capture that is partially tailed, if any.
 
-def save_state(state_file: Path, state: Dict[str, Dict[str, float]]) -> None:
-    state_file.parent.mkdir(parents=True, exist_ok=True)
-    tmp_file = state_file.with_suffix(".tmp")
-    with tmp_file.open("w", encoding="utf-8") as handle:
-        json.dump(state, handle, indent=2, sort_keys=True)
-    tmp_file.replace(state_file)
+    A checkpoint beyond the current file size means the capture was replaced
+    by a new one under the same name, so the checkpoint is ignored.
+    """
+    entry = store.get(str(local_path.resolve()))
+    if not entry or "tail" not in entry or entry["status"] == STATUS_PROCESSED:
+        return None
+    if entry["tail"]["offset"] > size:  # type: ignore[index]
+        return None
+    return entry
 
 
 def move_to_archive(src: Path, archive_dir: Path) -> Path:
@@ -149,83 +292,872 @@ def move_to_archive(src: Path, archive_dir: Path) -> Path:
     return destination
 
 
-def process_capture(
+def capture_paths(run_id: str, args: argparse.Namespace) -> Dict[str, str]:
+    return {
+        "hdfs_input": f"{args.hdfs_input_base.rstrip('/')}/{run_id}",
+        "hdfs_preprocessing": f"{args.hdfs_preprocessing_base.rstrip('/')}/{run_id}",
+        "hdfs_traffic": f"{args.hdfs_traffic_base.rstrip('/')}/{run_id}",
+        "hdfs_conversation": f"{args.hdfs_conversation_base.rstrip('/')}/{run_id}",
+    }
+
+
+def new_run_id(local_path: Path) -> str:
+    run_timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return f"{slugify(local_path.stem)}_{run_timestamp}"
+
+
+def prepare_capture(local_path: Path, args: argparse.Namespace, store: StateStore) -> CaptureJob:
+    """Assign a run id and HDFS locations to a capture before queueing it.
+
+    A capture that was partially tailed keeps its run id so the remaining
+    records land next to the chunks that were already uploaded. A capture
+    whose earlier run was interrupted or failed (same size and mtime) keeps
+    its run id too, and the stages that already completed are skipped.
+    """
+    # Size and mtime are captured at detection time so the state entry matches
+    # what the stability check saw, even if the file is archived later.
+    file_stat = local_path.stat()
+    state_key = str(local_path.resolve())
+    run_id = new_run_id(local_path)
+    checkpoint: Optional[Dict[str, int]] = None
+    completed: Set[str] = set()
+
+    entry = store.get(state_key)
+    if (
+        entry is not None
+        and entry["status"] in (STATUS_IN_PROGRESS, STATUS_FAILED)
+        and entry.get("size") == file_stat.st_size
+        and entry.get("mtime") == file_stat.st_mtime
+    ):
+        run_id = str(entry["run_id"])
+        completed = store.completed_stages(state_key, run_id)
+    checkpoint_entry = tail_checkpoint(store, local_path, file_stat.st_size)
+    if checkpoint_entry is not None:
+        run_id = str(checkpoint_entry["run_id"])
+        checkpoint = dict(checkpoint_entry["tail"])  # type: ignore[arg-type]
+
+    return CaptureJob(
+        local_path=local_path,
+        run_id=run_id,
+        size=file_stat.st_size,
+        mtime=file_stat.st_mtime,
+        paths=capture_paths(run_id, args),
+        checkpoint=checkpoint,
+        completed_stages=completed,
+    )
+
+
+def _feed_stdin(proc: subprocess.Popen, blocks: Iterable[bytes]) -> None:
+    assert proc.stdin is not None
+    try:
+        for block in blocks:
+            proc.stdin.write(block)
+    except BrokenPipeError:
+        pass
+    except OSError as exc:
+        # The capture could not be read: fail the mapper rather than let it
+        # decode a truncated capture.
+        log(f"ERROR reading mapper input: {exc}")
+        proc.kill()
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def mapper_state_dir(args: argparse.Namespace, run_id: str, chunk: Optional[int] = None) -> Path:
+    """Local directory of the mapper state (dedup filter, sampler) of a chunked run.
+
+    ``<run dir>/<n>`` holds the state after the first n chunks, i.e. the
+    state chunk n starts from.
+    """
+    run_dir = args.state_file.parent / "checkpoints" / run_id
+    return run_dir if chunk is None else run_dir / f"{chunk:05d}"
+
+
+def stream_preprocessing_to_hdfs(
+    hdfs: HdfsClient,
+    source: Union[Path, bytes, TailChunk],
+    hdfs_file: str,
+    codec: str,
+    run_id: Optional[str] = None,
+    dedup_state: Optional[Path] = None,
+    mapper_state: Optional[Tuple[Path, Path]] = None,
+    index_state: Optional[Path] = None,
+) -> Tuple[int, int]:
+    """Stream mapper.py output straight into an HDFS file without a temp file.
+
+    ``source`` is a capture file, an in-memory capture (a stream window) or a
+    chunk of a capture file, which is read from the file a block at a time
+    while it is fed to the mapper. The mapper's stdout is fed (optionally through an in-process gzip or
+    bzip2 compressor) into the HDFS client's streaming upload, so decoding and
+    uploading overlap and no intermediate JSON ever touches the local disk.
+    Returns the number of records written and the bytes uploaded.
+
+    With ``dedup_state`` the mapper drops packets already recorded in that
+    duplicate filter and writes its updated filter to a pending file, which is
+    merged into ``dedup_state`` only after the upload succeeded, so a failed
+    attempt never hides the capture's packets from its retry.
+
+    ``mapper_state`` is a pair of directories for one chunk of a larger
+    capture: the mapper restores its duplicate filter and flow sampler from
+    the first (the state left by the previous chunk; the first chunk starts
+    from ``dedup_state``) and saves them to the second, which is kept for the
+    next chunk. The chunks' outputs then add up to the output of one run.
+    The run index (see run_index.py) is carried from chunk to chunk the same
+    way; without ``mapper_state`` it is written to ``index_state``.
+    """
+    totals = {"records": 0, "uploaded": 0}
+
+    def count_records(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            totals["records"] += chunk.count(b"\n")
+            yield chunk
+
+    def count_uploaded(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            totals["uploaded"] += len(chunk)
+            yield chunk
+
+    mapper_script = PROJECT_ROOT / "preprocessing" / "mapper.py"
+    if isinstance(source, Path):
+        source_name = source.name
+    elif isinstance(source, TailChunk):
+        source_name = f"{source.path.name}[{source.start_offset}:{source.end_offset}]"
+    else:
+        source_name = f"<{len(source)} bytes>"
+    log(f"Running: {mapper_script.name} < {source_name} -> {hdfs_file}")
+
+    upload_error: Optional[HdfsError] = None
+    with ExitStack() as stack:
+        # We decode locally because Hadoop Streaming Text InputFormat corrupts binary PCAP files
+        if isinstance(source, Path):
+            stdin = stack.enter_context(open(source, "rb"))
+        else:
+            stdin = subprocess.PIPE
+        env = dict(os.environ)
+        if run_id:
+            env["RUN_ID"] = run_id
+        pending_dedup = None
+        if mapper_state is not None:
+            state_in, state_out = mapper_state
+            if dedup_state is not None:
+                pending_dedup = state_out / "dedup.bin"
+                chunk_dedup = state_in / "dedup.bin"
+                env["DEDUP_STATE"] = str(chunk_dedup if chunk_dedup.exists() else dedup_state)
+                env["DEDUP_STATE_OUT"] = str(pending_dedup)
+            env["SAMPLE_STATE"] = str(state_in / "sampler.json")
+            env["SAMPLE_STATE_OUT"] = str(state_out / "sampler.json")
+            env["INDEX_STATE"] = str(state_in / "index.json")
+            env["INDEX_STATE_OUT"] = str(state_out / "index.json")
+        elif dedup_state is not None:
+            pending_dedup = dedup_state.with_name(
+                f".{dedup_state.name}.{os.getpid()}-{threading.get_ident()}.pending"
+            )
+            env["DEDUP_STATE"] = str(dedup_state)
+            env["DEDUP_STATE_OUT"] = str(pending_dedup)
+        if mapper_state is None and index_state is not None:
+            env["INDEX_STATE_OUT"] = str(index_state)
+        mapper = subprocess.Popen(
+            [sys.executable, str(mapper_script)],
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            cwd=str(PROJECT_ROOT),
+            env=env,
+        )
+        assert mapper.stdout is not None
+        feeder = None
+        if not isinstance(source, Path):
+            blocks = source.blocks() if isinstance(source, TailChunk) else [source]
+            feeder = threading.Thread(target=_feed_stdin, args=(mapper, blocks), daemon=True)
+            feeder.start()
+        try:
+            chunks = count_records(iter_chunks(mapper.stdout, STREAM_CHUNK_SIZE))
+            hdfs.put_stream(count_uploaded(compression.compress_chunks(chunks, codec)), hdfs_file)
+        except HdfsError as exc:
+            upload_error = exc
+            mapper.kill()
+        finally:
+            mapper.stdout.close()
+        mapper_rc = mapper.wait()
+        if feeder is not None:
+            feeder.join()
+
+    if upload_error is not None or mapper_rc != 0:
+        if mapper_state is not None:
+            shutil.rmtree(mapper_state[1], ignore_errors=True)
+        elif pending_dedup is not None:
+            pending_dedup.unlink(missing_ok=True)
+        error_msg = f"Streaming preprocessing failed for {source_name} -> {hdfs_file}"
+        error_msg += f" (mapper exit {mapper_rc})"
+        if upload_error is not None:
+            error_msg += f"\n  upload: {upload_error}"
+        try:
+            hdfs.rm(hdfs_file)
+        except HdfsError as exc:
+            log(f"Warning: could not remove partial upload {hdfs_file}: {exc}")
+        raise CommandError(error_msg)
+    if pending_dedup is not None and pending_dedup.exists():
+        # A chunk's filter is shared with other captures right away but also
+        # kept, so a retry of the next chunk starts from exactly this state.
+        bloom.merge_state_file(str(pending_dedup), str(dedup_state), remove=mapper_state is None)
+    return totals["records"], totals["uploaded"]
+
+
+def upload_run_index(hdfs: HdfsClient, job: CaptureJob, index_state: Path, args: argparse.Namespace) -> None:
+    """Write the run's sidecar index next to its preprocessing output."""
+    index = run_index.RunIndex()
+    if not run_index.load_state(index, str(index_state)):
+        log(f"Warning: no index collected for {job.run_id}; the run gets no {run_index.INDEX_NAME}")
+        return
+    sidecar = index.sidecar(args.index_error_rate, run_id=job.run_id, capture=job.local_path.name)
+    hdfs.put_stream(
+        [json.dumps(sidecar).encode("utf-8") + b"\n"],
+        f"{job.paths['hdfs_preprocessing']}/{run_index.INDEX_NAME}",
+    )
+
+
+def upload_tail_chunk(
+    hdfs: HdfsClient,
     local_path: Path,
+    chunk: TailChunk,
+    checkpoint: Dict[str, int],
+    hdfs_pre_output: str,
     args: argparse.Namespace,
-    state: Dict[str, Dict[str, float]],
+    run_id: str,
+    metrics: WatcherMetrics,
 ) -> None:
-    """Upload the capture to HDFS and run the full Hadoop pipeline."""
-    run_timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    slug = slugify(local_path.stem)
-    run_id = f"{slug}_{run_timestamp}"
-
-    hdfs_input_dir = f"{args.hdfs_input_base.rstrip('/')}/{run_id}"
-    hdfs_pre_output = f"{args.hdfs_preprocessing_base.rstrip('/')}/{run_id}"
-    hdfs_traffic_output = f"{args.hdfs_traffic_base.rstrip('/')}/{run_id}"
-    hdfs_conversation_output = f"{args.hdfs_conversation_base.rstrip('/')}/{run_id}"
-
-    log(f"Running local preprocessing for {local_path}...")
-    
-    # 1. Run preprocessing locally (PCAP -> JSON)
-    # We do this locally because Hadoop Streaming Text InputFormat corrupts binary PCAP files
-    json_temp_path = local_path.with_suffix(".json")
-    mapper_script = PROJECT_ROOT / "preprocessing" / "mapper.py"
-    
-    try:
-        with open(local_path, "rb") as pcap_in, open(json_temp_path, "w") as json_out:
-            # Run mapper.py as a subprocess, piping pcap to stdin and json to stdout
-            subprocess.run(
-                [sys.executable, str(mapper_script)],
-                stdin=pcap_in,
-                stdout=json_out,
-                check=True,
-                cwd=str(PROJECT_ROOT)
+    """Preprocess one tail chunk into its own part file and advance the checkpoint.
+
+    The part file name and the mapper state the chunk starts from depend only
+    on the checkpoint, so a chunk that failed (or whose checkpoint was never
+    saved) is redone with the same result. The caller saves the checkpoint.
+    """
+    suffix = compression.SUFFIXES[args.preprocessing_compression]
+    part_file = f"{hdfs_pre_output}/{local_path.stem}.part-{checkpoint['chunks']:05d}.json{suffix}"
+    run_dir = mapper_state_dir(args, run_id)
+    state_in = mapper_state_dir(args, run_id, checkpoint["chunks"])
+    state_out = mapper_state_dir(args, run_id, checkpoint["chunks"] + 1)
+    # States of earlier chunks are no longer needed once the checkpoint is past them.
+    if run_dir.is_dir():
+        for stale in run_dir.iterdir():
+            if stale != state_in:
+                shutil.rmtree(stale, ignore_errors=True)
+    state_out.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+    records, uploaded = stream_preprocessing_to_hdfs(
+        hdfs,
+        chunk,
+        part_file,
+        args.preprocessing_compression,
+        run_id=run_id if args.batch_size > 1 else None,
+        dedup_state=args.dedup_state if args.dedup_window else None,
+        mapper_state=(state_in, state_out),
+    )
+    metrics.observe_tail_chunk(
+        records, chunk.size, uploaded, time.monotonic() - started
+    )
+    checkpoint["offset"] = chunk.end_offset
+    checkpoint["packets"] += chunk.packets
+    checkpoint["chunks"] += 1
+
+
+def preprocess_capture(
+    job: CaptureJob,
+    args: argparse.Namespace,
+    hdfs: HdfsClient,
+    store: StateStore,
+    metrics: WatcherMetrics,
+) -> None:
+    """Stage 1: decode the PCAP locally while streaming the JSON into HDFS.
+
+    Captures larger than --checkpoint-bytes are decoded in chunks of that
+    size, each committed as a part file with the byte offset and packet count
+    checkpointed after it. Captures that were partially tailed or whose
+    chunked run was interrupted only decode the records after their
+    checkpoint; everything before it is already in HDFS as part files.
+    """
+    local_path = job.local_path
+    hdfs_pre_output = job.paths["hdfs_preprocessing"]
+    if "preprocess" in job.completed_stages:
+        log(f"Preprocessing output for {local_path.name} already in {hdfs_pre_output}; skipping.")
+        return
+
+    if (
+        job.checkpoint is None
+        and job.data is None
+        and args.checkpoint_bytes > 0
+        and job.size > args.checkpoint_bytes
+    ):
+        log(f"Preprocessing {local_path.name} in checkpointed chunks of {args.checkpoint_bytes} bytes")
+        job.checkpoint = new_checkpoint()
+    elif job.checkpoint is not None:
+        log(
+            f"Resuming {local_path.name} from byte {job.checkpoint['offset']} "
+            f"({job.checkpoint['packets']} packets in {job.checkpoint['chunks']} committed chunks)"
+        )
+
+    if job.checkpoint is not None:
+        state_key = job.state_key
+        chunk_bytes = args.checkpoint_bytes if args.checkpoint_bytes > 0 else args.tail_chunk_bytes
+        ensure_hdfs_directory(hdfs, hdfs_pre_output)
+        while True:
+            chunk = read_appended_records(local_path, job.checkpoint["offset"], chunk_bytes)
+            if chunk is None:
+                index_state = mapper_state_dir(args, job.run_id, job.checkpoint["chunks"]) / "index.json"
+                upload_run_index(hdfs, job, index_state, args)
+                shutil.rmtree(mapper_state_dir(args, job.run_id), ignore_errors=True)
+                return
+            upload_tail_chunk(
+                hdfs, local_path, chunk, job.checkpoint, hdfs_pre_output, args, job.run_id, metrics
             )
-    except subprocess.CalledProcessError as e:
-        log(f"Error during local preprocessing: {e}")
-        if json_temp_path.exists():
-            json_temp_path.unlink()
-        raise CommandError(f"Local preprocessing failed for {local_path}")
-
-    # 2. Upload JSON to HDFS (this becomes the 'preprocessing' output)
-    # We upload directly to the preprocessing output directory
-    log(f"Uploading processed JSON to {hdfs_pre_output}")
-    ensure_hdfs_directory(hdfs_pre_output)
-    run_command(["hadoop", "fs", "-put", "-f", str(json_temp_path), hdfs_pre_output])
-    
-    # Clean up local JSON
-    json_temp_path.unlink()
-
-    # 3. Run Analysis Jobs (HDFS JSON -> HDFS Results)
-    traffic_script = PROJECT_ROOT / "scripts" / "run_traffic_volume.sh"
-    conversation_script = PROJECT_ROOT / "scripts" / "run_conversation_analysis.sh"
-
-    # Note: These scripts expect an input directory containing part-* files or similar.
-    # Our upload created a single file in hdfs_pre_output. This works fine for Hadoop inputs.
-    
-    run_command(
-        [str(traffic_script), hdfs_pre_output, hdfs_traffic_output]
-    )
-    run_command(
-        [str(conversation_script), hdfs_pre_output, hdfs_conversation_output]
+            store.save_checkpoint(state_key, job.run_id, job.paths, job.checkpoint)
+
+    suffix = compression.SUFFIXES[args.preprocessing_compression]
+    hdfs_file = f"{hdfs_pre_output}/{local_path.stem}.json{suffix}"
+
+    log(f"Streaming preprocessing output for {local_path} to {hdfs_file}")
+    ensure_hdfs_directory(hdfs, hdfs_pre_output)
+    # Tag records with their run id only when analysis jobs are batched, so
+    # unbatched outputs keep their original format.
+    index_state = mapper_state_dir(args, job.run_id) / "index.json"
+    started = time.monotonic()
+    records, uploaded = stream_preprocessing_to_hdfs(
+        hdfs,
+        job.data if job.data is not None else local_path,
+        hdfs_file,
+        args.preprocessing_compression,
+        run_id=job.run_id if args.batch_size > 1 else None,
+        dedup_state=args.dedup_state if args.dedup_window else None,
+        index_state=index_state,
     )
+    metrics.observe_preprocessing(records, job.size, uploaded, time.monotonic() - started)
+    upload_run_index(hdfs, job, index_state, args)
+    shutil.rmtree(index_state.parent, ignore_errors=True)
 
-    if args.archive_dir:
+
+def tail_capture(
+    local_path: Path,
+    args: argparse.Namespace,
+    store: StateStore,
+    hdfs: HdfsClient,
+    metrics: WatcherMetrics,
+) -> bool:
+    """Preprocess records appended to a growing capture since its checkpoint.
+
+    The byte offset, packet count and chunk number are checkpointed in the
+    state file after every uploaded chunk, so a restarted watcher resumes
+    where it left off instead of decoding the capture from the start.
+    Returns True when a chunk was processed.
+    """
+    state_key = str(local_path.resolve())
+    try:
+        size = local_path.stat().st_size
+    except FileNotFoundError:
+        return False
+    entry = tail_checkpoint(store, local_path, size)
+    if entry is not None:
+        run_id = str(entry["run_id"])
+        checkpoint: Dict[str, int] = dict(entry["tail"])  # type: ignore[arg-type]
+    else:
+        run_id = new_run_id(local_path)
+        checkpoint = new_checkpoint()
+    paths = capture_paths(run_id, args)
+
+    try:
+        chunk = read_appended_records(local_path, checkpoint["offset"], args.tail_chunk_bytes)
+    except (OSError, PcapFormatError) as exc:
+        log(f"Warning: cannot tail {local_path.name}: {exc}")
+        return False
+    if chunk is None:
+        return False
+
+    log(f"Tailing {local_path.name}: {chunk.packets} new packets from byte {chunk.start_offset}")
+    try:
+        if checkpoint["chunks"] == 0:
+            ensure_hdfs_directory(hdfs, paths["hdfs_preprocessing"])
+        upload_tail_chunk(
+            hdfs, local_path, chunk, checkpoint, paths["hdfs_preprocessing"], args, run_id, metrics
+        )
+    except (CommandError, HdfsError) as exc:
+        log(f"ERROR tailing {local_path.name}: {exc}")
+        return False
+    store.save_checkpoint(state_key, run_id, paths, checkpoint)
+    return True
+
+
+def run_analysis_job(job: CaptureJob, kind: str) -> None:
+    """Stages 2/3: traffic volume or conversation analysis for one capture."""
+    script_name, output_key, _ = ANALYSIS_JOBS[kind]
+    if kind in job.completed_stages:
+        log(f"{kind} output for {job.local_path.name} already in {job.paths[output_key]}; skipping.")
+        return
+    script = PROJECT_ROOT / "scripts" / script_name
+    run_command([str(script), job.paths["hdfs_preprocessing"], job.paths[output_key]])
+
+
+def split_batch_output(
+    hdfs: HdfsClient,
+    batch_output: str,
+    jobs: List[CaptureJob],
+    output_key: str,
+) -> None:
+    """Split a batched job's run_id-tagged output into per-capture directories.
+
+    Every output line starts with "<run_id>|"; the tag is stripped so each
+    capture ends up with exactly the same format as an unbatched run, and
+    compressed with the same codec as the batch output.
+    """
+    spools = {
+        job.run_id: tempfile.SpooledTemporaryFile(max_size=SPLIT_SPOOL_LIMIT) for job in jobs
+    }
+    codec = "none"
+    try:
+        for entry in hdfs.listdir(batch_output):
+            name = str(entry.get("pathSuffix", ""))
+            if not name.startswith("part-"):
+                continue
+            codec = compression.codec_for_name(name)
+            chunks = compression.decompress_chunks(hdfs.cat(f"{batch_output}/{name}"), codec)
+            for line in iter_lines(chunks):
+                run_id, sep, rest = line.partition(RUN_ID_SEP)
+                spool = spools.get(run_id.decode()) if sep else None
+                if spool is None:
+                    log(f"Warning: untagged line in {batch_output}/{name}: {line[:80]!r}")
+                    continue
+                spool.write(rest)
+
+        for job in jobs:
+            output_dir = job.paths[output_key]
+            spool = spools[job.run_id]
+            spool.seek(0)
+            hdfs.rm(output_dir, recursive=True)
+            hdfs.mkdir(output_dir)
+            hdfs.put_stream(
+                compression.compress_chunks(iter_chunks(spool, STREAM_CHUNK_SIZE), codec),
+                f"{output_dir}/part-00000{compression.SUFFIXES[codec]}",
+            )
+            hdfs.put_stream([b""], f"{output_dir}/_SUCCESS")
+    finally:
+        for spool in spools.values():
+            spool.close()
+    hdfs.rm(batch_output, recursive=True)
+
+
+def run_analysis_batch(
+    jobs: List[CaptureJob],
+    kind: str,
+    args: argparse.Namespace,
+    hdfs: HdfsClient,
+) -> None:
+    """Run one analysis job over several captures and split the results.
+
+    The preprocessing outputs of all captures are passed as a comma-separated
+    input list. Records carry their run_id (see RUN_ID in
+    preprocessing/mapper.py), which the analysis mappers prefix to every key,
+    so even a batch of one has to go through the split step.
+    """
+    script_name, output_key, base_attr = ANALYSIS_JOBS[kind]
+    jobs = [job for job in jobs if kind not in job.completed_stages]
+    if not jobs:
+        return
+    script = PROJECT_ROOT / "scripts" / script_name
+    base = getattr(args, base_attr).rstrip("/")
+    batch_output = f"{base}/_batch_{jobs[0].run_id}_n{len(jobs)}"
+    inputs = ",".join(job.paths["hdfs_preprocessing"] for job in jobs)
+
+    log(f"Submitting batched {kind} job for {len(jobs)} captures -> {batch_output}")
+    run_command([str(script), inputs, batch_output])
+    split_batch_output(hdfs, batch_output, jobs, output_key)
+
+
+def finalize_capture(
+    job: CaptureJob,
+    args: argparse.Namespace,
+    store: StateStore,
+    metrics: WatcherMetrics,
+    hdfs: HdfsClient,
+    results: Optional[ResultStore] = None,
+) -> None:
+    """Archive the capture, load its results and record it as processed.
+
+    Called by the pipeline in submission order, one capture at a time. Failed
+    captures are recorded with their failed stage; the next attempt reuses
+    the run id and skips the stages that completed.
+    """
+    local_path = job.local_path
+    state_key = job.state_key
+    metrics.observe_capture(job, PIPELINE_STAGES)
+    if job.error is not None:
+        if isinstance(job.error, CommandError):
+            log(f"ERROR: {job.error}")
+        else:
+            log(f"ERROR processing {local_path.name} ({job.failed_stage}): {job.error}")
+        store.mark_failed(state_key, job.run_id, job.failed_stage, str(job.error))
+        return
+
+    if args.archive_dir and job.data is None:
         archived_path = move_to_archive(local_path, args.archive_dir)
         log(f"Archived local PCAP to {archived_path}")
 
-    file_stat = local_path.stat()
-    state[str(local_path.resolve())] = {
-        "size": file_stat.st_size,
-        "mtime": file_stat.st_mtime,
-        "processed_at": time.time(),
-        "run_id": run_id,
-        "hdfs_input": hdfs_input_dir,
-        "hdfs_preprocessing": hdfs_pre_output,
-        "hdfs_traffic": hdfs_traffic_output,
-        "hdfs_conversation": hdfs_conversation_output,
-    }
-    log(f"Processing for {local_path.name} complete (run id: {run_id}).")
+    if results is not None:
+        try:
+            hosts, conversations = ingest_from_hdfs(
+                results, hdfs, job.run_id, job.paths, capture=local_path.name
+            )
+            log(f"Loaded {hosts} hosts and {conversations} conversations into the result store.")
+        except (HdfsError, sqlite3.Error) as exc:
+            # The outputs stay in HDFS; "result_store.py ingest --from-state" picks them up later.
+            log(f"Warning: could not load results of {job.run_id} into the result store: {exc}")
+
+    store.mark_processed(
+        state_key,
+        job.run_id,
+        job.size,
+        job.mtime,
+        job.paths,
+        packets=job.checkpoint["packets"] if job.checkpoint is not None else None,
+    )
+    log(f"Processing for {local_path.name} complete (run id: {job.run_id}).")
+
+
+def record_stage(store: StateStore, stage: str, func: Callable) -> Callable:
+    """Wrap a stage function so its successful completion is persisted."""
+
+    def run(job_or_jobs):
+        func(job_or_jobs)
+        jobs = job_or_jobs if isinstance(job_or_jobs, list) else [job_or_jobs]
+        for job in jobs:
+            store.mark_stage(job.state_key, job.run_id, stage)
+
+    return run
+
+
+def build_pipeline(
+    args: argparse.Namespace,
+    store: StateStore,
+    hdfs: HdfsClient,
+    metrics: WatcherMetrics,
+    results: Optional[ResultStore] = None,
+) -> CapturePipeline:
+    stages = [
+        Stage(
+            "preprocess",
+            record_stage(
+                store, "preprocess", lambda job: preprocess_capture(job, args, hdfs, store, metrics)
+            ),
+            args.preprocess_workers,
+        ),
+    ]
+    for kind in ANALYSIS_JOBS:
+        if args.batch_size > 1:
+            stages.append(
+                Stage(
+                    kind,
+                    record_stage(
+                        store, kind, lambda jobs, kind=kind: run_analysis_batch(jobs, kind, args, hdfs)
+                    ),
+                    args.analysis_workers,
+                    batch_size=args.batch_size,
+                    max_wait=args.batch_max_wait,
+                )
+            )
+        else:
+            stages.append(
+                Stage(
+                    kind,
+                    record_stage(store, kind, lambda job, kind=kind: run_analysis_job(job, kind)),
+                    args.analysis_workers,
+                )
+            )
+    return CapturePipeline(
+        stages,
+        queue_depth=args.queue_depth,
+        on_complete=lambda job: finalize_capture(job, args, store, metrics, hdfs, results),
+    )
+
+
+def register_watcher_gauges(
+    metrics: WatcherMetrics,
+    local_dir: Optional[Path],
+    store: StateStore,
+    pipeline: CapturePipeline,
+) -> None:
+    """Expose queue depth, in-flight work and the unprocessed backlog.
+
+    The backlog is computed when metrics are read, so a growing number of
+    waiting captures (or an ageing oldest capture) is visible before a
+    capture ring buffer overwrites files that were never processed. Stream
+    ingestion has no directory and therefore no backlog gauges.
+
+    Both backlog gauges need the same full directory scan, so its result is
+    kept for BACKLOG_CACHE_SECONDS; gauges are only read by
+    WatcherMetrics.render(), under the registry lock.
+    """
+    last_scan: List[Tuple[float, Tuple[int, float]]] = []
+
+    def backlog() -> Tuple[int, float]:
+        now = time.monotonic()
+        if not last_scan or now - last_scan[0][0] >= BACKLOG_CACHE_SECONDS:
+            last_scan[:] = [(now, scan_backlog())]
+        return last_scan[0][1]
+
+    def scan_backlog() -> Tuple[int, float]:
+        assert local_dir is not None
+        now = time.time()
+        count, oldest = 0, 0.0
+        for pcap_path in find_unprocessed(local_dir, store):
+            if pipeline.is_in_flight(pcap_path):
+                continue
+            try:
+                age = now - pcap_path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            count += 1
+            oldest = max(oldest, age)
+        return count, oldest
+
+    metrics.add_gauge(
+        "queue_depth",
+        "Captures waiting in front of each stage.",
+        lambda: {(name,): float(depth) for name, depth in pipeline.queue_depths().items()},
+        ("stage",),
+    )
+    metrics.add_gauge(
+        "in_flight_captures",
+        "Captures queued or running in the pipeline.",
+        lambda: {(): float(pipeline.in_flight_count())},
+    )
+    if local_dir is None:
+        return
+    metrics.add_gauge(
+        "backlog_captures",
+        "Completed-or-growing captures in the watched directory not yet queued.",
+        lambda: {(): float(backlog()[0])},
+    )
+    metrics.add_gauge(
+        "backlog_oldest_age_seconds",
+        "Age (by mtime) of the oldest capture in the backlog.",
+        lambda: {(): backlog()[1]},
+    )
+
+
+def submit_capture(
+    pcap_path: Path,
+    args: argparse.Namespace,
+    store: StateStore,
+    pipeline: CapturePipeline,
+) -> bool:
+    """Queue a capture for processing; blocks while the pipeline is full."""
+    try:
+        job = prepare_capture(pcap_path, args, store)
+    except FileNotFoundError:
+        log(f"Skipping {pcap_path.name} (file disappeared).")
+        return False
+    if job.completed_stages:
+        log(
+            f"Resuming {pcap_path.name} (run id: {job.run_id}); "
+            f"completed stages: {', '.join(sorted(job.completed_stages))}."
+        )
+    else:
+        log(f"Queueing {pcap_path.name} (run id: {job.run_id}).")
+    store.start_run(
+        str(pcap_path.resolve()), job.run_id, job.size, job.mtime, job.paths, job.checkpoint
+    )
+    pipeline.submit(job)
+    return True
+
+
+def process_backlog_once(
+    local_dir: Path,
+    args: argparse.Namespace,
+    store: StateStore,
+    pipeline: CapturePipeline,
+) -> None:
+    processed_any = False
+    for pcap_path in find_unprocessed(local_dir, store):
+        log(f"Detected new or updated PCAP: {pcap_path.name}")
+        if not file_is_stable(pcap_path, args.stability_checks, args.stability_interval):
+            log(f"Skipping {pcap_path.name} (file still growing).")
+            continue
+        processed_any = submit_capture(pcap_path, args, store, pipeline) or processed_any
+    pipeline.drain()
+
+    if not processed_any:
+        log("No new PCAP files detected.")
+
+
+def open_directory_events(
+    local_dir: Path, mode: str, track_created: bool = False
+) -> Optional[DirectoryEvents]:
+    if mode == "poll":
+        return None
+    try:
+        return DirectoryEvents(local_dir, track_created=track_created)
+    except InotifyUnavailable as exc:
+        if mode == "inotify":
+            raise
+        log(f"inotify unavailable ({exc}); falling back to polling every scan interval.")
+        return None
+
+
+def watch_forever(
+    local_dir: Path,
+    args: argparse.Namespace,
+    store: StateStore,
+    pipeline: CapturePipeline,
+    hdfs: HdfsClient,
+    metrics: WatcherMetrics,
+) -> None:
+    """Continuously process captures as they are completed.
+
+    Candidates found by a directory scan (at startup, every --interval in
+    both watch modes, or after an inotify queue overflow) go through the
+    non-blocking stability tracker.
+    Files reported by IN_CLOSE_WRITE / IN_MOVED_TO are complete by definition
+    and are processed immediately. With --tail, files that are still growing
+    are tailed every --tail-interval seconds while they wait.
+    """
+    events = open_directory_events(local_dir, args.watch_mode, track_created=args.tail)
+    if events is not None:
+        log("Using inotify close-write/moved-to events.")
+
+    tracker = StabilityTracker(args.stability_checks, args.stability_interval)
+    pending: Dict[Path, None] = dict.fromkeys(find_unprocessed(local_dir, store))
+    next_scan = time.monotonic() + args.interval
+    next_tail: Dict[Path, float] = {}
+
+    try:
+        while True:
+            ready: List[Path] = []
+            for pcap_path in list(pending):
+                stable = tracker.observe(pcap_path)
+                if stable is None:
+                    del pending[pcap_path]
+                    next_tail.pop(pcap_path, None)
+                elif stable:
+                    del pending[pcap_path]
+                    next_tail.pop(pcap_path, None)
+                    ready.append(pcap_path)
+                elif args.tail and not pipeline.is_in_flight(pcap_path):
+                    now = time.monotonic()
+                    if now >= next_tail.get(pcap_path, 0.0):
+                        tail_capture(pcap_path, args, store, hdfs, metrics)
+                        next_tail[pcap_path] = now + args.tail_interval
+
+            timeout = max(0.0, next_scan - time.monotonic())
+            if pending:
+                timeout = min(timeout, args.stability_interval)
+
+            if events is not None:
+                completed = events.wait(0 if ready else timeout)
+                for pcap_path in completed:
+                    pending.pop(pcap_path, None)
+                    next_tail.pop(pcap_path, None)
+                    tracker.forget(pcap_path)
+                    if pcap_path not in ready:
+                        ready.append(pcap_path)
+                if events.created:
+                    pending.update(dict.fromkeys(p for p in events.created if p not in ready))
+                    events.created.clear()
+                if events.overflowed:
+                    log("inotify event queue overflowed; rescanning directory.")
+                    events.overflowed = False
+                    pending.update(dict.fromkeys(find_unprocessed(local_dir, store)))
+            elif not ready:
+                time.sleep(timeout)
+
+            # Rescan in both modes, so captures whose processing failed (and
+            # any event inotify missed) are retried every --interval.
+            if time.monotonic() >= next_scan:
+                pending.update(dict.fromkeys(find_unprocessed(local_dir, store)))
+                next_scan = time.monotonic() + args.interval
+
+            for pcap_path in ready:
+                if pipeline.is_in_flight(pcap_path) or is_already_processed(pcap_path, store):
+                    continue
+                log(f"Detected new or updated PCAP: {pcap_path.name}")
+                submit_capture(pcap_path, args, store, pipeline)
+    finally:
+        if events is not None:
+            events.close()
+
+
+def window_job(window: PcapWindow, args: argparse.Namespace) -> CaptureJob:
+    """A pipeline job for one window of a capture stream, decoded from memory.
+
+    ``local_path`` only names the window; there is no file behind it, so the
+    window is keyed in the state store as ``stream:<source>:<run id>``, which
+    cannot collide with a capture file and does not depend on the working
+    directory.
+    """
+    local_path = Path(f"{args.stream_name}-{window.index:06d}.pcap")
+    run_id = new_run_id(local_path)
+    source = args.stream_command or str(args.stream)
+    return CaptureJob(
+        local_path=local_path,
+        run_id=run_id,
+        size=len(window.data),
+        mtime=time.time(),
+        paths=capture_paths(run_id, args),
+        data=window.data,
+        state_key=f"stream:{source}:{run_id}",
+    )
+
+
+def open_stream(args: argparse.Namespace) -> Tuple[BinaryIO, Optional[subprocess.Popen]]:
+    """The capture stream: a started --stream-command, stdin, or a pipe/FIFO/file."""
+    if args.stream_command:
+        log(f"Starting capture: {args.stream_command}")
+        proc = subprocess.Popen(shlex.split(args.stream_command), stdout=subprocess.PIPE)
+        assert proc.stdout is not None
+        return proc.stdout, proc
+    if str(args.stream) == "-":
+        return sys.stdin.buffer, None
+    return open(args.stream, "rb"), None
+
+
+def ingest_stream(
+    args: argparse.Namespace,
+    store: StateStore,
+    pipeline: CapturePipeline,
+) -> None:
+    """Cut a live capture stream into windows and process each as it closes.
+
+    Windows are queued as soon as they close; when the pipeline is full,
+    submit() blocks and the stream is not read until a slot frees up, so the
+    capture tool's pipe buffer (and then the tool itself) absorbs the
+    backpressure. Windows only exist in memory: a window whose processing
+    fails is recorded as failed and is not retried.
+    """
+    handle, proc = open_stream(args)
+    window_bytes = int(args.window_mb * 1024 * 1024)
+    try:
+        for window in iter_windows(handle, args.window_seconds, window_bytes):
+            job = window_job(window, args)
+            span = (
+                f", {window.last_timestamp - window.first_timestamp:.1f}s of packets"
+                if window.first_timestamp is not None and window.last_timestamp is not None
+                else ""
+            )
+            log(
+                f"Queueing stream window {window.index} ({window.packets} packets, "
+                f"{len(window.data)} bytes{span}; run id: {job.run_id})."
+            )
+            store.start_run(job.state_key, job.run_id, job.size, job.mtime, job.paths)
+            pipeline.submit(job)
+        pipeline.drain()
+    finally:
+        if proc is not None:
+            if proc.poll() is None:
+                proc.terminate()
+            rc = proc.wait()
+            if rc not in (0, -15):
+                log(f"Warning: capture command exited with status {rc}")
+        elif handle is not sys.stdin.buffer:
+            handle.close()
+    log("End of capture stream.")
 
 
 def main(argv: Optional[list[str]] = None) -> int:
@@ -234,15 +1166,15 @@ def main(argv: Optional[list[str]] = None) -> int:
     )
     parser.add_argument(
         "--local-dir",
-        required=True,
         type=Path,
-        help="Directory where Wireshark writes PCAP files.",
+        help="Directory where Wireshark writes PCAP files (not used with --stream).",
     )
     parser.add_argument(
         "--interval",
         type=float,
         default=30.0,
-        help="Polling interval (seconds) between directory scans.",
+        help="Seconds between directory scans; with inotify, the periodic rescan that "
+        "retries failed captures and catches missed events.",
     )
     parser.add_argument(
         "--stability-checks",
@@ -256,6 +1188,71 @@ def main(argv: Optional[list[str]] = None) -> int:
         default=3.0,
         help="Seconds to wait between stability checks.",
     )
+    parser.add_argument(
+        "--watch-mode",
+        choices=("auto", "inotify", "poll"),
+        default="auto",
+        help="How new captures are detected: inotify events, directory polling, "
+        "or auto (inotify when available, otherwise polling).",
+    )
+    parser.add_argument(
+        "--tail",
+        action="store_true",
+        help="Preprocess captures incrementally while they are still being written, "
+        "checkpointing the byte offset in the state file.",
+    )
+    parser.add_argument(
+        "--tail-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between incremental chunks of a growing capture (with --tail).",
+    )
+    parser.add_argument(
+        "--tail-chunk-bytes",
+        type=int,
+        default=64 * 1024 * 1024,
+        help="Maximum capture bytes decoded per incremental chunk.",
+    )
+    parser.add_argument(
+        "--checkpoint-bytes",
+        type=int,
+        default=256 * 1024 * 1024,
+        help="Preprocess captures larger than this in committed chunks of this many bytes, "
+        "checkpointing after each one so an interrupted capture resumes from its last "
+        "chunk (0 decodes every capture in one go).",
+    )
+    parser.add_argument(
+        "--preprocess-workers",
+        type=int,
+        default=1,
+        help="Captures decoded and uploaded concurrently (local CPU/disk bound).",
+    )
+    parser.add_argument(
+        "--analysis-workers",
+        type=int,
+        default=1,
+        help="Concurrent submissions for each of the traffic and conversation jobs.",
+    )
+    parser.add_argument(
+        "--queue-depth",
+        type=int,
+        default=2,
+        help="Captures allowed to wait between pipeline stages before new "
+        "captures are held back (bounds in-flight work).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Combine up to this many captures into one traffic/conversation job "
+        "submission; results are split back into per-capture directories.",
+    )
+    parser.add_argument(
+        "--batch-max-wait",
+        type=float,
+        default=30.0,
+        help="Maximum seconds to wait for a batch to fill before submitting it.",
+    )
     parser.add_argument(
         "--hdfs-input-base",
         default="/input/pcap/live",
@@ -276,6 +1273,98 @@ def main(argv: Optional[list[str]] = None) -> int:
         default="/output/conversation_analysis/live",
         help="Base HDFS directory for conversation analysis outputs.",
     )
+    parser.add_argument(
+        "--preprocessing-compression",
+        choices=sorted(compression.SUFFIXES),
+        default="none",
+        help="Compress preprocessing JSON on the fly while streaming it to HDFS "
+        "(bzip2 files stay splittable for the analysis jobs; gzip is faster).",
+    )
+    parser.add_argument(
+        "--index-error-rate",
+        type=float,
+        default=run_index.DEFAULT_ERROR_RATE,
+        help="False positive rate of the address and port Bloom filters in each run's "
+        f"{run_index.INDEX_NAME} sidecar (see scripts/plan_runs.py).",
+    )
+    parser.add_argument(
+        "--output-compression",
+        choices=sorted(compression.SUFFIXES),
+        help="Compress the traffic volume and conversation analysis results "
+        "(default: the run scripts' OUTPUT_COMPRESSION, none).",
+    )
+    parser.add_argument(
+        "--map-output-codec",
+        help="Hadoop codec for the analysis jobs' map output (shuffle), e.g. lz4, snappy "
+        "or none (default: the run scripts' default, lz4).",
+    )
+    parser.add_argument(
+        "--dedup-window",
+        type=float,
+        default=0.0,
+        help="Drop packets already seen in another capture (e.g. from a second tap) "
+        "whose timestamps differ by at most this many seconds (0 disables).",
+    )
+    parser.add_argument(
+        "--dedup-retention",
+        type=float,
+        default=300.0,
+        help="Seconds of packet time the duplicate filter remembers across captures "
+        "(at least the time span of overlapping captures).",
+    )
+    parser.add_argument(
+        "--dedup-capacity",
+        type=int,
+        default=50000,
+        help="Expected packets per --dedup-window; sizes each filter partition "
+        "(about 1.8 bytes per packet at a 0.1%% false positive rate).",
+    )
+    parser.add_argument(
+        "--dedup-state",
+        type=Path,
+        default=DEFAULT_DEDUP_STATE,
+        help=f"Duplicate filter shared by all captures and kept across runs (default: "
+        f"{DEFAULT_DEDUP_STATE}). Packets of a capture decoded before are all in it, so "
+        "reprocessing or replaying a capture within --dedup-retention needs a fresh state "
+        "file (a new path, or delete this one); otherwise nearly every packet is dropped.",
+    )
+    parser.add_argument(
+        "--sample-rate",
+        type=float,
+        default=1.0,
+        help="Keep this fraction of flows (whole flows, chosen by hashing the 5-tuple); "
+        "traffic totals are scaled back up with 95%% confidence intervals. With "
+        "--sample-target-pps this is the highest rate used (default: 1, no sampling).",
+    )
+    parser.add_argument(
+        "--sample-target-pps",
+        type=float,
+        default=0.0,
+        help="Adapt the flow sampling rate to keep about this many packets per second "
+        "of capture time, capping the preprocessing cost of each capture (0 disables).",
+    )
+    parser.add_argument(
+        "--webhdfs-url",
+        help="WebHDFS endpoint (e.g. http://namenode:9870). When set, HDFS operations "
+        "use pooled HTTP connections instead of spawning 'hadoop fs' per call.",
+    )
+    parser.add_argument(
+        "--webhdfs-user",
+        default=os.environ.get("HADOOP_USER_NAME"),
+        help="user.name for WebHDFS simple authentication (default: $HADOOP_USER_NAME).",
+    )
+    parser.add_argument(
+        "--hdfs-retries",
+        type=int,
+        default=3,
+        help="Retries for failed WebHDFS requests (streaming uploads are not retried).",
+    )
+    parser.add_argument(
+        "--hadoop-bin",
+        default="hadoop",
+        help="Hadoop CLI used for HDFS operations when --webhdfs-url is not set "
+        "(a local stand-in can be used for testing).",
+    )
     parser.add_argument(
         "--archive-dir",
         type=Path,
@@ -285,7 +1374,36 @@ def main(argv: Optional[list[str]] = None) -> int:
         "--state-file",
         type=Path,
         default=DEFAULT_STATE_FILE,
-        help=f"Path to the JSON file storing processed-file metadata (default: {DEFAULT_STATE_FILE}).",
+        help=f"SQLite database storing processed-file metadata (default: {DEFAULT_STATE_FILE}). "
+        "A legacy .json state file is imported on first use.",
+    )
+    parser.add_argument(
+        "--result-store",
+        type=Path,
+        help="SQLite result store (see scripts/result_store.py) that the traffic and "
+        "conversation results of every processed capture are loaded into.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve per-stage metrics in the Prometheus text format on this port.",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="Address the metrics endpoint binds to (default: localhost only).",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        help="Periodically write the metrics to this file (e.g. for the node_exporter "
+        "textfile collector).",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=15.0,
+        help="Seconds between metrics file updates.",
     )
     parser.add_argument(
         "--once",
@@ -293,63 +1411,120 @@ def main(argv: Optional[list[str]] = None) -> int:
         help="Process any currently unhandled PCAPs and exit (no continuous watching).",
     )
 
+    parser.add_argument(
+        "--stream",
+        help="Read a live pcap/pcapng stream from this pipe, FIFO or file ('-' for stdin), "
+        "e.g. 'dumpcap -i eth0 -w - | ... --stream -', instead of watching a directory.",
+    )
+    parser.add_argument(
+        "--stream-command",
+        help="Start this capture command and read its stdout as the stream "
+        "(e.g. \"dumpcap -i eth0 -w -\").",
+    )
+    parser.add_argument(
+        "--stream-name",
+        default="stream",
+        help="Name of the stream; windows get run ids like <name>-000042_<timestamp>.",
+    )
+    parser.add_argument(
+        "--window-seconds",
+        type=float,
+        default=5.0,
+        help="Close a stream window after this many seconds of packet time or of "
+        "wall-clock time since its first packet (default: 5).",
+    )
+    parser.add_argument(
+        "--window-mb",
+        type=float,
+        default=64.0,
+        help="Close a stream window once it holds this many MB of capture data (default: 64).",
+    )
+
     args = parser.parse_args(argv)
-    local_dir: Path = args.local_dir.expanduser().resolve()
-    if not local_dir.exists():
-        parser.error(f"Local directory does not exist: {local_dir}")
+    streaming = bool(args.stream or args.stream_command)
+    if args.stream and args.stream_command:
+        parser.error("--stream and --stream-command are mutually exclusive")
+    local_dir: Optional[Path] = None
+    if streaming:
+        if args.tail or args.once:
+            parser.error("--tail and --once do not apply to --stream/--stream-command")
+        if args.window_seconds <= 0 and args.window_mb <= 0:
+            parser.error("--window-seconds or --window-mb must be positive")
+    elif args.local_dir is None:
+        parser.error("--local-dir is required unless --stream or --stream-command is given")
+    else:
+        local_dir = args.local_dir.expanduser().resolve()
+        if not local_dir.exists():
+            parser.error(f"Local directory does not exist: {local_dir}")
 
     if args.archive_dir:
         args.archive_dir = args.archive_dir.expanduser().resolve()
 
     args.state_file = args.state_file.expanduser().resolve()
-    state = load_state(args.state_file)
+    if args.dedup_window > 0:
+        args.dedup_state = args.dedup_state.expanduser().resolve()
+        args.dedup_state.parent.mkdir(parents=True, exist_ok=True)
+        # Picked up by every preprocessing mapper the watcher starts.
+        os.environ["DEDUP_WINDOW"] = str(args.dedup_window)
+        os.environ["DEDUP_RETENTION"] = str(args.dedup_retention)
+        os.environ["DEDUP_CAPACITY"] = str(args.dedup_capacity)
+        if args.preprocess_workers > 1:
+            # Captures decoded concurrently could not see each other's packets.
+            log("Deduplication enabled: decoding one capture at a time (--preprocess-workers 1).")
+            args.preprocess_workers = 1
+    if not 0.0 < args.sample_rate <= 1.0:
+        parser.error("--sample-rate must be in (0, 1]")
+    if args.sample_rate < 1.0 or args.sample_target_pps > 0:
+        os.environ["SAMPLE_RATE"] = str(args.sample_rate)
+        if args.sample_target_pps > 0:
+            os.environ["SAMPLE_TARGET_PPS"] = str(args.sample_target_pps)
+    # Picked up by the analysis run scripts (see the README's Compressed Outputs).
+    if args.output_compression:
+        os.environ["OUTPUT_COMPRESSION"] = args.output_compression
+    if args.map_output_codec:
+        os.environ["MAP_OUTPUT_CODEC"] = args.map_output_codec
+    store = open_state_store(args.state_file)
 
-    log(f"Starting PCAP watcher in {local_dir}")
-    log(f"Polling interval: {args.interval}s, stability checks: {args.stability_checks}")
+    if local_dir is not None:
+        log(f"Starting PCAP watcher in {local_dir}")
+        log(
+            f"Watch mode: {args.watch_mode}, polling interval: {args.interval}s, "
+            f"stability checks: {args.stability_checks}"
+        )
+    else:
+        log(
+            f"Starting stream ingestion from {args.stream_command or args.stream} "
+            f"(windows of {args.window_seconds}s / {args.window_mb} MB)"
+        )
 
+    hdfs = make_hdfs_client(args)
+    metrics = WatcherMetrics()
+    results = (
+        ResultStore(args.result_store.expanduser().resolve()) if args.result_store is not None else None
+    )
+    pipeline = build_pipeline(args, store, hdfs, metrics, results)
+    register_watcher_gauges(metrics, local_dir, store, pipeline)
+    exporters = start_exporters(
+        metrics, args.metrics_port, args.metrics_host, args.metrics_file, args.metrics_interval
+    )
+    if args.metrics_port is not None:
+        log(f"Serving metrics on http://{args.metrics_host}:{args.metrics_port}/metrics")
     try:
-        while True:
-            processed_any = False
-            for pcap_path in sorted(local_dir.glob("*.pcap")):
-                if not pcap_path.is_file():
-                    continue
-                resolved = str(pcap_path.resolve())
-                stat_result = pcap_path.stat()
-                prev = state.get(resolved)
-                already_processed = (
-                    prev
-                    and prev.get("size") == stat_result.st_size
-                    and prev.get("mtime") == stat_result.st_mtime
-                )
-                if already_processed:
-                    continue
-
-                log(f"Detected new or updated PCAP: {pcap_path.name}")
-                if not file_is_stable(
-                    pcap_path, args.stability_checks, args.stability_interval
-                ):
-                    log(f"Skipping {pcap_path.name} (file still growing).")
-                    continue
-
-                try:
-                    process_capture(pcap_path, args, state)
-                    save_state(args.state_file, state)
-                    processed_any = True
-                except CommandError as exc:
-                    log(f"ERROR: {exc}")
-                except Exception as exc:
-                    log(f"ERROR processing {pcap_path.name}: {exc}")
-
-            if args.once:
-                if not processed_any:
-                    log("No new PCAP files detected.")
-                break
-
-            time.sleep(args.interval)
-
+        if local_dir is None:
+            ingest_stream(args, store, pipeline)
+        elif args.once:
+            process_backlog_once(local_dir, args, store, pipeline)
+        else:
+            watch_forever(local_dir, args, store, pipeline, hdfs, metrics)
     except KeyboardInterrupt:
         log("Stopping watcher (Ctrl+C).")
         return 0
+    finally:
+        for exporter in exporters:
+            exporter.close()  # type: ignore[attr-defined]
+        store.close()
+        if results is not None:
+            results.close()
 
     log("Watcher finished.")
     return 0
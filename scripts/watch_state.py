@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed state store for the PCAP watcher.
+
+Every capture the watcher has seen is one row keyed by its resolved path and
+indexed by (path, size, mtime), so "was this file already processed?" is an
+index lookup and recording a capture is a single-row upsert instead of a
+rewrite of the whole state file. The database runs in WAL mode, so a crash
+never leaves a half-written state behind.
+
+Besides finished captures the store keeps:
+  - in-progress runs, with the status of each pipeline stage, so a restarted
+    watcher can reuse the run id and skip stages that already completed;
+  - tail checkpoints of captures that are still being written (--tail).
+
+A legacy JSON state file found next to the database is imported on first use.
+The file is left in place; the import is recorded in the database (with the
+file's size and mtime), so it is imported again only if it changes.
+
+The module can also be run directly to inspect or edit the state:
+
+    python3 scripts/watch_state.py --state-file state/pcap_watch_state.db list
+    python3 scripts/watch_state.py --state-file state/pcap_watch_state.db forget /path/to/capture.pcap
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set
+
+STATUS_TAILING = "tailing"
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_FAILED = "failed"
+STATUS_PROCESSED = "processed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    run_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    processed_at REAL,
+    updated_at REAL NOT NULL,
+    paths TEXT NOT NULL DEFAULT '{}',
+    tail TEXT,
+    packets INTEGER,
+    failed_stage TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_identity ON captures (path, size, mtime, status);
+CREATE INDEX IF NOT EXISTS captures_status ON captures (status, updated_at);
+CREATE TABLE IF NOT EXISTS stages (
+    path TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (path, stage)
+);
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    entries INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+
+class StateStore:
+    """Processed-capture records, tail checkpoints and per-stage status.
+
+    One connection is shared by the watcher's main loop and pipeline threads;
+    every public method runs in its own transaction under a lock.
+    """
+
+    def __init__(self, db_path: Path, legacy_json: Optional[Path] = None) -> None:
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        if legacy_json is not None and not self.is_imported(legacy_json):
+            self.import_json(legacy_json)
+
+    # -- queries -------------------------------------------------------------
+
+    def is_processed(self, key: str, size: int, mtime: float) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM captures WHERE path = ? AND size = ? AND mtime = ? AND status = ?",
+                (key, size, mtime, STATUS_PROCESSED),
+            ).fetchone()
+        return row is not None
+
+    def is_imported(self, json_path: Path) -> bool:
+        """Whether ``json_path`` is missing or was imported in its current version."""
+        try:
+            stat = json_path.stat()
+        except OSError:
+            return True
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM imports WHERE path = ? AND size = ? AND mtime = ?",
+                (str(json_path.resolve()), stat.st_size, stat.st_mtime),
+            ).fetchone()
+        return row is not None
+
+    def get(self, key: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM captures WHERE path = ?", (key,)).fetchone()
+        return _row_to_entry(row) if row is not None else None
+
+    def completed_stages(self, key: str, run_id: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage FROM stages WHERE path = ? AND run_id = ? AND status = 'done'",
+                (key, run_id),
+            ).fetchall()
+        return {row["stage"] for row in rows}
+
+    def entries(self, status: Optional[str] = None) -> Iterator[Dict[str, object]]:
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute("SELECT * FROM captures ORDER BY updated_at").fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM captures WHERE status = ? ORDER BY updated_at", (status,)
+                ).fetchall()
+        for row in rows:
+            yield _row_to_entry(row)
+
+    # -- updates -------------------------------------------------------------
+
+    def save_checkpoint(
+        self, key: str, run_id: str, paths: Dict[str, str], checkpoint: Dict[str, int]
+    ) -> None:
+        """Record a tail checkpoint; a capture already queued stays in progress."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO captures (path, run_id, status, updated_at, paths, tail)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    run_id = excluded.run_id,
+                    status = CASE captures.status WHEN ? THEN ? ELSE excluded.status END,
+                    updated_at = excluded.updated_at,
+                    paths = excluded.paths,
+                    tail = excluded.tail
+                """,
+                (
+                    key, run_id, STATUS_TAILING, now, json.dumps(paths), json.dumps(checkpoint),
+                    STATUS_IN_PROGRESS, STATUS_IN_PROGRESS,
+                ),
+            )
+
+    def start_run(
+        self,
+        key: str,
+        run_id: str,
+        size: int,
+        mtime: float,
+        paths: Dict[str, str],
+        checkpoint: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Mark a capture as queued; stage status of any other run is dropped."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO captures
+                    (path, size, mtime, run_id, status, updated_at, paths, tail)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    key, size, mtime, run_id, STATUS_IN_PROGRESS, now, json.dumps(paths),
+                    json.dumps(checkpoint) if checkpoint is not None else None,
+                ),
+            )
+            self._conn.execute("DELETE FROM stages WHERE path = ? AND run_id != ?", (key, run_id))
+
+    def mark_stage(self, key: str, run_id: str, stage: str, status: str = "done") -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages (path, stage, run_id, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, stage, run_id, status, time.time()),
+            )
+
+    def mark_failed(self, key: str, run_id: str, stage: Optional[str], error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE captures SET status = ?, failed_stage = ?, error = ?, updated_at = ? "
+                "WHERE path = ? AND run_id = ?",
+                (STATUS_FAILED, stage, error, time.time(), key, run_id),
+            )
+
+    def mark_processed(
+        self,
+        key: str,
+        run_id: str,
+        size: int,
+        mtime: float,
+        paths: Dict[str, str],
+        packets: Optional[int] = None,
+    ) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO captures
+                    (path, size, mtime, run_id, status, processed_at, updated_at, paths, packets)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, size, mtime, run_id, STATUS_PROCESSED, now, now, json.dumps(paths), packets),
+            )
+            self._conn.execute("DELETE FROM stages WHERE path = ?", (key,))
+
+    def forget(self, key: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            deleted = self._conn.execute("DELETE FROM captures WHERE path = ?", (key,)).rowcount
+            self._conn.execute("DELETE FROM stages WHERE path = ?", (key,))
+        return deleted > 0
+
+    def import_json(self, json_path: Path) -> int:
+        """Import a legacy pcap_watch_state.json and record that it was imported.
+
+        The file itself is not modified (it may be tracked by version control);
+        entries already in the database are kept.
+        """
+        try:
+            stat = json_path.stat()
+            with json_path.open("r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (json.JSONDecodeError, OSError):
+            return 0
+        if not isinstance(data, dict):
+            return 0
+
+        rows = []
+        for key, entry in data.items():
+            if not isinstance(entry, dict) or "run_id" not in entry:
+                continue
+            paths = {name: value for name, value in entry.items() if name.startswith("hdfs_")}
+            processed = "processed_at" in entry
+            updated_at = entry.get("processed_at") or time.time()
+            rows.append((
+                key,
+                entry.get("size"),
+                entry.get("mtime"),
+                entry["run_id"],
+                STATUS_PROCESSED if processed else STATUS_TAILING,
+                entry.get("processed_at"),
+                updated_at,
+                json.dumps(paths),
+                None if processed or "tail" not in entry else json.dumps(entry["tail"]),
+                entry.get("packets"),
+            ))
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO captures
+                    (path, size, mtime, run_id, status, processed_at, updated_at, paths, tail, packets)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO imports (path, size, mtime, entries, imported_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(json_path.resolve()), stat.st_size, stat.st_mtime, len(rows), time.time()),
+            )
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "StateStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _row_to_entry(row: sqlite3.Row) -> Dict[str, object]:
+    entry: Dict[str, object] = {
+        key: row[key]
+        for key in ("path", "size", "mtime", "run_id", "status", "processed_at", "packets",
+                    "failed_stage", "error")
+        if row[key] is not None
+    }
+    entry.update(json.loads(row["paths"]))
+    if row["tail"] is not None:
+        entry["tail"] = json.loads(row["tail"])
+    return entry
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect or edit the PCAP watcher state store.")
+    parser.add_argument("--state-file", type=Path, required=True, help="Watcher state database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="Print state entries as JSON lines.")
+    list_parser.add_argument(
+        "--status",
+        choices=(STATUS_TAILING, STATUS_IN_PROGRESS, STATUS_FAILED, STATUS_PROCESSED),
+        help="Only list entries with this status.",
+    )
+    forget_parser = subparsers.add_parser("forget", help="Drop a capture so it is processed again.")
+    forget_parser.add_argument("capture", type=Path)
+    args = parser.parse_args(argv)
+
+    with StateStore(args.state_file.expanduser().resolve()) as store:
+        if args.command == "list":
+            for entry in store.entries(args.status):
+                print(json.dumps(entry, sort_keys=True))
+        elif args.command == "forget":
+            key = str(args.capture.expanduser().resolve())
+            if not store.forget(key):
+                print(f"No state entry for {key}")
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
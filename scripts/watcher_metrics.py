@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Per-stage metrics for the PCAP watcher in the Prometheus text format.
+
+WatcherMetrics collects stage durations, preprocessing/upload throughput and
+end-to-end latency for every completed capture, plus gauges that are read on
+demand (queue depth per stage, captures in flight, unprocessed backlog and the
+age of its oldest capture). The metrics can be scraped from a small HTTP
+endpoint (MetricsServer) or written periodically to a file (MetricsFileWriter),
+e.g. for the node_exporter textfile collector.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from capture_pipeline import CaptureJob
+
+Labels = Tuple[str, ...]
+
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+RECORD_RATE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+MB_RATE_BUCKETS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500)
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.labelnames = tuple(labelnames)
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.setdefault(labels, [0] * len(self.buckets))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self._sums[labels] = self._sums.get(labels, 0.0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(self._sums[labels])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A gauge whose samples are produced by a callback at render time."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        read: Callable[[], Dict[Labels, float]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.read().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class WatcherMetrics:
+    """Metrics registry for one watcher process."""
+
+    def __init__(self, prefix: str = "pcap_watcher") -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics: List[object] = []
+        self._last_completion = 0.0
+
+        self.captures = self._add(Counter(
+            f"{prefix}_captures_total", "Captures that left the pipeline, by result.", ("result",)
+        ))
+        self.stage_failures = self._add(Counter(
+            f"{prefix}_stage_failures_total", "Captures that failed in each stage.", ("stage",)
+        ))
+        self.stage_duration = self._add(Histogram(
+            f"{prefix}_stage_duration_seconds",
+            "Time each capture spent running in a stage (batched stages report the batch time).",
+            DURATION_BUCKETS,
+            ("stage",),
+        ))
+        self.capture_latency = self._add(Histogram(
+            f"{prefix}_capture_latency_seconds",
+            "Time from queueing a capture to recording it as processed.",
+            DURATION_BUCKETS,
+        ))
+        self.records = self._add(Counter(
+            f"{prefix}_preprocess_records_total", "Packet records written by preprocessing."
+        ))
+        self.input_bytes = self._add(Counter(
+            f"{prefix}_preprocess_input_bytes_total", "Capture bytes decoded by preprocessing."
+        ))
+        self.upload_bytes = self._add(Counter(
+            f"{prefix}_upload_bytes_total", "Preprocessing bytes streamed to HDFS (after compression)."
+        ))
+        self.tail_chunks = self._add(Counter(
+            f"{prefix}_tail_chunks_total", "Incremental chunks preprocessed from growing captures."
+        ))
+        self.record_rate = self._add(Histogram(
+            f"{prefix}_preprocess_records_per_second",
+            "Preprocessing throughput per capture or tail chunk, in records per second.",
+            RECORD_RATE_BUCKETS,
+        ))
+        self.upload_rate = self._add(Histogram(
+            f"{prefix}_upload_megabytes_per_second",
+            "HDFS upload throughput per capture or tail chunk, in MB per second.",
+            MB_RATE_BUCKETS,
+        ))
+        self._add(Gauge(
+            f"{prefix}_last_completion_timestamp_seconds",
+            "Unix time the last capture was recorded as processed.",
+            lambda: {(): self._last_completion},
+        ))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_gauge(
+        self,
+        name: str,
+        help_text: str,
+        read: Callable[[], Dict[Labels, float]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        with self._lock:
+            self._add(Gauge(f"{self.prefix}_{name}", help_text, read, labelnames))
+
+    def observe_preprocessing(self, records: int, input_bytes: int, uploaded: int, seconds: float) -> None:
+        with self._lock:
+            self.records.inc(records)
+            self.input_bytes.inc(input_bytes)
+            self.upload_bytes.inc(uploaded)
+            if seconds > 0:
+                self.record_rate.observe(records / seconds)
+                self.upload_rate.observe(uploaded / seconds / 1e6)
+
+    def observe_tail_chunk(self, records: int, input_bytes: int, uploaded: int, seconds: float) -> None:
+        self.observe_preprocessing(records, input_bytes, uploaded, seconds)
+        with self._lock:
+            self.tail_chunks.inc()
+
+    def observe_capture(self, job: CaptureJob, stages: Sequence[str]) -> None:
+        """Record a capture handed to the pipeline's on_complete callback."""
+        now = time.time()
+        with self._lock:
+            for stage in stages:
+                if stage in job.timings and stage not in job.completed_stages:
+                    self.stage_duration.observe(job.timings[stage], stage)
+            if job.error is not None:
+                self.captures.inc(1, "failed")
+                self.stage_failures.inc(1, job.failed_stage or "unknown")
+                return
+            self.captures.inc(1, "processed")
+            if "submitted" in job.timings:
+                self.capture_latency.observe(now - job.timings["submitted"])
+            self._last_completion = now
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            lines: List[str] = []
+            for metric in metrics:
+                lines.extend(metric.render())  # type: ignore[attr-defined]
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics: WatcherMetrics
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass
+
+
+class MetricsServer:
+    """Serve /metrics from a daemon thread."""
+
+    def __init__(self, metrics: WatcherMetrics, host: str, port: int) -> None:
+        handler = type("MetricsHandler", (_MetricsHandler,), {"metrics": metrics})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.server_address[:2]  # type: ignore[return-value]
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsFileWriter:
+    """Rewrite a metrics file every ``interval`` seconds (atomically, via rename)."""
+
+    def __init__(self, metrics: WatcherMetrics, path: Path, interval: float) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+        self.thread.start()
+
+    def write(self) -> None:
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.metrics.render(), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        self._stop.set()
+        self.thread.join()
+        try:
+            self.write()
+        except OSError:
+            pass
+
+
+def start_exporters(
+    metrics: WatcherMetrics,
+    port: Optional[int],
+    host: str,
+    metrics_file: Optional[Path],
+    interval: float,
+) -> List[object]:
+    """Start the configured exporters; each returned object has close()."""
+    exporters: List[object] = []
+    if port is not None:
+        exporters.append(MetricsServer(metrics, host, port))
+    if metrics_file is not None:
+        exporters.append(MetricsFileWriter(metrics, metrics_file, interval))
+    return exporters
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the `hadoop` CLI, for exercising the pipeline without a cluster.
+
+HDFS paths are mapped onto a local directory (FAKE_HDFS_ROOT, default
+/tmp/fake_hdfs). The subset of commands used by this project is supported:
+
+    hadoop fs -mkdir -p PATH
+    hadoop fs -put [-f] LOCAL|- DEST
+    hadoop fs -cat PATH...            (globs allowed)
+    hadoop fs -text PATH...           (like -cat, decompressing .gz/.bz2)
+    hadoop fs -test -d|-e PATH
+    hadoop fs -rm [-r] [-f] PATH
+    hadoop fs -ls PATH
+    hadoop jar STREAMING_JAR -mapper CMD -reducer CMD -input P -output P ...
+
+`hadoop jar` emulates a single-reducer streaming job locally as
+`cat input | mapper | sort | reducer > output/part-00000`. Like the
+distributed cache, every -files entry is copied into a cache directory of its
+own and symlinked into a fresh task working directory, from which the
+mapper/reducer commands run; a script that finds its helpers next to its own
+real path rather than in the working directory fails here as on a cluster.
+Output compression (-D mapreduce.output.fileoutputformat.compress=true with
+the gzip or bzip2 codec) writes part-00000.gz/.bz2; map output compression
+is accepted and ignored, there is no shuffle.
+
+Usage:
+    ln -s "$PWD/test_data/fake_hadoop.py" ~/bin/hadoop
+    FAKE_HDFS_ROOT=/tmp/fake_hdfs python3 scripts/watch_and_process_pcaps.py ...
+"""
+
+import bz2
+import glob
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+ROOT = os.environ.get("FAKE_HDFS_ROOT", "/tmp/fake_hdfs")
+
+
+def local(path):
+    return os.path.join(ROOT, path.lstrip("/"))
+
+
+def expand(path):
+    matches = sorted(glob.glob(local(path)))
+    return matches or [local(path)]
+
+
+def input_files(path):
+    files = []
+    for part in path.split(","):
+        for match in expand(part):
+            if os.path.isdir(match):
+                for name in sorted(os.listdir(match)):
+                    if not name.startswith(("_", ".")):
+                        files.append(os.path.join(match, name))
+            elif os.path.exists(match):
+                files.append(match)
+    return files
+
+
+OUTPUT_CODECS = {
+    "org.apache.hadoop.io.compress.GzipCodec": (".gz", gzip.open),
+    "org.apache.hadoop.io.compress.BZip2Codec": (".bz2", bz2.open),
+}
+
+
+def open_input(path):
+    # Like TextInputFormat, decompress inputs based on their extension.
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def fs(args):
+    cmd, rest = args[0], args[1:]
+    flags = [a for a in rest if a.startswith("-") and a != "-"]
+    paths = [a for a in rest if not (a.startswith("-") and a != "-")]
+
+    if cmd == "-mkdir":
+        for path in paths:
+            os.makedirs(local(path), exist_ok=True)
+    elif cmd == "-put":
+        src, dest = paths[0], local(paths[1])
+        if os.path.isdir(dest):
+            dest = os.path.join(dest, os.path.basename(src))
+        if os.path.exists(dest) and "-f" not in flags:
+            print(f"put: `{paths[1]}': File exists", file=sys.stderr)
+            return 1
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "wb") as out:
+            if src == "-":
+                shutil.copyfileobj(sys.stdin.buffer, out)
+            else:
+                with open(src, "rb") as handle:
+                    shutil.copyfileobj(handle, out)
+    elif cmd == "-cat":
+        for path in paths:
+            for match in expand(path):
+                with open(match, "rb") as handle:
+                    shutil.copyfileobj(handle, sys.stdout.buffer)
+    elif cmd == "-text":
+        for path in paths:
+            for match in expand(path):
+                if os.path.isfile(match):
+                    with open_input(match) as handle:
+                        shutil.copyfileobj(handle, sys.stdout.buffer)
+    elif cmd == "-test":
+        target = local(paths[0])
+        if "-d" in flags:
+            return 0 if os.path.isdir(target) else 1
+        return 0 if os.path.exists(target) else 1
+    elif cmd == "-rm":
+        for path in paths:
+            for match in expand(path):
+                if os.path.isdir(match):
+                    if "-r" not in flags:
+                        return 1
+                    shutil.rmtree(match)
+                elif os.path.exists(match):
+                    os.remove(match)
+                elif "-f" not in flags:
+                    return 1
+    elif cmd == "-ls":
+        for path in paths:
+            for match in expand(path):
+                for name in sorted(os.listdir(match)) if os.path.isdir(match) else [match]:
+                    print("/" + os.path.relpath(os.path.join(match, name), ROOT))
+    else:
+        print(f"fake_hadoop: unsupported fs command {cmd}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def localize_files(files, root):
+    """Copy each file into its own cache directory and symlink it into a task working directory."""
+    workdir = os.path.join(root, "work")
+    os.makedirs(workdir)
+    for index, path in enumerate(name for name in files.split(",") if name):
+        cache = os.path.join(root, "filecache", str(index))
+        os.makedirs(cache)
+        cached = os.path.join(cache, os.path.basename(path))
+        shutil.copy(path, cached)
+        os.symlink(cached, os.path.join(workdir, os.path.basename(path)))
+    return workdir
+
+
+def jar(args):
+    options = {}
+    conf = {}
+    env = dict(os.environ)
+    index = 1
+    while index < len(args):
+        key = args[index]
+        value = args[index + 1] if index + 1 < len(args) else ""
+        if key == "-cmdenv":
+            name, _, val = value.partition("=")
+            env[name] = val
+        elif key == "-D":
+            name, _, val = value.partition("=")
+            conf[name] = val
+        elif key == "-input" and "-input" in options:
+            options["-input"] += "," + value
+        else:
+            options[key] = value
+        index += 2
+
+    output = local(options["-output"])
+    if os.path.exists(output):
+        print(f"Output directory {options['-output']} already exists", file=sys.stderr)
+        return 1
+    os.makedirs(output)
+    with tempfile.TemporaryDirectory(prefix="fake_hadoop-") as root:
+        return run_job(options, conf, env, output, localize_files(options.get("-files", ""), root))
+
+
+def run_job(options, conf, env, output, workdir):
+    """Run mapper | sort | reducer with the commands in the task working directory."""
+    mapper = subprocess.Popen(options["-mapper"], shell=True, cwd=workdir, env=env,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    sorter = subprocess.Popen(["sort"], stdin=mapper.stdout, stdout=subprocess.PIPE,
+                              env=dict(env, LC_ALL="C"))
+    mapper.stdout.close()
+    suffix, open_output = "", open
+    if conf.get("mapreduce.output.fileoutputformat.compress") == "true":
+        suffix, open_output = OUTPUT_CODECS[conf["mapreduce.output.fileoutputformat.compress.codec"]]
+    with open_output(os.path.join(output, "part-00000" + suffix), "wb") as out:
+        reducer = subprocess.Popen(options.get("-reducer", "cat"), shell=True, cwd=workdir,
+                                   env=env, stdin=sorter.stdout, stdout=subprocess.PIPE)
+        sorter.stdout.close()
+        copier = threading.Thread(target=shutil.copyfileobj, args=(reducer.stdout, out))
+        copier.start()
+        for path in input_files(options["-input"]):
+            with open_input(path) as handle:
+                shutil.copyfileobj(handle, mapper.stdin)
+        mapper.stdin.close()
+        copier.join()
+        codes = [mapper.wait(), sorter.wait(), reducer.wait()]
+    if any(codes):
+        return 1
+    open(os.path.join(output, "_SUCCESS"), "w").close()
+    return 0
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        return 1
+    if args[0] == "fs":
+        return fs(args[1:])
+    if args[0] == "jar":
+        return jar(args[1:])
+    if args[0] == "version":
+        print("Hadoop (fake_hadoop.py stand-in)")
+        return 0
+    print(f"fake_hadoop: unsupported command {args[0]}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
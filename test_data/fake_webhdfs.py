@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Local fake WebHDFS server for exercising scripts/hdfs_client.py without a cluster.
+
+Files live under FAKE_HDFS_ROOT (default /tmp/fake_hdfs), the same layout used
+by fake_hadoop.py, so uploads made over WebHDFS are visible to the fake
+`hadoop jar` jobs. Supported operations: MKDIRS, CREATE (with the usual 307
+redirect to a "datanode", which is this same server), OPEN, GETFILESTATUS,
+LISTSTATUS and DELETE. Connections are HTTP/1.1 keep-alive and chunked
+request bodies are accepted.
+
+Usage:
+    FAKE_HDFS_ROOT=/tmp/fake_hdfs python3 test_data/fake_webhdfs.py --port 9870
+    python3 scripts/watch_and_process_pcaps.py --webhdfs-url http://localhost:9870 ...
+"""
+
+import argparse
+import json
+import os
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+ROOT = os.environ.get("FAKE_HDFS_ROOT", "/tmp/fake_hdfs")
+PREFIX = "/webhdfs/v1"
+
+
+def file_status(path, name=""):
+    info = os.stat(path)
+    return {
+        "pathSuffix": name,
+        "type": "DIRECTORY" if os.path.isdir(path) else "FILE",
+        "length": 0 if os.path.isdir(path) else info.st_size,
+        "modificationTime": int(info.st_mtime * 1000),
+        "replication": 1,
+        "permission": oct(info.st_mode & 0o777)[2:],
+    }
+
+
+class WebHdfsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if os.environ.get("FAKE_WEBHDFS_VERBOSE"):
+            super().log_message(fmt, *args)
+
+    def parse(self):
+        parts = urlsplit(self.path)
+        if not parts.path.startswith(PREFIX):
+            return None, None, {}
+        hdfs_path = unquote(parts.path[len(PREFIX):]) or "/"
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        return hdfs_path, os.path.join(ROOT, hdfs_path.lstrip("/")), query
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                yield self.rfile.read(size)
+                self.rfile.readline()
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1 << 20))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+    def reply(self, status, payload=None, headers=None, body=None):
+        if payload is not None:
+            body = json.dumps(payload).encode()
+        body = body or b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_found(self, hdfs_path):
+        self.reply(404, {"RemoteException": {
+            "exception": "FileNotFoundException",
+            "message": f"File does not exist: {hdfs_path}",
+        }})
+
+    def do_GET(self):
+        hdfs_path, local, query = self.parse()
+        op = query.get("op", "").upper()
+        if hdfs_path is None:
+            return self.reply(400, {})
+        if not os.path.exists(local):
+            return self.not_found(hdfs_path)
+        if op == "GETFILESTATUS":
+            return self.reply(200, {"FileStatus": file_status(local)})
+        if op == "LISTSTATUS":
+            names = sorted(os.listdir(local)) if os.path.isdir(local) else [""]
+            statuses = [file_status(os.path.join(local, n), n) for n in names]
+            return self.reply(200, {"FileStatuses": {"FileStatus": statuses}})
+        if op == "OPEN":
+            if "datanode" not in query:
+                location = f"http://{self.headers['Host']}{self.path}&datanode=true"
+                return self.reply(307, {}, {"Location": location})
+            with open(local, "rb") as handle:
+                return self.reply(200, body=handle.read())
+        self.reply(400, {"RemoteException": {"message": f"Unsupported op {op}"}})
+
+    def do_PUT(self):
+        hdfs_path, local, query = self.parse()
+        op = query.get("op", "").upper()
+        if op == "MKDIRS":
+            os.makedirs(local, exist_ok=True)
+            return self.reply(200, {"boolean": True})
+        if op == "CREATE":
+            if "datanode" not in query:
+                for _ in self.read_body():
+                    pass
+                if os.path.exists(local) and query.get("overwrite", "false") != "true":
+                    return self.reply(403, {"RemoteException": {
+                        "exception": "FileAlreadyExistsException",
+                        "message": f"{hdfs_path} already exists",
+                    }})
+                location = f"http://{self.headers['Host']}{self.path}&datanode=true"
+                return self.reply(307, {}, {"Location": location})
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            with open(local, "wb") as handle:
+                for chunk in self.read_body():
+                    handle.write(chunk)
+            return self.reply(201, {}, {"Location": f"hdfs://{hdfs_path}"})
+        self.reply(400, {"RemoteException": {"message": f"Unsupported op {op}"}})
+
+    def do_DELETE(self):
+        _, local, query = self.parse()
+        if not os.path.exists(local):
+            return self.reply(200, {"boolean": False})
+        if os.path.isdir(local):
+            if query.get("recursive") != "true" and os.listdir(local):
+                return self.reply(403, {"RemoteException": {"message": "Directory is not empty"}})
+            shutil.rmtree(local)
+        else:
+            os.remove(local)
+        self.reply(200, {"boolean": True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake WebHDFS server backed by a local directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9870)
+    args = parser.parse_args()
+
+    os.makedirs(ROOT, exist_ok=True)
+    server = ThreadingHTTPServer((args.host, args.port), WebHdfsHandler)
+    print(f"Fake WebHDFS serving {ROOT} on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Streaming synthetic PCAP generator for load and benchmark testing.
+
+Unlike generate_test_pcap.py, packets are never built as Scapy objects or
+kept in memory: raw pcap records are serialised with struct into a small
+output buffer and written as they are produced, so multi-GB captures can be
+generated with constant memory. The output is fully determined by --seed.
+
+Traffic model:
+  - flows arrive as a Poisson process (--flow-rate) and are interleaved in
+    timestamp order, with at most --max-active flows open at once (further
+    arrivals wait until a flow closes);
+  - client and server hosts are picked from Zipf distributions (--zipf), so a
+    few hosts carry most of the traffic;
+  - TCP flows have a handshake, a heavy-tailed (Pareto, --flow-alpha) number
+    of data packets and a FIN exchange; UDP flows are request/response pairs
+    and ICMP flows are echo request/reply pairs;
+  - optionally a fraction of non-IP frames (ARP, IPv6) and malformed packets
+    (truncated captures, bad IHL, bad IP version, truncated L4 headers).
+
+Usage:
+    python3 generate_synthetic_pcap.py -o load.pcap --flows 100000
+    python3 generate_synthetic_pcap.py -o big.pcap --max-bytes 4G --seed 7
+    python3 generate_synthetic_pcap.py -o - --flows 1000 | python3 ../preprocessing/mapper.py
+"""
+
+import argparse
+import heapq
+import math
+import random
+import struct
+import sys
+import time
+from bisect import bisect_right
+
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+PROTO_NON_IP = 0
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+TCP_URG = 0x20
+
+MALFORMED_KINDS = ("truncated", "bad_ihl", "bad_version", "short_l4")
+
+MSS = 1460
+CHUNK_SIZE = 1024 * 1024
+
+ETH_IPV4 = b"\x00\x1b\x21\x3c\x4d\x5e\x00\x1c\x42\x00\x00\x08\x08\x00"
+ETH_ARP = b"\xff\xff\xff\xff\xff\xff\x00\x1c\x42\x00\x00\x08\x08\x06"
+ETH_IPV6 = b"\x33\x33\x00\x00\x00\x01\x00\x1c\x42\x00\x00\x08\x86\xdd"
+
+PCAP_GLOBAL_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+RECORD_HEADER = struct.Struct("<IIII")
+# Ethernet + IPv4 + transport headers, packed in one call per packet.
+IPV4_TCP = struct.Struct("!14sBBHHHBBH4s4sHHIIBBHHH")
+IPV4_UDP = struct.Struct("!14sBBHHHBBH4s4sHHHH")
+IPV4_ICMP = struct.Struct("!14sBBHHHBBH4s4sBBHHH")
+ARP_REQUEST = struct.Struct("!HHBBH6s4s6s4s")
+IPV6_UDP = struct.Struct("!IHBB16s16sHHHH")
+ZEROS = memoryview(bytes(65536))
+
+L4_HEADER_LEN = {PROTO_TCP: 20, PROTO_UDP: 8, PROTO_ICMP: 8}
+
+
+def tcp_flags_string(bits):
+    """Flags in the same notation as preprocessing/mapper.py (e.g. "SA", "AP")."""
+    flags = ""
+    for bit, letter in ((TCP_SYN, "S"), (TCP_ACK, "A"), (TCP_FIN, "F"),
+                        (TCP_RST, "R"), (TCP_PSH, "P"), (TCP_URG, "U")):
+        if bits & bit:
+            flags += letter
+    return flags
+
+
+def parse_size(text):
+    """Parse sizes such as 500M or 4G (powers of 1024)."""
+    text = text.strip().upper()
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def zipf_cdf(count, exponent):
+    total = 0.0
+    cdf = []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** exponent
+        cdf.append(total)
+    return cdf
+
+
+class SyntheticTraffic:
+    """Deterministic synthetic traffic; see the module docstring for the model.
+
+    events() yields one tuple per packet, in timestamp order:
+        (timestamp, proto, src, dst, sport, dport, tcp_flags, length, anomaly)
+    where src/dst are 4-byte IPv4 addresses (None for non-IP frames), length
+    is the frame length on the wire and anomaly is None, "non_ip" or one of
+    MALFORMED_KINDS. chunks() serialises the events into pcap bytes.
+    """
+
+    def __init__(
+        self,
+        seed=1,
+        flows=10000,
+        clients=2000,
+        servers=300,
+        zipf=1.1,
+        flow_alpha=1.3,
+        max_flow_packets=100000,
+        flow_rate=2000.0,
+        max_active=10000,
+        udp_ratio=0.2,
+        icmp_ratio=0.03,
+        non_ip_ratio=0.0,
+        malformed_ratio=0.0,
+        snaplen=65535,
+        start_time=1_700_000_000.0,
+        max_packets=None,
+        max_bytes=None,
+    ):
+        self.seed = seed
+        self.flows = flows
+        self.zipf = zipf
+        self.flow_alpha = flow_alpha
+        self.max_flow_packets = max_flow_packets
+        self.flow_rate = flow_rate
+        self.max_active = max(1, max_active)
+        self.udp_ratio = udp_ratio
+        self.icmp_ratio = icmp_ratio
+        self.non_ip_ratio = non_ip_ratio
+        self.malformed_ratio = malformed_ratio
+        self.snaplen = snaplen
+        self.start_time = start_time
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.clients = [bytes((10, (i >> 16) & 0xFF, (i >> 8) & 0xFF, (i & 0xFF) or 1))
+                        for i in range(1, clients + 1)]
+        self.servers = [bytes((172, 16 + (i >> 16) % 16, (i >> 8) & 0xFF, (i & 0xFF) or 1))
+                        for i in range(1, servers + 1)]
+        self.client_cdf = zipf_cdf(len(self.clients), zipf)
+        self.server_cdf = zipf_cdf(len(self.servers), zipf)
+        self.packets_written = 0
+        self.bytes_written = 0
+
+    def _new_flow(self, rng):
+        client = self.clients[bisect_right(self.client_cdf, rng.random() * self.client_cdf[-1])]
+        server = self.servers[bisect_right(self.server_cdf, rng.random() * self.server_cdf[-1])]
+        draw = rng.random()
+        if draw < self.icmp_ratio:
+            proto, sport = PROTO_ICMP, 0
+        elif draw < self.icmp_ratio + self.udp_ratio:
+            proto, sport = PROTO_UDP, rng.choice((53, 53, 53, 123, 161, 5353))
+        else:
+            proto, sport = PROTO_TCP, rng.choice((443, 443, 443, 80, 80, 22, 8080, 3306, 5432))
+        data = min(self.max_flow_packets, max(1, int(rng.paretovariate(self.flow_alpha))))
+        rtt = min(1.0, rng.lognormvariate(math.log(0.02), 0.8))
+        # [proto, client, server, client port, server port, data packets left, phase, rtt]
+        return [proto, client, server, rng.randint(32768, 60999), sport, data, 0, rtt]
+
+    def events(self):
+        rng = random.Random(self.seed)
+        rand = rng.random
+        log = math.log
+        heap = []
+        started = 0
+        emitted = 0
+        arrival = self.start_time
+        clock = self.start_time
+        rate = self.flow_rate
+        max_packets = self.max_packets
+
+        def flow_packet(flow):
+            """Return (src, dst, sport, dport, flags, payload, next_gap) or None when done."""
+            proto, client, server, cport, sport, left, phase, rtt = flow
+            if proto == PROTO_TCP:
+                if phase == 0:
+                    flow[6] = 1
+                    return client, server, cport, sport, TCP_SYN, 0, rtt
+                if phase == 1:
+                    flow[6] = 2
+                    return server, client, sport, cport, TCP_SYN | TCP_ACK, 0, rtt * 0.05
+                if phase == 2:
+                    flow[6] = 3
+                    return client, server, cport, sport, TCP_ACK, 0, rtt * 0.1
+                if phase == 3 and left > 0:
+                    flow[5] = left - 1
+                    gap = -log(1.0 - rand()) * rtt * 0.25
+                    draw = rand()
+                    if draw < 0.42:
+                        return server, client, sport, cport, TCP_PSH | TCP_ACK, MSS, gap
+                    if draw < 0.7:
+                        payload = 1 + int(rand() * MSS)
+                        return server, client, sport, cport, TCP_PSH | TCP_ACK, payload, gap
+                    payload = 1 + int(rand() * 600)
+                    return client, server, cport, sport, TCP_PSH | TCP_ACK, payload, gap
+                if phase == 3:
+                    flow[6] = 4
+                    return client, server, cport, sport, TCP_FIN | TCP_ACK, 0, rtt * 0.5
+                if phase == 4:
+                    flow[6] = 5
+                    return server, client, sport, cport, TCP_FIN | TCP_ACK, 0, rtt * 0.5
+                if phase == 5:
+                    flow[6] = 6
+                    return client, server, cport, sport, TCP_ACK, 0, None
+                return None
+            # UDP and ICMP: request/response pairs.
+            if left <= 0:
+                return None
+            if phase == 0:
+                flow[6] = 1
+                payload = 20 + int(rand() * 100) if proto == PROTO_UDP else 56
+                return client, server, cport, sport, 0, payload, rtt
+            flow[6] = 0
+            flow[5] = left - 1
+            payload = 60 + int(rand() * 1140) if proto == PROTO_UDP else 56
+            gap = -log(1.0 - rand()) * max(rtt, 0.05) if left > 1 else None
+            return server, client, sport, cport, 0, payload, gap
+
+        while True:
+            # Start flows whose arrival time has come (or that the heap needs).
+            while started < self.flows and len(heap) < self.max_active and (
+                not heap or arrival <= heap[0][0]
+            ):
+                # Arrivals held back while --max-active flows were open start
+                # now rather than in the past, so timestamps never go backwards.
+                if arrival < clock:
+                    arrival = clock
+                flow = self._new_flow(rng)
+                heapq.heappush(heap, (arrival, started, flow))
+                started += 1
+                arrival += rng.expovariate(rate)
+            if not heap:
+                return
+            now, flow_id, flow = heapq.heappop(heap)
+            clock = now
+            packet = flow_packet(flow)
+            if packet is None:
+                continue
+            src, dst, s_port, d_port, flags, payload, gap = packet
+            proto = flow[0]
+            if gap is not None:
+                heapq.heappush(heap, (now + gap, flow_id, flow))
+
+            if self.non_ip_ratio and rand() < self.non_ip_ratio:
+                yield now, PROTO_NON_IP, None, None, 0, 0, 0, 0, "non_ip"
+                emitted += 1
+            anomaly = None
+            if self.malformed_ratio and rand() < self.malformed_ratio:
+                anomaly = MALFORMED_KINDS[rng.randrange(len(MALFORMED_KINDS))]
+            length = 14 + 20 + L4_HEADER_LEN[proto] + payload
+            yield now, proto, src, dst, s_port, d_port, flags, length, anomaly
+            emitted += 1
+            if max_packets is not None and emitted >= max_packets:
+                return
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        """Yield the capture as pcap bytes in chunks of about chunk_size."""
+        rng = random.Random(self.seed ^ 0x5EED)
+        out = bytearray(PCAP_GLOBAL_HEADER)
+        snaplen = self.snaplen
+        max_bytes = self.max_bytes
+        written = 0
+        packets = 0
+        pack_record = RECORD_HEADER.pack
+        pack_tcp = IPV4_TCP.pack
+        pack_udp = IPV4_UDP.pack
+        pack_icmp = IPV4_ICMP.pack
+        ip_id = 0
+
+        for timestamp, proto, src, dst, sport, dport, flags, length, anomaly in self.events():
+            seconds = int(timestamp)
+            micros = int((timestamp - seconds) * 1e6)
+            if proto == PROTO_NON_IP:
+                frame = self._non_ip_frame(rng)
+                out += pack_record(seconds, micros, len(frame), len(frame))
+                out += frame
+            else:
+                ip_id = (ip_id + 1) & 0xFFFF
+                ip_len = length - 14
+                payload = ip_len - 20 - L4_HEADER_LEN[proto]
+                if proto == PROTO_TCP:
+                    header = pack_tcp(ETH_IPV4, 0x45, 0, ip_len, ip_id, 0x4000, 64, PROTO_TCP, 0, src, dst,
+                                      sport, dport, ip_id << 8, 0, 0x50, flags, 64240, 0, 0)
+                elif proto == PROTO_UDP:
+                    header = pack_udp(ETH_IPV4, 0x45, 0, ip_len, ip_id, 0x4000, 64, PROTO_UDP, 0, src, dst,
+                                      sport, dport, 8 + payload, 0)
+                else:
+                    # Requests go client -> server (server "port" 0), replies come back.
+                    icmp_type = 8 if dport == 0 else 0
+                    header = pack_icmp(ETH_IPV4, 0x45, 0, ip_len, ip_id, 0, 64, PROTO_ICMP, 0, src, dst,
+                                       icmp_type, 0, 0, ip_id, ip_id)
+                caplen = length if length <= snaplen else snaplen
+                if anomaly is not None:
+                    header, caplen = self._corrupt(anomaly, header, caplen, rng)
+                out += pack_record(seconds, micros, caplen, length)
+                if caplen == length:
+                    out += header
+                    if payload:
+                        out += ZEROS[:payload]
+                else:
+                    out += (header + bytes(payload))[:caplen]
+            packets += 1
+            if len(out) >= chunk_size:
+                written += len(out)
+                yield bytes(out)
+                out.clear()
+                if max_bytes is not None and written >= max_bytes:
+                    break
+        if out:
+            written += len(out)
+            yield bytes(out)
+        self.packets_written = packets
+        self.bytes_written = written
+
+    @staticmethod
+    def _non_ip_frame(rng):
+        if rng.random() < 0.7:
+            sender = bytes((10, 0, rng.randrange(256), rng.randrange(1, 255)))
+            target = bytes((10, 0, rng.randrange(256), rng.randrange(1, 255)))
+            body = ARP_REQUEST.pack(1, 0x0800, 6, 4, 1, b"\x00\x1c\x42\x00\x00\x08", sender,
+                                    bytes(6), target)
+            return ETH_ARP + body + bytes(18)
+        src = b"\xfe\x80" + bytes(13) + bytes((rng.randrange(1, 255),))
+        dst = b"\xff\x02" + bytes(13) + b"\x01"
+        body = IPV6_UDP.pack(0x60000000, 8 + 32, 17, 255, src, dst, 546, 547, 40, 0)
+        return ETH_IPV6 + body + bytes(32)
+
+    @staticmethod
+    def _corrupt(anomaly, header, caplen, rng):
+        """Corrupt a packed Ethernet+IPv4+L4 header; returns (header, caplen)."""
+        if anomaly == "truncated":
+            # Capture cut inside the IP header.
+            return header, min(caplen, 14 + rng.randint(1, 19))
+        if anomaly == "bad_ihl":
+            return header[:14] + bytes((0x40 | rng.randint(0, 4),)) + header[15:], caplen
+        if anomaly == "bad_version":
+            version = rng.choice((0, 5, 7, 15))
+            return header[:14] + bytes((0x05 | version << 4,)) + header[15:], caplen
+        # short_l4: capture ends inside the transport header.
+        return header, min(caplen, 14 + 20 + rng.randint(1, 7))
+
+    def write(self, handle, chunk_size=CHUNK_SIZE):
+        for chunk in self.chunks(chunk_size):
+            handle.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a deterministic synthetic PCAP file.")
+    parser.add_argument("-o", "--output", default="synthetic.pcap",
+                        help="Output file, or - for stdout (default: synthetic.pcap).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+    parser.add_argument("--flows", type=int, default=10000, help="Number of flows (default: 10000).")
+    parser.add_argument("--max-packets", type=int, help="Stop after this many packets.")
+    parser.add_argument("--max-bytes", type=parse_size,
+                        help="Stop once the file reaches about this size (e.g. 500M, 4G).")
+    parser.add_argument("--clients", type=int, default=2000, help="Client hosts (default: 2000).")
+    parser.add_argument("--servers", type=int, default=300, help="Server hosts (default: 300).")
+    parser.add_argument("--zipf", type=float, default=1.1,
+                        help="Zipf exponent of host popularity (default: 1.1).")
+    parser.add_argument("--flow-alpha", type=float, default=1.3,
+                        help="Pareto shape of data packets per flow; lower is heavier-tailed "
+                        "(default: 1.3).")
+    parser.add_argument("--max-flow-packets", type=int, default=100000,
+                        help="Cap on data packets in one flow (default: 100000).")
+    parser.add_argument("--flow-rate", type=float, default=2000.0,
+                        help="Mean new flows per second of capture time (default: 2000).")
+    parser.add_argument("--max-active", type=int, default=10000,
+                        help="Maximum concurrently open flows; bounds memory (default: 10000).")
+    parser.add_argument("--udp-ratio", type=float, default=0.2, help="Share of UDP flows.")
+    parser.add_argument("--icmp-ratio", type=float, default=0.03, help="Share of ICMP flows.")
+    parser.add_argument("--non-ip-ratio", type=float, default=0.0,
+                        help="Probability of an extra non-IP frame (ARP/IPv6) per packet.")
+    parser.add_argument("--malformed-ratio", type=float, default=0.0,
+                        help="Probability that a packet is malformed.")
+    parser.add_argument("--snaplen", type=int, default=65535,
+                        help="Capture length; longer frames are truncated (default: 65535).")
+    parser.add_argument("--start-time", type=float, default=1_700_000_000.0,
+                        help="Timestamp of the first packet.")
+    args = parser.parse_args()
+
+    traffic = SyntheticTraffic(
+        seed=args.seed,
+        flows=args.flows,
+        clients=args.clients,
+        servers=args.servers,
+        zipf=args.zipf,
+        flow_alpha=args.flow_alpha,
+        max_flow_packets=args.max_flow_packets,
+        flow_rate=args.flow_rate,
+        max_active=args.max_active,
+        udp_ratio=args.udp_ratio,
+        icmp_ratio=args.icmp_ratio,
+        non_ip_ratio=args.non_ip_ratio,
+        malformed_ratio=args.malformed_ratio,
+        snaplen=args.snaplen,
+        start_time=args.start_time,
+        max_packets=args.max_packets,
+        max_bytes=args.max_bytes,
+    )
+    started = time.perf_counter()
+    if args.output == "-":
+        traffic.write(sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, "wb") as handle:
+            traffic.write(handle)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Wrote {traffic.packets_written} packets, {traffic.bytes_written / 1e6:.1f} MB "
+        f"in {elapsed:.1f}s ({traffic.bytes_written / 1e6 / max(elapsed, 1e-9):.0f} MB/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,18 +6,49 @@ This mapper reads line-delimited JSON data and emits key-value pairs for traffic
 volume analysis. For each packet, it emits two records:
 - src_ip as key with "sent" direction and packet size
 - dst_ip as key with "received" direction and packet size
+
+Records tagged with a run_id (batched watcher jobs) are keyed as
+"<run_id>|<ip>" so the output can be split back per capture.
+
+Records from flow-sampled preprocessing carry a sample_rate; for those the
+rate and the flow key are appended to both pairs so the reducer can scale
+the totals back up and estimate their confidence intervals.
+
+IPs listed in SKEW_HOT_KEYS are salted over SKEW_SALTS reducers (see
+common/skew.py); with --merge the mapper re-keys the first job's output by
+the unsalted IP for the merge job.
 """
 
 import sys
+import os
 import json
 
+# Hadoop Streaming symlinks every -files entry into the task's working directory
+# from a cache directory of its own, so on a cluster the helpers are found there
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import compression
+import instrumentation
+import sampling
+import skew
+
+RUN_ID_SEP = '|'
+
+reporter = instrumentation.Reporter('TrafficVolume')
+salter = skew.Salter()
+
 def main():
     """Main mapper function."""
+    if '--merge' in sys.argv[1:]:
+        skew.merge_mapper(compression.text_input())
+        return
     try:
-        for line in sys.stdin:
+        # Input piped in by hand may still be compressed (see common/compression.py)
+        for line in compression.text_input():
             line = line.strip()
             if not line:
                 continue
+            reporter.incr('Records read')
                 
             try:
                 packet = json.loads(line)
@@ -29,25 +60,57 @@ def main():
                 
                 # Skip packets without IP information
                 if not src_ip or not dst_ip:
+                    reporter.incr('Records without IP')
                     continue
                 
+                sample_rate = packet.get('sample_rate')
+                if sample_rate:
+                    flow = sampling.flow_key(src_ip, packet.get('src_port'),
+                                             dst_ip, packet.get('dst_port'),
+                                             packet.get('proto'))
+                    suffix = f"\t{sample_rate}\t{flow}"
+                else:
+                    flow = None
+                    suffix = ''
+                
+                src_hot = salter.is_hot(src_ip)
+                dst_hot = salter.is_hot(dst_ip)
+                
+                run_id = packet.get('run_id')
+                if run_id:
+                    src_ip = f"{run_id}{RUN_ID_SEP}{src_ip}"
+                    dst_ip = f"{run_id}{RUN_ID_SEP}{dst_ip}"
+                
+                # Sampled flows stay within one salt so their variance can be estimated
+                if src_hot:
+                    src_ip = salter.salt(src_ip, flow)
+                    reporter.incr('Hot key pairs')
+                if dst_hot:
+                    dst_ip = salter.salt(dst_ip, flow)
+                    reporter.incr('Hot key pairs')
+                
                 # Emit source IP traffic (sent)
-                print(f"{src_ip}\tsent\t{size}")
+                print(f"{src_ip}\tsent\t{size}{suffix}")
                 
                 # Emit destination IP traffic (received)
-                print(f"{dst_ip}\treceived\t{size}")
+                print(f"{dst_ip}\treceived\t{size}{suffix}")
+                reporter.incr('Pairs emitted', 2)
                 
             except json.JSONDecodeError:
                 print(f"Invalid JSON line: {line}", file=sys.stderr)
+                reporter.incr('Invalid JSON')
                 continue
             except Exception as e:
                 print(f"Error processing packet: {e}", file=sys.stderr)
+                reporter.incr('Record errors')
                 continue
                 
     except Exception as e:
         print(f"Fatal error in mapper: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        reporter.close()
 
 if __name__ == "__main__":
-    main()
+    instrumentation.run_main(main, 'traffic-volume-mapper')
 
@@ -5,34 +5,110 @@ Traffic Volume Analysis Reducer for Hadoop Network Analysis Pipeline
 This reducer aggregates traffic statistics by IP address. It groups records by IP
 and sums the bytes for "sent" and "received" directions, outputting TSV format:
 IP_Address\tTotal_Bytes_Sent\tTotal_Bytes_Received
+
+When the input was flow-sampled (pairs carrying a sample rate and flow key),
+the totals are Horvitz-Thompson estimates and two columns are added with the
+half-width of their 95% confidence intervals:
+IP_Address\tEst_Bytes_Sent\tEst_Bytes_Received\tSent_CI95\tReceived_CI95
+
+Salted hot IPs ("<ip>#<salt>", see common/skew.py) come out as partial totals
+in the same format (unrounded when estimated); with --merge the reducer adds up the partial totals of
+each IP (confidence intervals of independent flows add in quadrature).
 """
 
 import sys
+import os
+import math
 from collections import defaultdict
 
+# Hadoop Streaming symlinks every -files entry into the task's working directory
+# from a cache directory of its own, so on a cluster the helpers are found there
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import instrumentation
+import sampling
+import skew
+
+reporter = instrumentation.Reporter('TrafficVolume')
+
+def merge():
+    """Merge the partial totals written by the first job for salted IPs."""
+    # IP -> [sent, received, sent CI squared, received CI squared, estimated]
+    totals = {}
+    for line in sys.stdin:
+        parts = line.rstrip('\n').split('\t')
+        if len(parts) not in (3, 5):
+            if line.strip():
+                print(f"Invalid partial result: {line.strip()}", file=sys.stderr)
+                reporter.incr('Invalid pairs')
+            continue
+        reporter.incr('Partial results read')
+        try:
+            values = [float(value) for value in parts[1:]]
+        except ValueError:
+            print(f"Invalid partial result: {line.strip()}", file=sys.stderr)
+            reporter.incr('Invalid pairs')
+            continue
+        entry = totals.get(parts[0])
+        if entry is None:
+            entry = totals[parts[0]] = [0, 0, 0, 0, False]
+        entry[0] += values[0]
+        entry[1] += values[1]
+        if len(values) == 4:
+            entry[2] += values[2] * values[2]
+            entry[3] += values[3] * values[3]
+            entry[4] = True
+    
+    for ip_address, (sent, received, sent_var, received_var, estimated) in totals.items():
+        if estimated:
+            print(f"{ip_address}\t{round(sent)}\t{round(received)}"
+                  f"\t{round(math.sqrt(sent_var))}\t{round(math.sqrt(received_var))}")
+        else:
+            print(f"{ip_address}\t{round(sent)}\t{round(received)}")
+        reporter.incr('Hosts output')
+
 def main():
     """Main reducer function."""
+    if '--merge' in sys.argv[1:]:
+        try:
+            merge()
+        finally:
+            reporter.close()
+        return
     try:
         # Dictionary to store traffic stats per IP
         traffic_stats = defaultdict(lambda: {'sent': 0, 'received': 0})
+        # Sampled bytes per IP, direction and flow: [bytes, sample rate]
+        sampled_flows = defaultdict(lambda: {'sent': {}, 'received': {}})
         
         # Process input from mapper
         for line in sys.stdin:
             line = line.strip()
             if not line:
                 continue
+            reporter.incr('Pairs read')
                 
             try:
-                # Parse mapper output: IP\tDirection\tSize
+                # Parse mapper output: IP\tDirection\tSize[\tSample_Rate\tFlow]
                 parts = line.split('\t')
-                if len(parts) != 3:
+                if len(parts) not in (3, 5):
                     print(f"Invalid mapper output: {line}", file=sys.stderr)
+                    reporter.incr('Invalid pairs')
                     continue
                 
                 ip_address = parts[0]
                 direction = parts[1]
                 size = int(parts[2])
                 
+                if len(parts) == 5 and direction in ('sent', 'received'):
+                    flows = sampled_flows[ip_address][direction]
+                    flow = flows.get(parts[4])
+                    if flow is None:
+                        flows[parts[4]] = [size, float(parts[3])]
+                    else:
+                        flow[0] += size
+                    continue
+                
                 # Update traffic statistics
                 if direction == 'sent':
                     traffic_stats[ip_address]['sent'] += size
@@ -40,10 +116,12 @@ def main():
                     traffic_stats[ip_address]['received'] += size
                 else:
                     print(f"Unknown direction: {direction}", file=sys.stderr)
+                    reporter.incr('Invalid pairs')
                     continue
                     
             except ValueError:
                 print(f"Invalid size value: {line}", file=sys.stderr)
+                reporter.incr('Invalid pairs')
                 continue
             except Exception as e:
                 print(f"Error processing line: {e}", file=sys.stderr)
@@ -51,14 +129,33 @@ def main():
         
         # Output aggregated results in TSV format
         for ip_address, stats in traffic_stats.items():
+            if ip_address in sampled_flows:
+                continue
             total_sent = stats['sent']
             total_received = stats['received']
             print(f"{ip_address}\t{total_sent}\t{total_received}")
+            reporter.incr('Hosts output')
+        
+        for ip_address, flows in sampled_flows.items():
+            stats = traffic_stats.get(ip_address, {'sent': 0, 'received': 0})
+            est_sent, ci_sent = sampling.estimate_total(flows['sent'].values())
+            est_received, ci_received = sampling.estimate_total(flows['received'].values())
+            if skew.unsalt(ip_address)[1]:
+                # Partial totals are merged unrounded
+                print(f"{ip_address}\t{stats['sent'] + est_sent:.3f}\t{stats['received'] + est_received:.3f}"
+                      f"\t{ci_sent:.3f}\t{ci_received:.3f}")
+                continue
+            print(f"{ip_address}\t{stats['sent'] + round(est_sent)}\t{stats['received'] + round(est_received)}"
+                  f"\t{round(ci_sent)}\t{round(ci_received)}")
+            reporter.incr('Hosts output')
+            reporter.incr('Hosts estimated')
             
     except Exception as e:
         print(f"Fatal error in reducer: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        reporter.close()
 
 if __name__ == "__main__":
-    main()
+    instrumentation.run_main(main, 'traffic-volume-reducer')
 